@@ -62,6 +62,14 @@ def get_params_from_config(config_filename, launched_with_shortcut=False):
                     loader.load_config_properties(params)
                     if 'fail_on_throttle' in params.config:
                         params.rest_context.fail_on_throttle = params.config['fail_on_throttle'] is True
+                    if 'vault_cache' in params.config:
+                        params.vault_cache = params.config['vault_cache'] is True
+                    if 'enterprise_cache' in params.config:
+                        params.enterprise_cache = params.config['enterprise_cache'] is True
+                    if 'parallel_decryption' in params.config:
+                        params.parallel_decryption = params.config['parallel_decryption'] is True
+                    if 'connection_pool_size' in params.config:
+                        params.rest_context.pool_size = params.config['connection_pool_size']
                     if 'certificate_check' in params.config:
                         params.rest_context.certificate_check = params.config['certificate_check'] is True
                     if 'commands' in params.config:
@@ -18,8 +18,9 @@ import math
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Optional, Tuple, Iterable, List, Dict, Any
+from typing import Optional, Tuple, Iterable, Iterator, List, Dict, Any, NamedTuple, Union
 
 import google
 from Cryptodome.PublicKey import RSA
@@ -658,6 +659,49 @@ def communicate_rest(params, request, endpoint, *, rs_type=None, payload_version
     raise KeeperApiError('Error', endpoint)
 
 
+class RestRequest(NamedTuple):
+    request: Any
+    endpoint: str
+    rs_type: Optional[type] = None
+    payload_version: Optional[int] = None
+
+
+def communicate_rest_concurrent(params, requests, *, max_workers=None):
+    # type: (KeeperParams, Iterable[RestRequest], Optional[int]) -> Iterator[Tuple[int, Union[Any, Exception]]]
+    """Sends REST requests in parallel
+
+    Yields (index, response) pairs in completion order. A request that fails yields its exception instead.
+    At most max_workers requests are in flight; defaults to the connection pool size.
+    Throttled requests are retried by execute_rest with jittered exponential backoff.
+    """
+    requests = list(requests)
+    if not requests:
+        return
+    if not max_workers or max_workers < 1:
+        max_workers = params.rest_context.pool_size
+    max_workers = min(max_workers, len(requests))
+
+    if max_workers == 1:
+        for i, rq in enumerate(requests):
+            try:
+                yield i, communicate_rest(params, rq.request, rq.endpoint, rs_type=rq.rs_type,
+                                          payload_version=rq.payload_version)
+            except Exception as e:
+                yield i, e
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(communicate_rest, params, rq.request, rq.endpoint, rs_type=rq.rs_type,
+                                   payload_version=rq.payload_version): i for i, rq in enumerate(requests)}
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                yield futures[future], error if error else future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 def communicate(params, request):
     # type: (KeeperParams, dict) -> dict
 
@@ -684,50 +728,92 @@ def communicate(params, request):
         raise kae
 
 
-def execute_batch(params, requests):
-    # type: (KeeperParams, [dict]) -> [dict]
-    responses = []
-    if not requests:
-        return responses
+class BatchResponse(NamedTuple):
+    request: dict
+    response: dict
+    attempts: int
 
-    throttle_delay = 10
-    chunk_size = 999
-    queue = requests.copy()
-    unthrottled = 0
-    delay_next_batch = False
 
-    while len(queue) > 0:
-        chunk = queue[:chunk_size]
-        queue = queue[chunk_size:]
+EXECUTE_BATCH_MAX_SIZE = 999
+
+
+def execute_batch_ex(params, requests, *, max_parallel=1):
+    # type: (KeeperParams, List[dict], int) -> List[BatchResponse]
+    """Executes v2 commands in "execute" batches
+
+    Returns a response for every request, in request order. attempts > 1 marks requests that were re-sent
+    after throttling. A failed batch yields error responses for all its requests.
+    The batch size is cut down to what the server accepted on throttling and doubles again after every
+    fully successful batch. max_parallel > 1 sends up to that many batches at a time;
+    use it only for requests that do not depend on each other.
+    """
+    if not requests:
+        return []
+
+    responses = [None] * len(requests)    # type: List[Optional[dict]]
+    attempts = [0] * len(requests)
+    queue = collections.deque(range(len(requests)))
+    chunk_size = EXECUTE_BATCH_MAX_SIZE
+    parallel = 1
+    throttle_attempt = 0
+
+    def execute_chunk(chunk):    # type: (List[int]) -> List[dict]
+        for idx in chunk:
+            attempts[idx] += 1
+        rs = communicate(params, {'command': 'execute', 'requests': [requests[x] for x in chunk]})
+        return rs.get('results') or []
+
+    with ThreadPoolExecutor(max_workers=max(max_parallel, 1)) as executor:
+        while queue:
+            chunks = []
+            while queue and len(chunks) < parallel:
+                chunks.append([queue.popleft() for _ in range(min(chunk_size, len(queue)))])
+
+            futures = [executor.submit(execute_chunk, x) for x in chunks]
+            throttled = []     # type: List[int]
+            accepted = 0
+            for chunk, future in zip(chunks, futures):
+                try:
+                    results = future.result()
+                except KeeperApiError as kae:
+                    logging.warning('Execute batch error: %s', kae)
+                    results = [{'result': 'fail', 'result_code': kae.result_code, 'message': kae.message} for _ in chunk]
+                except Exception as e:
+                    logging.warning('Execute batch error: %s', e)
+                    results = [{'result': 'fail', 'result_code': 'error', 'message': str(e)} for _ in chunk]
+
+                throttled_idx = next((i for i, r in enumerate(results)
+                                      if r.get('result') != 'success' and r.get('result_code') == 'throttled'), -1)
+                if throttled_idx >= 0:
+                    throttled.extend(chunk[throttled_idx:])
+                    results = results[:throttled_idx]
+                    accepted = max(accepted, throttled_idx)
+                    chunk = chunk[:throttled_idx]
+                for idx, rs in zip(chunk, results):
+                    responses[idx] = rs
+                for idx in chunk[len(results):]:
+                    responses[idx] = {'result': 'fail', 'result_code': 'no_response',
+                                      'message': 'Response is missing'}
+
+            if throttled:
+                queue.extendleft(reversed(throttled))
+                chunk_size = max(accepted, 1)
+                parallel = 1
+                delay = rest_api.get_throttle_delay(throttle_attempt)
+                throttle_attempt += 1
+                logging.info('Throttled. sleeping for %.1f seconds', delay)
+                time.sleep(delay)
+            else:
+                throttle_attempt = 0
+                chunk_size = min(chunk_size * 2, EXECUTE_BATCH_MAX_SIZE)
+                parallel = min(parallel + 1, max(max_parallel, 1))
+
+    return [BatchResponse(request=rq, response=rs, attempts=a) for rq, rs, a in zip(requests, responses, attempts)]
 
-        rq = {
-            'command': 'execute',
-            'requests': chunk
-        }
-        try:
-            if delay_next_batch:
-                time.sleep(throttle_delay)
-                unthrottled = 0
-            rs = communicate(params, rq)
-            if 'results' in rs:
-                results = rs['results']  # type: list
-                if len(results) > 0:
-                    throttled = [r for r in results if r['result'] != 'success' and r['result_code'] == 'throttled']
-                    if throttled:
-                        throttled_rs = next(iter(throttled))
-                        throttled_idx = results.index(throttled_rs)
-                        queue = chunk[throttled_idx:] + queue
-                        responses.extend(results[:throttled_idx])
-                        unthrottled += throttled_idx
-                        chunk_size = unthrottled
-                        delay_next_batch = True
-                    else:
-                        responses.extend(results)
-                        unthrottled += len(results)
-        except Exception as e:
-            logging.error(e)
 
-    return responses
+def execute_batch(params, requests, *, max_parallel=1):
+    # type: (KeeperParams, List[dict], int) -> List[dict]
+    return [x.response for x in execute_batch_ex(params, requests, max_parallel=max_parallel)]
 
 
 def update_record(params, record, **kwargs):
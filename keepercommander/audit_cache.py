@@ -0,0 +1,260 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import datetime
+import hashlib
+import logging
+import os
+from typing import Optional, Tuple, Sequence, Iterable, List, Dict, Any
+
+from . import crypto, utils
+from .params import KeeperParams
+from .storage import cache_utils, sqlite_dao
+
+# raw audit event properties stored in the cache. Reports on other properties are sent to the server.
+AUDIT_CACHE_COLUMNS = (
+    'audit_event_type', 'username', 'to_username', 'from_username', 'ip_address', 'keeper_version',
+    'record_uid', 'shared_folder_uid', 'node', 'role_id', 'team_uid', 'channel', 'status', 'recipient', 'value'
+)
+# properties that identify people, devices or vault objects. They are stored as digests keyed by the data key
+AUDIT_CACHE_PRIVATE_COLUMNS = (
+    'username', 'to_username', 'from_username', 'ip_address', 'record_uid', 'shared_folder_uid', 'team_uid',
+    'recipient'
+)
+AUDIT_CACHE_AGGREGATES = {
+    'occurrences': 'COUNT(*)',
+    'first_created': 'MIN(created)',
+    'last_created': 'MAX(created)',
+}
+AUDIT_CACHE_PERIODS = {
+    'hour': ("strftime('%Y-%m-%d %H:00:00', created, 'unixepoch', 'localtime')", '%Y-%m-%d %H:%M:%S'),
+    'day': ("date(created, 'unixepoch', 'localtime')", '%Y-%m-%d'),
+    'week': ("date(created, 'unixepoch', 'localtime', 'weekday 0', '-6 days')", '%Y-%m-%d'),
+    'month': ("strftime('%Y-%m-01', created, 'unixepoch', 'localtime')", '%Y-%m-%d'),
+}
+
+
+def get_audit_cache_database_name(params):  # type: (KeeperParams) -> str
+    return cache_utils.get_cache_database_name(params.config_filename, 'audit', params.account_uid_bytes)
+
+
+def get_created_range(created, now=None):
+    # type: (Any, Optional[datetime.datetime]) -> Tuple[Optional[int], Optional[int]]
+    """Converts audit-report "created" filter to an inclusive (min, max) range of timestamps"""
+    if created is None:
+        return None, None
+    if isinstance(created, int):
+        return created, created
+    if isinstance(created, dict):
+        created_min = created.get('min')
+        if created_min is not None and created.get('exclude_min'):
+            created_min += 1
+        created_max = created.get('max')
+        if created_max is not None and created.get('exclude_max'):
+            created_max -= 1
+        return created_min, created_max
+
+    now = now or datetime.datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = today.replace(day=1)
+    if created == 'today':
+        start, end = today, None
+    elif created == 'yesterday':
+        start, end = today - datetime.timedelta(days=1), today
+    elif created == 'last_7_days':
+        start, end = today - datetime.timedelta(days=7), None
+    elif created == 'last_30_days':
+        start, end = today - datetime.timedelta(days=30), None
+    elif created == 'month_to_date':
+        start, end = month_start, None
+    elif created == 'last_month':
+        start, end = (month_start - datetime.timedelta(days=1)).replace(day=1), month_start
+    elif created == 'year_to_date':
+        start, end = today.replace(month=1, day=1), None
+    elif created == 'last_year':
+        end = today.replace(month=1, day=1)
+        start = end.replace(year=end.year - 1)
+    else:
+        raise ValueError(f'Unsupported created filter: {created}')
+    return int(start.timestamp()), int(end.timestamp()) - 1 if end else None
+
+
+class SqliteAuditEventCache:
+    """Local store of raw enterprise audit events that answers aggregate audit reports
+
+    Events are kept in a single table with one column per event property. The cache
+    remembers the continuous "created" range it holds so it can be extended at either end.
+    Identifying properties are stored as keyed digests; their values are encrypted with the data key.
+    """
+    def __init__(self, database_name, data_key):   # type: (str, bytes) -> None
+        self.database_name = database_name
+        self._data_key = data_key
+        self._values = {}    # type: Dict[str, str]
+        if not os.path.exists(database_name):
+            os.close(os.open(database_name, os.O_WRONLY | os.O_CREAT, 0o600))
+            logging.warning('Audit event cache "%s" is created. It keeps enterprise audit events on this computer. '
+                            'Delete the file to remove them.', database_name)
+        self._connection_manager = sqlite_dao.SqliteConnectionManager(database_name)
+        connection = self._connection_manager.get_connection()
+        if not connection.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='AuditValue'").fetchone():
+            # events cached before the identifying properties were digested are dropped
+            connection.execute('DROP TABLE IF EXISTS AuditEvent')
+            connection.execute('DROP TABLE IF EXISTS AuditEventRange')
+            os.chmod(database_name, 0o600)
+        connection.execute('CREATE TABLE IF NOT EXISTS AuditValue (digest TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS AuditEvent (id INTEGER PRIMARY KEY, created INTEGER NOT NULL, ' +
+                           ', '.join(AUDIT_CACHE_COLUMNS) + ')')
+        connection.execute('CREATE INDEX IF NOT EXISTS AuditEvent_Created_IDX ON AuditEvent (created)')
+        connection.execute('CREATE TABLE IF NOT EXISTS AuditEventRange (first_created INTEGER, last_created INTEGER)')
+        connection.commit()
+
+    def close(self):
+        self._connection_manager.close()
+
+    def _digest(self, value):   # type: (Any) -> str
+        return utils.base64_url_encode(
+            hashlib.blake2b(str(value).encode('utf-8'), digest_size=16, key=self._data_key).digest())
+
+    def _resolve_values(self, digests):   # type: (Iterable[str]) -> None
+        to_load = [x for x in set(digests) if x and x not in self._values]
+        connection = self._connection_manager.get_connection()
+        while to_load:
+            chunk = to_load[:500]
+            to_load = to_load[500:]
+            query = 'SELECT digest, data FROM AuditValue WHERE digest IN (' + ', '.join(('?' for _ in chunk)) + ')'
+            for digest, data in connection.execute(query, chunk):
+                try:
+                    self._values[digest] = crypto.decrypt_aes_v2(data, self._data_key).decode('utf-8')
+                except Exception as e:
+                    logging.debug('Audit event cache: value decryption error: %s', e)
+
+    def get_range(self):   # type: () -> Tuple[Optional[int], Optional[int]]
+        """Returns the inclusive range of created timestamps held in the cache"""
+        row = self._connection_manager.get_connection().execute(
+            'SELECT first_created, last_created FROM AuditEventRange').fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def add_events(self, events, created_min, created_max):
+        # type: (Iterable[dict], int, int) -> int
+        """Stores raw events loaded for the inclusive created range adjacent to or overlapping the cached range"""
+        first_created, last_created = self.get_range()
+        if first_created is not None:
+            created_min = min(created_min, first_created)
+            created_max = max(created_max, last_created)
+        values = {}    # type: Dict[str, str]
+        rows = []
+        for event in events:
+            row = [event['id'], int(event['created'])]
+            for column in AUDIT_CACHE_COLUMNS:
+                value = event.get(column)
+                if value is not None and column in AUDIT_CACHE_PRIVATE_COLUMNS:
+                    digest = self._digest(value)
+                    if digest not in values and digest not in self._values:
+                        values[digest] = str(value)
+                    value = digest
+                row.append(value)
+            rows.append(row)
+        query = 'INSERT OR IGNORE INTO AuditEvent (id, created, ' + ', '.join(AUDIT_CACHE_COLUMNS) + \
+                ') VALUES (?, ?, ' + ', '.join(('?' for _ in AUDIT_CACHE_COLUMNS)) + ')'
+        with self._connection_manager.transaction() as connection:
+            connection.executemany('INSERT OR IGNORE INTO AuditValue (digest, data) VALUES (?, ?)',
+                                   ((x, crypto.encrypt_aes_v2(y.encode('utf-8'), self._data_key))
+                                    for x, y in values.items()))
+            rs = connection.executemany(query, rows)
+            connection.execute('DELETE FROM AuditEventRange')
+            connection.execute('INSERT INTO AuditEventRange (first_created, last_created) VALUES (?, ?)',
+                               (created_min, created_max))
+        self._values.update(values)
+        return rs.rowcount
+
+    def clear(self):
+        with self._connection_manager.transaction() as connection:
+            connection.execute('DELETE FROM AuditEvent')
+            connection.execute('DELETE FROM AuditEventRange')
+            connection.execute('DELETE FROM AuditValue')
+        self._values.clear()
+
+    @staticmethod
+    def supports(report_type, columns, aggregates, audit_filter):
+        # type: (str, Sequence[str], Sequence[str], Dict[str, Any]) -> bool
+        if report_type != 'span' and report_type not in AUDIT_CACHE_PERIODS:
+            return False
+        if any(True for x in columns if x not in AUDIT_CACHE_COLUMNS):
+            return False
+        if any(True for x in aggregates if x not in AUDIT_CACHE_AGGREGATES):
+            return False
+        return all(x == 'created' or x in AUDIT_CACHE_COLUMNS for x in audit_filter)
+
+    def query(self, report_type, columns, aggregates, audit_filter, order='descending', limit=None):
+        # type: (str, Sequence[str], Sequence[str], Dict[str, Any], str, Optional[int]) -> List[dict]
+        """Aggregates cached events the way get_audit_event_reports does for span, hour, day, week and month reports"""
+        wheres = []
+        values = []
+        created_min, created_max = get_created_range(audit_filter.get('created'))
+        if created_min is not None:
+            wheres.append('created >= ?')
+            values.append(created_min)
+        if created_max is not None:
+            wheres.append('created <= ?')
+            values.append(created_max)
+        for column, value in audit_filter.items():
+            if column == 'created':
+                continue
+            if column in AUDIT_CACHE_PRIVATE_COLUMNS:
+                value = [self._digest(x) for x in value] if isinstance(value, (list, tuple, set)) else \
+                    self._digest(value)
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                wheres.append(f'{column} IN (' + ', '.join(('?' for _ in value)) + ')')
+                values.extend(value)
+            else:
+                wheres.append(f'{column} = ?')
+                values.append(value)
+
+        aggregates = list(aggregates) or ['occurrences']
+        period = AUDIT_CACHE_PERIODS.get(report_type)
+        group_by = list(columns)
+        select = list(columns)
+        if period:
+            select.insert(0, f'{period[0]} AS period')
+            group_by.insert(0, 'period')
+        select.extend((AUDIT_CACHE_AGGREGATES[x] for x in aggregates))
+
+        query = 'SELECT ' + ', '.join(select) + ' FROM AuditEvent'
+        if wheres:
+            query += ' WHERE ' + ' AND '.join(wheres)
+        if group_by:
+            query += ' GROUP BY ' + ', '.join(group_by)
+        direction = 'ASC' if order == 'ascending' else 'DESC'
+        query += f' ORDER BY period {direction}' if period else f' ORDER BY COUNT(*) {direction}'
+        if limit and limit > 0:
+            query += f' LIMIT {int(limit)}'
+
+        result = [list(x) for x in self._connection_manager.get_connection().execute(query, values)]
+        offset = 1 if period else 0
+        private_columns = [i + offset for i, x in enumerate(columns) if x in AUDIT_CACHE_PRIVATE_COLUMNS]
+        if private_columns:
+            self._resolve_values((row[i] for row in result for i in private_columns))
+            for row in result:
+                for i in private_columns:
+                    if row[i] is not None:
+                        row[i] = self._values.get(row[i], row[i])
+        rows = []
+        for row in result:
+            event = {}
+            if period:
+                event['created'] = int(datetime.datetime.strptime(row.pop(0), period[1]).timestamp())
+            for column in columns:
+                event[column] = row.pop(0)
+            for aggregate in aggregates:
+                event[aggregate] = row.pop(0)
+            rows.append(event)
+        return rows
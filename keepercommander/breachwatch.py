@@ -9,10 +9,12 @@
 # Contact: ops@keepersecurity.com
 #
 import base64
+import hashlib
 import json
 import logging
+import os
 from urllib.parse import urlparse, urlunparse
-from typing import Iterator, Tuple, Optional, List, Callable, Dict, Iterable
+from typing import Iterator, Tuple, Optional, List, Callable, Dict, Iterable, Set
 
 from .constants import KEEPER_PUBLIC_HOSTS
 from . import api, crypto, utils, rest_api, vault
@@ -21,6 +23,103 @@ from .error import KeeperApiError
 from .params import KeeperParams
 
 
+class ReusedPasswordIndex:
+    """Counts of records sharing the same password
+
+    Passwords are keyed by a hash salted with a random per-session value. Only version 2 and 3
+    records are indexed. sync_down invalidates changed records; they are re-indexed on the next read.
+    """
+    def __init__(self):
+        self._salt = os.urandom(16)
+        self._record_hashes = {}     # type: Dict[str, Tuple[bytes, bool]]
+        self._counts = {}            # type: Dict[bytes, int]
+        self._owned_counts = {}      # type: Dict[bytes, int]
+        self._reused = 0
+        self._owned_reused = 0
+        self._dirty = set()          # type: Set[str]
+        self._rebuild = True
+
+    def invalidate(self, record_uids=None):    # type: (Optional[Iterable[str]]) -> None
+        if record_uids is None:
+            self._rebuild = True
+        else:
+            self._dirty.update(record_uids)
+
+    @staticmethod
+    def _reused_delta(count, delta):    # type: (int, int) -> int
+        before = count if count > 1 else 0
+        count += delta
+        return (count if count > 1 else 0) - before
+
+    def _update_count(self, counts, password_hash, delta):    # type: (Dict[bytes, int], bytes, int) -> int
+        count = counts.get(password_hash, 0)
+        reused_delta = ReusedPasswordIndex._reused_delta(count, delta)
+        count += delta
+        if count > 0:
+            counts[password_hash] = count
+        else:
+            counts.pop(password_hash, None)
+        return reused_delta
+
+    def _remove_record(self, record_uid):    # type: (str) -> None
+        entry = self._record_hashes.pop(record_uid, None)
+        if entry:
+            password_hash, owned = entry
+            self._reused += self._update_count(self._counts, password_hash, -1)
+            if owned:
+                self._owned_reused += self._update_count(self._owned_counts, password_hash, -1)
+
+    def _add_record(self, params, record_uid):    # type: (KeeperParams, str) -> None
+        record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
+        if not record or record.version not in (2, 3):
+            return
+        password = BreachWatch.extract_password(record)
+        if not password:
+            return
+        password_hash = hashlib.blake2b(password.encode('utf-8'), digest_size=16, key=self._salt).digest()
+        owner = params.record_owner_cache.get(record_uid)
+        owned = owner is not None and owner.owner is True
+        self._record_hashes[record_uid] = password_hash, owned
+        self._reused += self._update_count(self._counts, password_hash, 1)
+        if owned:
+            self._owned_reused += self._update_count(self._owned_counts, password_hash, 1)
+
+    def refresh(self, params):    # type: (KeeperParams) -> None
+        if self._rebuild:
+            self._record_hashes.clear()
+            self._counts.clear()
+            self._owned_counts.clear()
+            self._reused = 0
+            self._owned_reused = 0
+            self._dirty.clear()
+            self._rebuild = False
+            for record_uid in params.record_cache:
+                self._add_record(params, record_uid)
+        elif self._dirty:
+            for record_uid in self._dirty:
+                self._remove_record(record_uid)
+                if record_uid in params.record_cache:
+                    self._add_record(params, record_uid)
+            self._dirty.clear()
+
+    def get_reused_count(self, params, owned=False):    # type: (KeeperParams, bool) -> int
+        """Returns the number of records whose password is used by more than one record"""
+        self.refresh(params)
+        return self._owned_reused if owned else self._reused
+
+    def get_password_use_count(self, params, record_uid):    # type: (KeeperParams, str) -> int
+        """Returns the number of records using the same password as the record"""
+        self.refresh(params)
+        entry = self._record_hashes.get(record_uid)
+        return self._counts.get(entry[0], 0) if entry else 0
+
+
+def get_reused_password_index(params):    # type: (KeeperParams) -> ReusedPasswordIndex
+    if params.reused_password_index is None:
+        params.reused_password_index = ReusedPasswordIndex()
+    return params.reused_password_index
+
+
 class BreachWatch(object):
     def __init__(self):
         self.rest_api = None
@@ -108,6 +207,16 @@ class BreachWatch(object):
 
     def scan_and_store_record_status(self, params, record_uid, force_update=False, is_reset=False, set_reused_pws=None):
         # type: (KeeperParams, str, bool, bool, Optional[bool]) -> None
+        self.scan_and_store_record_statuses(params, [record_uid], force_update, is_reset, set_reused_pws)
+
+    def scan_and_store_record_statuses(self, params, record_uids, force_update=False, is_reset=False,
+                                       set_reused_pws=None):
+        # type: (KeeperParams, Iterable[str], bool, bool, Optional[bool]) -> None
+        """Scans passwords of many records and stores their BreachWatch status
+
+        Passwords are checked in chunked status requests and record updates are sent in bulk.
+        Vault is synced, and security data and reused password count are updated once at the end.
+        """
         def calculate_security_data(rec_uid, rec, bw_result=None, reset=False):
             # type: (str, vault.KeeperRecord, Optional[int], bool) -> APIRequest_pb2.SecurityData
             sec_data = APIRequest_pb2.SecurityData()
@@ -127,21 +236,16 @@ class BreachWatch(object):
             sec_data.data = crypto.encrypt_rsa(json.dumps(rec_sd).encode('utf-8'), params.enterprise_rsa_key)
             return sec_data
 
-        def save_security_data(rec_uid, rec, bw_result=None, reset=False):
-            # type: (str, vault.KeeperRecord, Optional[int], bool) -> None
-            update_rq = APIRequest_pb2.SecurityDataRequest()
-            rec_sec_data = calculate_security_data(rec_uid, rec, bw_result, reset)
-            update_rq.recordSecurityData.append(rec_sec_data)
-            api.communicate_rest(params, update_rq, 'enterprise/update_security_data')
-
-        record = vault.KeeperRecord.load(params, record_uid)
-        if not record:
-            return
-        if not isinstance(record, (vault.PasswordRecord, vault.TypedRecord)):
-            return
-
-        record_password = BreachWatch.extract_password(record)
-        if record_password:
+        to_scan = []    # type: List[Tuple[vault.KeeperRecord, str, Optional[bytes]]]
+        for record_uid in dict.fromkeys(record_uids):
+            record = vault.KeeperRecord.load(params, record_uid)
+            if not record:
+                continue
+            if not isinstance(record, (vault.PasswordRecord, vault.TypedRecord)):
+                continue
+            record_password = BreachWatch.extract_password(record)
+            if not record_password:
+                continue
             bw_record = params.breach_watch_records.get(record_uid) if params.breach_watch_records else None
             euid = None
             if bw_record:
@@ -149,17 +253,56 @@ class BreachWatch(object):
                 if data_obj and 'passwords' in data_obj:
                     password = next((x for x in data_obj['passwords'] if x.get('value', '') == record_password), None)
                     if password and not force_update:
-                        return
+                        continue
                     euid = next((base64.b64decode(x['euid']) for x in data_obj['passwords'] if 'euid' in x), None)
+            to_scan.append((record, record_password, euid))
+        if len(to_scan) == 0:
+            return
 
-            hash_status = self.scan_password(params, record_password, euid)
+        hash_statuses = {}    # type: Dict[bytes, breachwatch_pb2.HashStatus]
+        checks = {}           # type: Dict[bytes, breachwatch_pb2.HashCheck]
+        record_hashes = []    # type: List[bytes]
+        for record, record_password, euid in to_scan:
+            bw_hash = utils.breach_watch_hash(record_password)
+            record_hashes.append(bw_hash)
+            if bw_hash in hash_statuses or bw_hash in checks:
+                continue
+            if not euid and utils.password_score(record_password) < 40:
+                status = breachwatch_pb2.HashStatus()
+                status.hash1 = bw_hash
+                status.breachDetected = True
+                hash_statuses[bw_hash] = status
+            else:
+                check = breachwatch_pb2.HashCheck()
+                check.hash1 = bw_hash
+                if euid:
+                    check.euid = euid
+                checks[bw_hash] = check
+        if checks:
+            self._ensure_init(params)
+            hashes = list(checks.values())
+            while len(hashes) > 0:
+                chunk = hashes[:500]
+                hashes = hashes[500:]
+                rq = breachwatch_pb2.BreachWatchStatusRequest()
+                rq.hashCheck.extend(chunk)
+                rs = self._execute_status(rq)
+                for status in rs.hashStatus:
+                    hash_statuses[status.hash1] = status
+
+        bw_requests = []    # type: List[breachwatch_pb2.BreachWatchRecordRequest]
+        bw_results = {}     # type: Dict[str, int]
+        for (record, record_password, _), bw_hash in zip(to_scan, record_hashes):
+            hash_status = hash_statuses.get(bw_hash)
+            if not hash_status:
+                continue
             if hash_status.breachDetected:
                 logging.info('High-Risk password detected')
                 if self.send_audit_events:
                     params.queue_audit_event('bw_record_high_risk')
 
             bwrq = breachwatch_pb2.BreachWatchRecordRequest()
-            bwrq.recordUid = utils.base64_url_decode(record_uid)
+            bwrq.recordUid = utils.base64_url_decode(record.record_uid)
             bwrq.breachWatchInfoType = breachwatch_pb2.RECORD
             bwrq.updateUserWhoScanned = True
             bw_password = client_pb2.BWPassword()
@@ -169,48 +312,48 @@ class BreachWatch(object):
             bw_data = client_pb2.BreachWatchData()
             bw_data.passwords.append(bw_password)
             data = bw_data.SerializeToString()
+            bw_results[record.record_uid] = bw_password.status
             try:
-                record_key = params.record_cache[record_uid]['record_key_unencrypted']
+                record_key = params.record_cache[record.record_uid]['record_key_unencrypted']
                 bwrq.encryptedData = crypto.encrypt_aes_v2(data, record_key)
-                rq = breachwatch_pb2.BreachWatchUpdateRequest()
-                rq.breachWatchRecordRequest.append(bwrq)
+            except Exception as e:
+                logging.warning('BreachWatch: %s', str(e))
+                continue
+            bw_requests.append(bwrq)
+
+        while bw_requests:
+            chunk = bw_requests[:999]
+            bw_requests = bw_requests[999:]
+            rq = breachwatch_pb2.BreachWatchUpdateRequest()
+            rq.breachWatchRecordRequest.extend(chunk)
+            try:
                 rs = api.communicate_rest(params, rq, 'breachwatch/update_record_data',
                                           rs_type=breachwatch_pb2.BreachWatchUpdateResponse)
-                status = rs.breachWatchRecordStatus[0]
-                if status.reason:
-                    raise Exception(status.reason)
+                for status in rs.breachWatchRecordStatus:
+                    if status.reason:
+                        logging.warning('BreachWatch: %s', status.reason)
             except Exception as e:
                 logging.warning('BreachWatch: %s', str(e))
-            api.sync_down(params)
-            if params.enterprise_rsa_key and record.version in (2, 3):
-                bw_res = bw_data.passwords[0].status
-                save_security_data(record_uid, record, bw_res, is_reset)
+        api.sync_down(params)
+
+        if params.enterprise_rsa_key:
+            security_data = [calculate_security_data(x.record_uid, x, bw_results.get(x.record_uid), is_reset)
+                             for x, _, _ in to_scan if x.version in (2, 3) and x.record_uid in bw_results]
+            while security_data:
+                update_rq = APIRequest_pb2.SecurityDataRequest()
+                update_rq.recordSecurityData.extend(security_data[:1000])
+                security_data = security_data[1000:]
+                api.communicate_rest(params, update_rq, 'enterprise/update_security_data')
 
-            if set_reused_pws is None:
-                BreachWatch.save_reused_pw_count(params)
+        if set_reused_pws is None:
+            BreachWatch.save_reused_pw_count(params)
 
     @staticmethod
     def save_reused_pw_count(params):
-        def get_reused_pw_count(recs):   # type: (Iterable[vault.KeeperRecord]) -> int
-            pw_counts = {}
-            for rec in recs:
-                pw = BreachWatch.extract_password(rec)
-                if pw:
-                    pw_count = pw_counts.get(pw, 0)
-                    pw_counts[pw] = pw_count + 1
-
-            dupe_pw_counts = {k: v for k, v in pw_counts.items() if v > 1}
-            return sum([count for count in dupe_pw_counts.values()])
-
         if params.enterprise_ec_key:
             api.sync_down(params)
-            owned = [uid for uid, own in params.record_owner_cache.items()
-                              if own.owner is True and uid in params.record_cache]
-            owned_recs = [x for x in (vault.KeeperRecord.load(params, ruid) for ruid in owned)
-                          if x and x.version in (2, 3)]
-            total_reused = get_reused_pw_count(owned_recs)
             save_rq = APIRequest_pb2.ReusedPasswordsRequest()
-            save_rq.count = total_reused
+            save_rq.count = get_reused_password_index(params).get_reused_count(params, owned=True)
             api.communicate_rest(params, save_rq, 'enterprise/set_reused_passwords')
 
     def delete_euids(self, params, euids):
@@ -298,7 +441,7 @@ class BreachWatch(object):
             return
 
         for record_uid in params.record_cache:
-            record = vault.KeeperRecord.load(params, record_uid)
+            record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
             if not record:
                 continue
             if owned:
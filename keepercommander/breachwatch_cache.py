@@ -0,0 +1,123 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import hashlib
+import json
+import logging
+from typing import Dict, Iterable, Optional
+
+from . import crypto, utils
+from .params import KeeperParams
+from .proto import breachwatch_pb2
+from .storage import cache_utils, sqlite_dao
+
+
+class BreachWatchHashEntity:
+    def __init__(self):
+        self.hash_key = ''
+        self.data = b''
+        self.scanned = 0
+
+
+def get_breachwatch_cache_database_name(params):  # type: (KeeperParams) -> str
+    return cache_utils.get_cache_database_name(params.config_filename, 'breachwatch', params.account_uid_bytes)
+
+
+class SqliteBreachWatchCache:
+    """Local store of BreachWatch scan results used by incremental "breachwatch scan"
+
+    Password hashes are keyed by a digest derived from the user's data key, and hash status
+    is encrypted with the data key.
+    """
+    def __init__(self, database_name, owner, data_key):   # type: (str, str, bytes) -> None
+        self.database_name = database_name
+        self._data_key = data_key
+        self._connection_manager = sqlite_dao.SqliteConnectionManager(database_name)
+
+        hash_schema = sqlite_dao.TableSchema.load_schema(BreachWatchHashEntity, 'hash_key', owner_column='account_uid')
+        sqlite_dao.verify_database(self._connection_manager.get_connection(), (hash_schema,))
+        self._hashes = sqlite_dao.SqliteStorage(self._connection_manager.get_connection, hash_schema, owner)
+
+    def close(self):
+        self._connection_manager.close()
+
+    def _digest(self, data):   # type: (bytes) -> bytes
+        return hashlib.blake2b(data, digest_size=16, key=self._data_key).digest()
+
+    def get_hash_key(self, bw_hash):   # type: (bytes) -> str
+        return utils.base64_url_encode(self._digest(bw_hash))
+
+    def get_hash_statuses(self, bw_hashes, scanned_after=0):
+        # type: (Iterable[bytes], int) -> Dict[bytes, breachwatch_pb2.HashStatus]
+        """Returns cached statuses of password hashes scanned after the given time in milliseconds"""
+        hash_keys = {self.get_hash_key(x): x for x in bw_hashes}
+        statuses = {}    # type: Dict[bytes, breachwatch_pb2.HashStatus]
+        for entity in self._hashes.select_by_values('hash_key', list(hash_keys.keys())):
+            if entity.scanned <= scanned_after:
+                continue
+            try:
+                data = json.loads(crypto.decrypt_aes_v2(entity.data, self._data_key))
+            except Exception as e:
+                logging.debug('BreachWatch cache: hash status decryption error: %s', e)
+                continue
+            status = breachwatch_pb2.HashStatus()
+            status.hash1 = hash_keys[entity.hash_key]
+            status.breachDetected = data.get('breach_detected') is True
+            euid = data.get('euid')
+            if euid:
+                status.euid = utils.base64_url_decode(euid)
+            statuses[status.hash1] = status
+        return statuses
+
+    def put_hash_statuses(self, statuses, scanned):
+        # type: (Iterable[breachwatch_pb2.HashStatus], int) -> None
+        entities = []
+        for status in statuses:
+            data = {'breach_detected': status.breachDetected}
+            if status.euid:
+                data['euid'] = utils.base64_url_encode(status.euid)
+            entity = BreachWatchHashEntity()
+            entity.hash_key = self.get_hash_key(status.hash1)
+            entity.data = crypto.encrypt_aes_v2(json.dumps(data).encode('utf-8'), self._data_key)
+            entity.scanned = scanned
+            entities.append(entity)
+        if entities:
+            self._hashes.put(entities)
+
+    def remove_euids(self, euids):   # type: (Iterable[bytes]) -> None
+        """Forgets hash statuses that refer to EUIDs removed from BreachWatch"""
+        euids = {utils.base64_url_encode(x) for x in euids}
+        if not euids:
+            return
+        to_delete = []
+        for entity in self._hashes.select_all():
+            try:
+                data = json.loads(crypto.decrypt_aes_v2(entity.data, self._data_key))
+            except Exception:
+                data = {}
+            if not data or data.get('euid') in euids:
+                to_delete.append(entity.hash_key)
+        if to_delete:
+            self._hashes.delete_by_filter('hash_key', to_delete, multiple_criteria=True)
+
+    def clear(self):
+        with self._connection_manager.transaction():
+            self._hashes.delete_all()
+
+
+def open_breachwatch_cache(params):     # type: (KeeperParams) -> Optional[SqliteBreachWatchCache]
+    if not params.data_key or not params.account_uid_bytes:
+        return None
+    try:
+        return SqliteBreachWatchCache(get_breachwatch_cache_database_name(params),
+                                      utils.base64_url_encode(params.account_uid_bytes), params.data_key)
+    except Exception as e:
+        logging.warning('BreachWatch scan cache is disabled: %s', e)
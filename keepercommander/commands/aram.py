@@ -12,9 +12,13 @@
 import abc
 import argparse
 import base64
+import collections
 import copy
 import datetime
+import itertools
 import os
+import queue
+import threading
 import time
 import json
 import gzip
@@ -22,9 +26,10 @@ import logging
 import platform
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
-from typing import Optional, List, Union, Dict
+from typing import Optional, List, Union, Dict, Tuple, Iterable, Iterator
 
 import requests
 import socket
@@ -40,6 +45,7 @@ from .helpers import audit_report
 from .enterprise_common import EnterpriseCommand
 from .base import user_choice, suppress_exit, raise_parse_exception, dump_report_data, Command
 from .. import api, vault, record_management
+from ..audit_cache import SqliteAuditEventCache, get_audit_cache_database_name, get_created_range
 from ..error import CommandError
 from ..params import KeeperParams
 from ..proto import enterprise_pb2
@@ -91,6 +97,15 @@ audit_report_parser.add_argument('--shared-folder-uid', dest='shared_folder_uid'
                                  help='Filter: Shared Folder UID')
 min_opt_help = 'limit report to event-specific and local data (skips retrieval of compliance data if not in cache)'
 audit_report_parser.add_argument('--minimal', action='store_true', help=min_opt_help)
+audit_report_parser.add_argument('--cache', dest='cache', action='store_true',
+                                 help='answer span, hour, day, week and month reports from the local audit event cache. '
+                                      'New events are downloaded to the cache before the report runs. '
+                                      'The first run needs --created with a start date')
+audit_report_parser.add_argument('--backfill-workers', dest='backfill_workers', type=int, action='store',
+                                 help='raw reports only: split the --created range into time windows and '
+                                      'load them concurrently with this many workers')
+audit_report_parser.add_argument('--backfill-window', dest='backfill_window', action='store',
+                                 help='backfill time window length: 30m, 6h, 1d. Default: 1d')
 audit_report_parser.error = raise_parse_exception
 audit_report_parser.exit = suppress_exit
 
@@ -103,6 +118,13 @@ audit_log_parser.add_argument('--target', dest='target', action='store', require
                               help='export target')
 audit_log_parser.add_argument('--record', dest='record', action='store',
                               help='keeper record name or UID')
+audit_log_parser.add_argument('--backfill-from', dest='backfill_from', action='store',
+                              help='export events created since date (YYYY-MM-DD) by loading time windows concurrently. '
+                                   'Progress is saved after every window')
+audit_log_parser.add_argument('--backfill-window', dest='backfill_window', action='store',
+                              help='backfill time window length: 30m, 6h, 1d. Default: 1d')
+audit_log_parser.add_argument('--backfill-workers', dest='backfill_workers', type=int, action='store',
+                              help='number of time windows loaded concurrently. Default: 4')
 audit_log_parser.error = raise_parse_exception
 audit_log_parser.exit = suppress_exit
 
@@ -153,6 +175,15 @@ syslog_templates = None  # type: Optional[List[str]]
 
 API_EVENT_SUMMARY_ROW_LIMIT = 2000
 API_EVENT_RAW_ROW_LIMIT = 1000
+# number of fetched audit-log pages waiting to be exported
+AUDIT_LOG_QUEUE_SIZE = 4
+BACKFILL_DEFAULT_WINDOW = 24 * 60 * 60
+BACKFILL_DEFAULT_WORKERS = 4
+# seconds between backfill progress checkpoints. Each one updates the export record and syncs the vault
+AUDIT_LOG_CHECKPOINT_INTERVAL = 60
+# audit events can be indexed minutes after they are created. The cached range ends this many seconds ago
+# so the next sync loads the trailing events again
+AUDIT_CACHE_SETTLE_TIME = 15 * 60
 
 
 def load_syslog_templates(params):
@@ -171,6 +202,82 @@ def load_syslog_templates(params):
                 syslog_templates[name] = syslog
 
 
+def parse_backfill_window(value):   # type: (Optional[str]) -> int
+    if not value:
+        return BACKFILL_DEFAULT_WINDOW
+    match = re.match(r'^\s*(\d+)\s*([smhd]?)\s*$', value.lower())
+    if not match or int(match.group(1)) <= 0:
+        raise CommandError('', f'Invalid backfill window "{value}". Examples: 30m, 6h, 1d')
+    units = {'': 1, 's': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+    return int(match.group(1)) * units[match.group(2)]
+
+
+def split_time_windows(created_min, created_max, window_length):
+    # type: (int, int, int) -> List[Tuple[int, int]]
+    """Splits an inclusive created range into consecutive inclusive windows"""
+    windows = []
+    start = created_min
+    while start <= created_max:
+        end = min(start + window_length - 1, created_max)
+        windows.append((start, end))
+        start = end + 1
+    return windows
+
+
+def load_window_events(params, rq, window):   # type: (KeeperParams, dict, Tuple[int, int]) -> List[dict]
+    """Loads raw audit events created within the window in ascending order"""
+    created_min, created_max = window
+    events = []
+    window_time = 0
+    window_ids = set()
+    while created_min <= created_max:
+        page_rq = {**rq, 'report_type': 'raw', 'order': 'ascending', 'limit': API_EVENT_RAW_ROW_LIMIT}
+        page_rq['filter'] = {**rq.get('filter', {}), 'created': {'min': created_min, 'max': created_max}}
+        rs = api.communicate(params, page_rq)
+        rows = rs.get('audit_event_overview_report_rows') or []
+        for row in rows:
+            # the next page starts at the last second of this page
+            created = int(row['created'])
+            if created != window_time:
+                window_time = created
+                window_ids.clear()
+            if row['id'] in window_ids:
+                continue
+            window_ids.add(row['id'])
+            events.append(row)
+        if len(rows) < API_EVENT_RAW_ROW_LIMIT:
+            break
+        last_created = int(rows[-1]['created'])
+        if last_created == created_min:
+            logging.warning('More than %d audit events are created at %d. Some events are skipped.',
+                            API_EVENT_RAW_ROW_LIMIT, last_created)
+            last_created += 1
+        created_min = last_created
+    return events
+
+
+def iterate_backfill_windows(params, rq, windows, max_workers):
+    # type: (KeeperParams, dict, Iterable[Tuple[int, int]], int) -> Iterator[Tuple[Tuple[int, int], List[dict]]]
+    """Loads time windows concurrently and yields (window, events) in the order of the windows"""
+    max_workers = max(max_workers, 1)
+    windows = iter(windows)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for window in itertools.islice(windows, max_workers * 2):
+                pending.append((window, executor.submit(load_window_events, params, rq, window)))
+            while pending:
+                window, future = pending.popleft()
+                events = future.result()
+                next_window = next(windows, None)
+                if next_window:
+                    pending.append((next_window, executor.submit(load_window_events, params, rq, next_window)))
+                yield window, events
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
 class AuditLogBaseExport(abc.ABC):
     def __init__(self):
         self.store_record = False
@@ -195,6 +302,9 @@ class AuditLogBaseExport(abc.ABC):
     def export_events(self, props, events):  # type: (dict, list)  -> None
         pass
 
+    def finalize(self, props):  # type: (dict)  -> None
+        pass
+
     @staticmethod
     def get_event_message(event):
         message = ''
@@ -586,24 +696,46 @@ class AuditLogSumologicExport(AuditLogBaseExport):
 
 
 class AuditLogJsonExport(AuditLogBaseExport):
+    """Streams events to a JSON array file or, for .ndjson and .jsonl files, to newline-delimited JSON
+
+    A .gz suffix compresses the output. JSON files are rewritten on every export,
+    newline-delimited JSON files are appended to.
+    """
     def __init__(self):
         super(AuditLogJsonExport, self).__init__()
+        self.logf = None
+        self.event_count = 0
 
     def default_record_title(self):
         return 'Audit Log: JSON'
 
+    @staticmethod
+    def is_ndjson(filename):   # type: (str) -> bool
+        name = filename[:-3] if filename.endswith('.gz') else filename
+        return name.endswith(('.ndjson', '.jsonl'))
+
     def get_properties(self, record, props):
         filename = AuditLogBaseExport.get_record_login(record)
         if not filename:
             filename = input('JSON File name: ')
             if not filename:
                 return
+            if not filename.endswith('.gz'):
+                gz = input('Gzip events? (y/N): ')
+                if gz.lower() == 'y':
+                    filename = filename + '.gz'
             AuditLogBaseExport.set_record_login(record, filename)
             self.store_record = True
         props['filename'] = filename
 
-        with open(filename, mode='w') as logf:
-            json.dump([], logf)
+        mode = 'at' if AuditLogJsonExport.is_ndjson(filename) else 'wt'
+        if filename.endswith('.gz'):
+            self.logf = gzip.open(filename, mode=mode, encoding='utf-8')
+        else:
+            self.logf = open(filename, mode=mode, encoding='utf-8')
+        self.event_count = 0
+        if not AuditLogJsonExport.is_ndjson(filename):
+            self.logf.write('[')
 
     def convert_event(self, props, event):
         dt = datetime.datetime.fromtimestamp(event['created'], tz=datetime.timezone.utc)
@@ -614,18 +746,25 @@ class AuditLogJsonExport(AuditLogBaseExport):
         return evt
 
     def export_events(self, props, events):
-        filename = props['filename']
+        ndjson = AuditLogJsonExport.is_ndjson(props['filename'])
+        for event in events:
+            if ndjson:
+                self.logf.write(json.dumps(event))
+                self.logf.write('\n')
+            else:
+                self.logf.write(',\n' if self.event_count > 0 else '\n')
+                self.logf.write(json.dumps(event))
+            self.event_count += 1
+        self.logf.flush()
 
-        with open(filename, mode='r') as logf:
+    def finalize(self, props):
+        if self.logf:
             try:
-                data = json.load(logf)
-                for record in events:
-                    data.append(record)
-            except ValueError:
-                data = events
-
-        with open(filename, mode='w') as logf:
-            json.dump(data, logf)
+                if not AuditLogJsonExport.is_ndjson(props['filename']):
+                    self.logf.write('\n]' if self.event_count > 0 else ']')
+            finally:
+                self.logf.close()
+                self.logf = None
 
 
 class AuditLogAzureLogAnalyticsExport(AuditLogBaseExport):
@@ -737,9 +876,12 @@ class AuditLogCommand(EnterpriseCommand):
         record_name = kwargs.get('record') or log_export.default_record_title()
 
         for r_uid in params.record_cache:
-            rec = vault.KeeperRecord.load(params, r_uid)
-            if record_name in [rec.record_uid, rec.title]:
+            rec = vault.KeeperRecord.load(params, r_uid, use_cache=True)
+            if rec and record_name in [rec.record_uid, rec.title]:
                 record = rec
+        if record is not None:
+            # the settings record is updated below
+            record = vault.KeeperRecord.load(params, record.record_uid)
         if record is None:
             answer = user_choice('Do you want to create a Keeper record to store audit log settings?', 'yn', 'n')
             if answer.lower() == 'y':
@@ -775,10 +917,7 @@ class AuditLogCommand(EnterpriseCommand):
             except:
                 pass
 
-        events = []
-        finished = False
         count = 0
-        logged_ids = set()
         chunk_length = log_export.chunk_size()
 
         anonymize = bool(kwargs.get('anonymize'))
@@ -786,76 +925,169 @@ class AuditLogCommand(EnterpriseCommand):
         if anonymize and params.enterprise and 'users' in params.enterprise:
             ent_user_ids = {x.get('username'): x.get('enterprise_user_id') for x in params.enterprise['users']}
 
-        while not finished:
-            finished = True
+        backfill_windows = None    # type: Optional[List[Tuple[int, int]]]
+        if kwargs.get('backfill_from'):
+            backfill_start = max(AuditReportCommand.convert_date(kwargs['backfill_from']), last_event_time)
+            backfill_windows = split_time_windows(backfill_start, int(time.time()) - 1,
+                                                  parse_backfill_window(kwargs.get('backfill_window')))
+            logging.info('Backfill: %d time window(s) to export', len(backfill_windows))
+
+        # pages are fetched and converted on a background thread while the previous page is exported
+        page_queue = queue.Queue(maxsize=AUDIT_LOG_QUEUE_SIZE)
+        stop_fetch = threading.Event()
+        fetch_errors = []
+
+        def put_page(page):
+            while not stop_fetch.is_set():
+                try:
+                    page_queue.put(page, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def convert(event):
+            if anonymize:
+                uname = event.get('email') or event.get('username') or ''
+                ent_uid = self.resolve_uid(ent_user_ids, uname)
+                event['username'] = ent_uid
+                event['email'] = ent_uid
+                to_uname = event.get('to_username') or ''
+                if to_uname:
+                    event['to_username'] = self.resolve_uid(ent_user_ids, to_uname)
+                from_uname = event.get('from_username') or ''
+                if from_uname:
+                    event['from_username'] = self.resolve_uid(ent_user_ids, from_uname)
+            return log_export.convert_event(props, event)
+
+        def fetch_backfill_windows(windows):
             rq = {
                 'command': 'get_audit_event_reports',
-                'report_type': 'raw',
                 'scope': 'enterprise',
-                'limit': 1000,
-                'order': 'ascending'
             }
+            workers = kwargs.get('backfill_workers') or BACKFILL_DEFAULT_WORKERS
+            try:
+                for window, window_events in iterate_backfill_windows(params, rq, windows, workers):
+                    if stop_fetch.is_set():
+                        break
+                    put_page(([convert(x) for x in window_events], window[1] + 1))
+            except Exception as e:
+                fetch_errors.append(e)
+            finally:
+                put_page(None)
+
+        def fetch_pages(event_time):
+            # only events of the latest second can be returned again by the next query
+            window_time = 0
+            window_ids = set()
+            finished = False
+            try:
+                while not finished and not stop_fetch.is_set():
+                    finished = True
+                    rq = {
+                        'command': 'get_audit_event_reports',
+                        'report_type': 'raw',
+                        'scope': 'enterprise',
+                        'limit': 1000,
+                        'order': 'ascending'
+                    }
+
+                    if event_time > 0:
+                        rq['filter'] = {
+                            'created': {'min': event_time}
+                        }
 
-            if last_event_time > 0:
-                rq['filter'] = {
-                    'created': {'min': last_event_time}
-                }
-
-            rs = api.communicate(params, rq)
-            if rs['result'] == 'success':
-                finished = True
-                if 'audit_event_overview_report_rows' in rs:
+                    rs = api.communicate(params, rq)
+                    if rs['result'] != 'success' or 'audit_event_overview_report_rows' not in rs:
+                        break
                     audit_events = rs['audit_event_overview_report_rows']
                     event_count = len(audit_events)
-                    if event_count > 1:
-                        # remove events from the tail for the last second
-                        last_event_time = int(audit_events[-1]['created'])
-                        while len(audit_events) > 0:
-                            event = audit_events[-1]
-                            if int(event['created']) < last_event_time:
-                                break
-                            audit_events = audit_events[:-1]
-
-                        for event in audit_events:
-                            event_id = event['id']
-                            if event_id not in logged_ids:
-                                logged_ids.add(event_id)
-                                if anonymize:
-                                    uname = event.get('email') or event.get('username') or ''
-                                    ent_uid = self.resolve_uid(ent_user_ids, uname)
-                                    event['username'] = ent_uid
-                                    event['email'] = ent_uid
-                                    to_uname = event.get('to_username') or ''
-                                    if to_uname:
-                                        event['to_username'] = self.resolve_uid(ent_user_ids, to_uname)
-                                    from_uname = event.get('from_username') or ''
-                                    if from_uname:
-                                        event['from_username'] = self.resolve_uid(ent_user_ids, from_uname)
-                                events.append(log_export.convert_event(props, event))
-
-                        finished = len(events) == 0
-                        if finished:
-                            if event_count > 900:
-                                finished = False
-                                last_event_time += 1
-
-            while len(events) > 0:
-                to_store = events[:chunk_length]
-                events = events[chunk_length:]
-                log_export.export_events(props, to_store)
+                    if event_count <= 1:
+                        break
+
+                    # remove events from the tail for the last second
+                    event_time = int(audit_events[-1]['created'])
+                    while len(audit_events) > 0:
+                        event = audit_events[-1]
+                        if int(event['created']) < event_time:
+                            break
+                        audit_events = audit_events[:-1]
+
+                    events = []
+                    for event in audit_events:
+                        created = int(event['created'])
+                        if created != window_time:
+                            window_time = created
+                            window_ids.clear()
+                        event_id = event['id']
+                        if event_id in window_ids:
+                            continue
+                        window_ids.add(event_id)
+                        events.append(convert(event))
+
+                    finished = len(events) == 0
+                    if finished:
+                        if event_count > 900:
+                            finished = False
+                            event_time += 1
+                    put_page((events, event_time))
+            except Exception as e:
+                fetch_errors.append(e)
+            finally:
+                put_page(None)
+
+        def save_last_event_time():
+            nonlocal record
+            AuditLogBaseExport.set_record_custom(record, 'last_event_time', str(last_event_time))
+            record_management.update_record(params, record)
+            # the next checkpoint needs the record revision assigned by this update
+            api.sync_down(params)
+            record = vault.KeeperRecord.load(params, record.record_uid) or record
+
+        started = time.time()
+        last_checkpoint = started
+        if backfill_windows is not None:
+            fetcher = threading.Thread(target=fetch_backfill_windows, args=(backfill_windows,), daemon=True)
+        else:
+            fetcher = threading.Thread(target=fetch_pages, args=(last_event_time,), daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                page = page_queue.get()
+                if page is None:
+                    break
+                events, page_event_time = page
+                has_events = len(events) > 0
+                while len(events) > 0:
+                    to_store = events[:chunk_length]
+                    events = events[chunk_length:]
+                    log_export.export_events(props, to_store)
+                    if log_export.should_cancel:
+                        break
+                    count += len(to_store)
+                    print('+', file=sys.stderr, end='', flush=True)
                 if log_export.should_cancel:
-                    finished = True
                     break
-                count += len(to_store)
-                print('+', file=sys.stderr, end='', flush=True)
+                last_event_time = page_event_time
+                if backfill_windows is not None and has_events:
+                    # checkpoint: an interrupted backfill resumes from the next window
+                    now = time.time()
+                    if now - last_checkpoint >= AUDIT_LOG_CHECKPOINT_INTERVAL:
+                        save_last_event_time()
+                        last_checkpoint = now
+        finally:
+            stop_fetch.set()
+            log_export.finalize(props)
+        fetcher.join()
+        elapsed = time.time() - started
 
         if last_event_time > 0:
             logging.info('')
-            logging.info('Exported %d audit event(s)', count)
-            if count > 0:
-                AuditLogBaseExport.set_record_custom(record, 'last_event_time', str(last_event_time))
-                record_management.update_record(params, record)
-                params.sync_data = True
+            logging.info('Exported %d audit event(s) in %.1f seconds (%.0f events/s)',
+                         count, elapsed, count / elapsed if elapsed > 0 else 0)
+            if count > 0 or backfill_windows:
+                save_last_event_time()
+        if fetch_errors:
+            raise fetch_errors[0]
 
 
 audit_report_description = '''
@@ -978,6 +1210,9 @@ class AuditReportCommand(Command):
         lookup_type = audit_report.LookupType.lookup_type_from_field_name(field)
         uid_value = event.get(lookup_type.uid)
         if uid_value:
+            if lookup_type.uid in ('role_id', 'node'):
+                # enterprise lookups are keyed by string ID
+                uid_value = str(uid_value)
             if uid_value in self.lookup:
                 return self.lookup[uid_value][field]
             else:
@@ -1393,7 +1628,28 @@ class AuditReportCommand(Command):
         if audit_filter:
             rq['filter'] = audit_filter
 
-        rs = api.communicate(params, rq)
+        backfill_windows = None     # type: Optional[List[Tuple[int, int]]]
+        if report_type == 'raw' and kwargs.get('backfill_workers'):
+            created = audit_filter.get('created')
+            if not isinstance(created, dict) or created.get('min') is None:
+                raise CommandError('audit-report', 'Backfill requires a --created range with a start date')
+            created_min = created['min'] + (1 if created.get('exclude_min') else 0)
+            created_max = created.get('max')
+            if created_max is None:
+                created_max = int(time.time())
+            elif created.get('exclude_max'):
+                created_max -= 1
+            backfill_windows = split_time_windows(created_min, created_max,
+                                                  parse_backfill_window(kwargs.get('backfill_window')))
+            if rq.get('order') == 'descending':
+                backfill_windows.reverse()
+            rs = None
+        else:
+            rs = None
+            if kwargs.get('cache') and report_type != 'raw' and not kwargs.get('timezone'):
+                rs = self.query_audit_cache(params, rq)
+            if rs is None:
+                rs = api.communicate(params, rq)
         fields = []
         table = []
 
@@ -1402,31 +1658,46 @@ class AuditReportCommand(Command):
         if report_type == 'raw':
             fields.extend(audit_report.RAW_FIELDS)
             misc_fields = list(audit_report.MISC_FIELDS) if kwargs.get('report_format') == 'fields' else ['message']
+
+            def add_event_row(event):
+                if misc_fields:
+                    lenf = len(fields)
+                    for mf in misc_fields:
+                        if mf == 'message':
+                            fields.append(mf)
+                        elif mf in event:
+                            val = event.get(mf)
+                            if val:
+                                fields.append(mf)
+                                if mf in audit_report.lookup_types:
+                                    fields.extend(audit_report.lookup_types[mf].fields)
+                    if len(fields) > lenf:
+                        for f in fields[lenf:]:
+                            if f not in audit_report.fields_to_uid_name:
+                                misc_fields.remove(f)
+
+                row = []
+                for field in fields:
+                    value = self.get_value(params, field, event)
+                    row.append(self.convert_value(field, value, details=details, params=params))
+                table.append(row)
+
+            if backfill_windows is not None:
+                for _, events in iterate_backfill_windows(params, rq, backfill_windows, kwargs['backfill_workers']):
+                    if rq.get('order') == 'descending':
+                        events.reverse()
+                    for event in events:
+                        add_event_row(event)
+                    if user_limit and 0 < user_limit <= len(table):
+                        del table[user_limit:]
+                        break
+                return dump_report_data(table, fields, fmt=kwargs.get('format'), filename=kwargs.get('output'))
+
             incomplete = True
             while incomplete:
                 events = rs.get('audit_event_overview_report_rows')
                 for event in events:
-                    if misc_fields:
-                        lenf = len(fields)
-                        for mf in misc_fields:
-                            if mf == 'message':
-                                fields.append(mf)
-                            elif mf in event:
-                                val = event.get(mf)
-                                if val:
-                                    fields.append(mf)
-                                    if mf in audit_report.lookup_types:
-                                        fields.extend(audit_report.lookup_types[mf].fields)
-                        if len(fields) > lenf:
-                            for f in fields[lenf:]:
-                                if f not in audit_report.fields_to_uid_name:
-                                    misc_fields.remove(f)
-
-                    row = []
-                    for field in fields:
-                        value = self.get_value(params, field, event)
-                        row.append(self.convert_value(field, value, details=details, params=params))
-                    table.append(row)
+                    add_event_row(event)
                 incomplete = len(events) >= API_EVENT_RAW_ROW_LIMIT
                 if incomplete:
                     asc = rq.get('order') == 'ascending'
@@ -1478,6 +1749,83 @@ class AuditReportCommand(Command):
                 table.append(row)
             return dump_report_data(table, fields, fmt=kwargs.get('format'), filename=kwargs.get('output'))
 
+    def query_audit_cache(self, params, rq):   # type: (KeeperParams, dict) -> Optional[dict]
+        """Runs an aggregate report on the local audit event cache. Returns None if the report needs the server"""
+        if not params.enterprise or not params.account_uid_bytes or not params.data_key:
+            return None
+        audit_filter = dict(rq.get('filter') or {})
+        event_types = audit_filter.get('audit_event_type')
+        if event_types:
+            dimension = AuditReportCommand.load_audit_dimension(params, 'audit_event_type') or []
+            event_type_names = {x.get('id'): x.get('name') for x in dimension}
+            audit_filter['audit_event_type'] = [event_type_names.get(x, x) for x in event_types]
+        columns = rq.get('columns') or []
+        aggregates = rq.get('aggregate') or []
+        if not SqliteAuditEventCache.supports(rq['report_type'], columns, aggregates, audit_filter):
+            logging.info('This report cannot be answered from the audit event cache')
+            return None
+
+        created_min = get_created_range(audit_filter.get('created'))[0]
+        cache = SqliteAuditEventCache(get_audit_cache_database_name(params), params.data_key)
+        try:
+            first_created, _ = cache.get_range()
+            if first_created is None and created_min is None:
+                logging.info('The audit event cache is empty. Run the report with a --created start date to populate it')
+                return None
+            if created_min is None:
+                logging.info('Audit event cache holds events created since %s',
+                             datetime.datetime.fromtimestamp(first_created).isoformat())
+            AuditReportCommand.sync_audit_cache(params, cache, created_min)
+            rows = cache.query(rq['report_type'], columns, aggregates, audit_filter,
+                               order=rq.get('order') or 'descending', limit=rq.get('limit'))
+        finally:
+            cache.close()
+        return {'result': 'success', 'audit_event_overview_report_rows': rows}
+
+    @staticmethod
+    def sync_audit_cache(params, cache, created_min=None):
+        # type: (KeeperParams, SqliteAuditEventCache, Optional[int]) -> None
+        """Loads events created since created_min that are missing in the cache
+
+        The cached range is extended to the past only down to created_min.
+        An empty cache is not populated without created_min.
+        Events of the last AUDIT_CACHE_SETTLE_TIME seconds are stored but reloaded by the next sync.
+        """
+        rq = {
+            'command': 'get_audit_event_reports',
+            'scope': 'enterprise',
+        }
+        now = int(time.time()) - 1
+        settled = now - AUDIT_CACHE_SETTLE_TIME
+        first_created, last_created = cache.get_range()
+        if created_min is None:
+            if first_created is None:
+                return
+            created_min = first_created
+        if first_created is None or created_min < first_created:
+            first_rq = {**rq, 'report_type': 'raw', 'order': 'ascending', 'limit': 1}
+            first_rows = api.communicate(params, first_rq).get('audit_event_overview_report_rows')
+            if not first_rows:
+                return
+            earliest = int(first_rows[0]['created'])
+            created_min = max(created_min, earliest)
+
+        window = BACKFILL_DEFAULT_WINDOW
+        if first_created is None:
+            ranges = [split_time_windows(created_min, now, window)]
+        else:
+            ranges = [split_time_windows(last_created, now, window)]
+            if created_min < first_created:
+                # older windows are added newest first so the cached range stays continuous
+                ranges.append(list(reversed(split_time_windows(created_min, first_created - 1, window))))
+
+        added = 0
+        for windows in ranges:
+            for (window_min, window_max), events in \
+                    iterate_backfill_windows(params, rq, windows, BACKFILL_DEFAULT_WORKERS):
+                added += cache.add_events(events, window_min, max(window_min, min(window_max, settled)))
+        logging.debug('Audit event cache: %d event(s) added', added)
+
     @staticmethod
     def convert_date(value):
         try:
@@ -1727,11 +2075,13 @@ class AgingReportCommand(Command):
         event_lookups = get_event_lookups()
         sox.storage.set_last_pw_audit()
         sox.storage.set_records_dated()
+        aging_uids = set(itertools.chain.from_iterable(x.keys() for x in event_lookups.values()))
+        stored_entities = {x.record_uid: x for x in sox.storage.record_aging.get_entities(aging_uids)}
         aging_entities = dict()  # type: Dict[str, StorageRecordAging]
         for e_type in event_lookups:
             event_ts_lookup = event_lookups.get(e_type)
             for uid, event_ts in event_ts_lookup.items():
-                entity = aging_entities.get(uid) or sox.storage.record_aging.get_entity(uid) or StorageRecordAging(uid)
+                entity = aging_entities.get(uid) or stored_entities.get(uid) or StorageRecordAging(uid)
                 if getattr(entity, e_type, 0) < event_ts:
                     setattr(entity, e_type, event_ts)
                     aging_entities[uid] = entity
@@ -13,15 +13,16 @@ import argparse
 import base64
 import getpass
 import logging
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Set
 
-from .. import api, crypto, utils, vault, vault_extensions
+from .. import api, breachwatch_cache, crypto, utils, vault, vault_extensions
 from .base import GroupCommand, Command, dump_report_data
-from ..breachwatch import BreachWatch
+from ..breachwatch import BreachWatch, get_reused_password_index
 from ..params import KeeperParams
 from ..error import CommandError
 from ..proto import client_pb2 as client_proto, breachwatch_pb2 as breachwatch_proto
 
+BREACHWATCH_SCAN_RECHECK_DAYS = 7
 
 breachwatch_list_parser = argparse.ArgumentParser(prog='breachwatch-list')
 breachwatch_list_parser.add_argument('--all', '-a', dest='all', action='store_true',
@@ -37,6 +38,12 @@ breachwatch_password_parser = argparse.ArgumentParser(prog='breachwatch-password
 breachwatch_password_parser.add_argument('passwords', type=str, nargs='*', help='Password')
 
 breachwatch_scan_parser = argparse.ArgumentParser(prog='breachwatch-scan')
+breachwatch_scan_parser.add_argument('--force', '-f', dest='force', action='store_true',
+                                     help='Re-check all passwords ignoring the local scan cache')
+breachwatch_scan_parser.add_argument('--recheck-days', dest='recheck_days', type=int, action='store',
+                                     default=BREACHWATCH_SCAN_RECHECK_DAYS,
+                                     help='Re-check passwords scanned more than N days ago '
+                                          f'(default: {BREACHWATCH_SCAN_RECHECK_DAYS})')
 
 
 breachwatch_ignore_parser = argparse.ArgumentParser(prog='breachwatch-ignore')
@@ -75,8 +82,10 @@ class BreachWatchListCommand(Command):
 
     def execute(self, params, **kwargs):   # type: (KeeperParams, ...) -> None
         table = []
+        reused_index = get_reused_password_index(params)
         for record, _ in BreachWatch.get_records_by_status(params, ['WEAK', 'BREACHED'], kwargs.get('owned')):
-            row = [record.record_uid, record.title, vault_extensions.get_record_description(record)]
+            row = [record.record_uid, record.title, vault_extensions.get_record_description(record),
+                   max(reused_index.get_password_use_count(params, record.record_uid) - 1, 0)]
             table.append(row)
 
         if table:
@@ -84,7 +93,7 @@ class BreachWatchListCommand(Command):
             total = len(table)
             if not kwargs.get('all', False) and total > 32:
                 table = table[:30]
-            columns = ['Record UID', 'Title', 'Login']
+            columns = ['Record UID', 'Title', 'Login', 'Reused']
             dump_report_data(table, columns, title='Detected High-Risk Password(s)', row_number=kwargs.get('numbered'))
             if len(table) < total:
                 logging.info('')
@@ -132,6 +141,13 @@ class BreachWatchScanCommand(Command):
         return breachwatch_scan_parser
 
     def execute(self, params, **kwargs):  # type: (KeeperParams, Any) -> Any
+        force = kwargs.get('force') is True
+        recheck_days = kwargs.get('recheck_days')
+        if not isinstance(recheck_days, int) or recheck_days < 0:
+            recheck_days = BREACHWATCH_SCAN_RECHECK_DAYS
+        now = utils.current_milli_time()
+        scanned_after = now - recheck_days * 24 * 60 * 60 * 1000
+
         records = [x[0] for x in params.breach_watch.get_records_to_scan(params)]
         record_passwords = dict()    # type: Dict[str, str]
         for record in records:
@@ -145,50 +161,83 @@ class BreachWatchScanCommand(Command):
                     if password:
                         record_passwords[record.record_uid] = password
 
-        if len(record_passwords):
-            euid_to_delete = []
-            bw_requests = []
-            all_passwords = set(record_passwords.values())
-            scans = {x[0]: x[1] for x in params.breach_watch.scan_passwords(params, all_passwords)}
-            for record_uid, record_password in record_passwords.items():
+        scan_cache = breachwatch_cache.open_breachwatch_cache(params) if record_passwords else None
+        try:
+            if len(record_passwords):
+                euid_to_delete = []
+                bw_requests = []
+                all_passwords = set(record_passwords.values())
+                # EUIDs still referenced by records that are not rescanned must be kept
+                record_euids = set()    # type: Set[bytes]
                 if params.breach_watch_records:
-                    if record_uid in params.breach_watch_records:
-                        bwr = params.breach_watch_records[record_uid]
-                        if 'data_unencrypted' in bwr:
-                            passwords = bwr['data_unencrypted'].get('passwords', [])
-                            for password in passwords:
-                                euid = password.get('euid')
-                                if euid:
-                                    euid_to_delete.append(base64.b64decode(euid))
-                if record_password in scans:
-                    bwrq = breachwatch_proto.BreachWatchRecordRequest()
-                    bwrq.recordUid = utils.base64_url_decode(record_uid)
-                    bwrq.breachWatchInfoType = breachwatch_proto.RECORD
-                    bwrq.updateUserWhoScanned = True
-                    hash_status = scans[record_password]
-                    bw_password = client_proto.BWPassword()
-                    bw_password.value = record_password
-                    bw_password.status = client_proto.WEAK if hash_status.breachDetected else client_proto.GOOD
-                    bw_password.euid = hash_status.euid
-                    bw_data = client_proto.BreachWatchData()
-                    bw_data.passwords.append(bw_password)
-                    data = bw_data.SerializeToString()
-                    try:
-                        record_key = params.record_cache[record_uid]['record_key_unencrypted']
-                        bwrq.encryptedData = crypto.encrypt_aes_v2(data, record_key)
-                    except:
-                        continue
-                    bw_requests.append(bwrq)
-            while bw_requests:
-                chunk = bw_requests[0:999]
-                bw_requests = bw_requests[999:]
-                rq = breachwatch_proto.BreachWatchUpdateRequest()
-                rq.breachWatchRecordRequest.extend(chunk)
-                api.communicate_rest(params, rq, 'breachwatch/update_record_data',
-                                     rs_type=breachwatch_proto.BreachWatchUpdateResponse)
-                params.sync_data = True
-            if euid_to_delete:
-                params.breach_watch.delete_euids(params, euid_to_delete)
+                    for record_uid, bwr in params.breach_watch_records.items():
+                        if record_uid in record_passwords:
+                            continue
+                        data_obj = bwr.get('data_unencrypted')
+                        if isinstance(data_obj, dict):
+                            record_euids.update((base64.b64decode(x['euid']) for x in data_obj.get('passwords', [])
+                                                 if x.get('euid')))
+                scans = {}    # type: Dict[str, breachwatch_proto.HashStatus]
+                if scan_cache and not force:
+                    bw_hashes = {utils.breach_watch_hash(x): x for x in all_passwords}
+                    for bw_hash, status in scan_cache.get_hash_statuses(bw_hashes.keys(), scanned_after).items():
+                        # another client may have deleted the EUID: reuse it only while a record references it
+                        if status.euid and status.euid not in record_euids:
+                            continue
+                        scans[bw_hashes[bw_hash]] = status
+                new_scans = {x[0]: x[1] for x in params.breach_watch.scan_passwords(
+                    params, all_passwords.difference(scans.keys()))}
+                scans.update(new_scans)
+                euids_in_use = {x.euid for x in scans.values() if x.euid}
+                euids_in_use.update(record_euids)
+                for record_uid, record_password in record_passwords.items():
+                    if params.breach_watch_records:
+                        if record_uid in params.breach_watch_records:
+                            bwr = params.breach_watch_records[record_uid]
+                            if 'data_unencrypted' in bwr:
+                                passwords = bwr['data_unencrypted'].get('passwords', [])
+                                for password in passwords:
+                                    euid = password.get('euid')
+                                    if euid:
+                                        euid = base64.b64decode(euid)
+                                        if euid not in euids_in_use:
+                                            euid_to_delete.append(euid)
+                    if record_password in scans:
+                        bwrq = breachwatch_proto.BreachWatchRecordRequest()
+                        bwrq.recordUid = utils.base64_url_decode(record_uid)
+                        bwrq.breachWatchInfoType = breachwatch_proto.RECORD
+                        bwrq.updateUserWhoScanned = True
+                        hash_status = scans[record_password]
+                        bw_password = client_proto.BWPassword()
+                        bw_password.value = record_password
+                        bw_password.status = client_proto.WEAK if hash_status.breachDetected else client_proto.GOOD
+                        bw_password.euid = hash_status.euid
+                        bw_data = client_proto.BreachWatchData()
+                        bw_data.passwords.append(bw_password)
+                        data = bw_data.SerializeToString()
+                        try:
+                            record_key = params.record_cache[record_uid]['record_key_unencrypted']
+                            bwrq.encryptedData = crypto.encrypt_aes_v2(data, record_key)
+                        except:
+                            continue
+                        bw_requests.append(bwrq)
+                while bw_requests:
+                    chunk = bw_requests[0:999]
+                    bw_requests = bw_requests[999:]
+                    rq = breachwatch_proto.BreachWatchUpdateRequest()
+                    rq.breachWatchRecordRequest.extend(chunk)
+                    api.communicate_rest(params, rq, 'breachwatch/update_record_data',
+                                         rs_type=breachwatch_proto.BreachWatchUpdateResponse)
+                    params.sync_data = True
+                if euid_to_delete:
+                    params.breach_watch.delete_euids(params, euid_to_delete)
+                if scan_cache:
+                    if euid_to_delete:
+                        scan_cache.remove_euids(euid_to_delete)
+                    scan_cache.put_hash_statuses(new_scans.values(), now)
+        finally:
+            if scan_cache:
+                scan_cache.close()
         logging.info(f'Scanned {len(record_passwords)} passwords.')
 
 
@@ -41,6 +41,7 @@ from .register import ShareRecordCommand, ShareFolderCommand
 from .transfer_account import EnterpriseTransferUserCommand, transfer_user_parser
 from .. import api, crypto, utils, constants
 from ..display import bcolors
+from ..enterprise import get_enterprise_index
 from ..error import CommandError, KeeperApiError, Error
 from ..params import KeeperParams
 from ..proto import record_pb2, APIRequest_pb2, enterprise_pb2
@@ -1699,15 +1700,15 @@ class EnterpriseUserCommand(EnterpriseCommand):
                             else:
                                 logging.warning(' %s failed to %s user: %s', user['username'], 'lock' if is_locked else 'unlock', rs['message'])
                         elif command in {'role_user_add', 'role_user_remove'}:
-                            role_names = [x['data'].get('displayname') for x in params.enterprise['roles'] if x['role_id'] == rq['role_id']]
-                            role_name = role_names[0] if len(role_names) > 0 else str(rq['role_id'])
+                            role = get_enterprise_index(params).get('roles', rq['role_id'])
+                            role_name = role['data'].get('displayname') if role else str(rq['role_id'])
                             if rs['result'] == 'success':
                                 logging.info('%s %s role \'%s\'', user['username'], 'added to' if command == 'role_user_add' else 'removed from', role_name)
                             else:
                                 logging.warning('%s failed to %s role \'%s\': %s', user['username'], 'add to' if command == 'role_user_add' else 'remove from', role_name, rs['message'])
                         elif command in {'team_enterprise_user_add', 'team_enterprise_user_remove', 'team_queue_user'}:
-                            team_names = [x['name'] for x in params.enterprise['teams'] if x['team_uid'] == rq['team_uid']]
-                            team_name = team_names[0] if len(team_names) > 0 else rq['team_uid']
+                            team = get_enterprise_index(params).get('teams', rq['team_uid'])
+                            team_name = team['name'] if team else rq['team_uid']
                             if rs['result'] == 'success':
                                 logging.info('%s %s team \'%s\'', user['username'], 'removed from' if command == 'team_enterprise_user_remove' else 'added to', team_name)
                             else:
@@ -1761,20 +1762,19 @@ class EnterpriseUserCommand(EnterpriseCommand):
             print('{0:>16s}: {1}'.format('Transfer Status', acct_transfer_status))
 
         if 'user_aliases' in params.enterprise:
-            aliases = [x['username'] for x in params.enterprise['user_aliases'] if x['enterprise_user_id'] == enterprise_user_id and x['username'] != username]
+            aliases = [x['username'] for x in get_enterprise_index(params).find('user_aliases', 'enterprise_user_id', enterprise_user_id)
+                       if x['username'] != username]
             if len(aliases) > 0:
                 aliases.sort()
                 for i in range(len(aliases)):
                     print('{0:>16s}: {1}'.format('Email Alias' if i == 0 else '', aliases[i]))
 
         if 'role_users' in params.enterprise:
-            role_ids = [x['role_id'] for x in params.enterprise['role_users'] if x['enterprise_user_id'] == user['enterprise_user_id']]
+            enterprise_index = get_enterprise_index(params)
+            role_ids = [x['role_id'] for x in enterprise_index.find('role_users', 'enterprise_user_id', user['enterprise_user_id'])]
             if len(role_ids) > 0:
-                role_nodes = {}
-                for r in params.enterprise['roles']:
-                    role_nodes[r['role_id']] = r
                 for i in range(len(role_ids)):
-                    role_node = role_nodes[role_ids[i]]
+                    role_node = enterprise_index.get('roles', role_ids[i])
                     print('{0:>16s}: {1:<22s} {2}'.format('Role' if i == 0 else '', role_node['data']['displayname'], role_node['role_id'] if is_verbose else ''))
 
         team_nodes = {}
@@ -1787,7 +1787,7 @@ class EnterpriseUserCommand(EnterpriseCommand):
 
         if 'team_users' in params.enterprise:
             user_id = user['enterprise_user_id']
-            ts = [t for t in params.enterprise['team_users'] if t['enterprise_user_id'] == user_id]
+            ts = get_enterprise_index(params).find('team_users', 'enterprise_user_id', user_id)
             ts.sort(key=lambda x: team_nodes[x['team_uid']]['name'])
             for i, tu in enumerate(ts):
                 team_node = team_nodes[tu['team_uid']]
@@ -2179,10 +2179,11 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                             rq['cascade_node_management'] = (kwargs.get('cascade') == 'on') or False
                             rq['tree_keys'] = []
                             if 'role_users' in params.enterprise:
-                                for user_id in [x['enterprise_user_id'] for x in params.enterprise['role_users'] if x['role_id'] == role_id]:
-                                    emails = [x['username'] for x in params.enterprise['users'] if x['enterprise_user_id'] == user_id]
-                                    if emails:
-                                        public_key = self.get_public_key(params, emails[0])
+                                enterprise_index = get_enterprise_index(params)
+                                for user_id in [x['enterprise_user_id'] for x in enterprise_index.find('role_users', 'role_id', role_id)]:
+                                    user = enterprise_index.get('users', user_id)
+                                    if user:
+                                        public_key = self.get_public_key(params, user['username'])
                                         encrypted_tree_key = crypto.encrypt_rsa(params.enterprise['unencrypted_tree_key'], public_key)
                                         if public_key:
                                             rq['tree_keys'].append({
@@ -2328,9 +2329,8 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                     if 'role_users' in params.enterprise:
                         roles = {x['role_id'] for x in matched_roles}
                         users = set()
-                        for x in params.enterprise['role_users']:
-                            if x['role_id'] in roles:
-                                users.add(x['enterprise_user_id'])
+                        for x in get_enterprise_index(params).find_in('role_users', 'role_id', roles):
+                            users.add(x['enterprise_user_id'])
                         for user_id in users:
                             rq = {
                                 'command': 'role_user_add',
@@ -2384,15 +2384,15 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                             else:
                                 logging.warning('\'%s\' failed to %s role: %s', role_name, 'delete' if command == 'role_delete' else 'update',  rs['message'])
                         elif command in {'role_user_add', 'role_user_remove'}:
-                            user_names = [x['username'] for x in params.enterprise['users'] if x['enterprise_user_id'] == rq['enterprise_user_id']]
-                            user_name = user_names[0] if len(user_names) > 0 else str(rq['enterprise_user_id'])
+                            user = get_enterprise_index(params).get('users', rq['enterprise_user_id'])
+                            user_name = user['username'] if user else str(rq['enterprise_user_id'])
                             if rs['result'] == 'success':
                                 logging.info('\'%s\' role %s %s', role_name, 'assigned to' if command == 'role_user_add' else 'removed from', user_name)
                             else:
                                 logging.warning('\'%s\' role failed to %s %s: %s', role_name, 'assign' if command == 'role_user_add' else 'remove', user_name, rs['message'])
                         elif command in {'role_managed_node_add', 'role_managed_node_remove'}:
-                            node_names = [x for x in params.enterprise['nodes'] if x['node_id'] == rq['managed_node_id']]
-                            node_name = (node_names[0]['data'].get('displayname') or params.enterprise['enterprise_name']) if len(node_names) > 0 else ''
+                            node = get_enterprise_index(params).get('nodes', rq['managed_node_id'])
+                            node_name = (node['data'].get('displayname') or params.enterprise['enterprise_name']) if node else ''
                             if rs['result'] == 'success':
                                 logging.info('\'%s\' role is %s managing node \'%s\'',
                                              role_name, 'assigned to' if command == 'role_managed_node_add' else 'removed from', node_name)
@@ -2400,8 +2400,8 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                                 logging.warning('\'%s\' role failed to %s managing node \'%s\': %s',
                                                 role_name, 'assign' if command == 'role_managed_node_add' else 'remove', node_name, rs['message'])
                         elif command in {'managed_node_privilege_add', 'managed_node_privilege_remove'}:
-                            node_names = [x for x in params.enterprise['nodes'] if x['node_id'] == rq['managed_node_id']]
-                            node_name = (node_names[0]['data'].get('displayname') or params.enterprise['enterprise_name']) if len(node_names) > 0 else ''
+                            node = get_enterprise_index(params).get('nodes', rq['managed_node_id'])
+                            node_name = (node['data'].get('displayname') or params.enterprise['enterprise_name']) if node else ''
                             privilege = rq['privilege']
                             if rs['result'] == 'success':
                                 logging.info('Node \'%s\' in role \'%s\' has \'%s\' privilege %s',
@@ -2468,19 +2468,21 @@ class EnterpriseRoleCommand(EnterpriseCommand):
             'teams': []
         }
         if 'role_users' in params.enterprise:
-            user_ids = [r['enterprise_user_id'] for r in params.enterprise['role_users'] if r['role_id'] == role_id]
+            enterprise_index = get_enterprise_index(params)
+            user_ids = [r['enterprise_user_id'] for r in enterprise_index.find('role_users', 'role_id', role_id)]
             if len(user_ids) > 0:
-                users = {u['enterprise_user_id']: u['username'] for u in params.enterprise['users']}
+                users = {x: u['username'] for x, u in ((x, enterprise_index.get('users', x)) for x in user_ids) if u}
                 ret['users'] = [{'user_id': i, 'username': users[i]} for i in user_ids if i in users]
 
         if 'role_teams' in params.enterprise:
-            team_ids = [r['team_uid'] for r in params.enterprise['role_teams'] if r['role_id'] == role_id]
+            enterprise_index = get_enterprise_index(params)
+            team_ids = [r['team_uid'] for r in enterprise_index.find('role_teams', 'role_id', role_id)]
             if len(team_ids) > 0:
-                teams = {t['team_uid']: t['name'] for t in params.enterprise['teams']}
+                teams = {x: t['name'] for x, t in ((x, enterprise_index.get('teams', x)) for x in team_ids) if t}
                 ret['teams'] = [{'team_id': i, 'team_name': teams[i]} for i in team_ids if i in teams]
 
         if 'managed_nodes' in params.enterprise:
-            node_ids = [x['managed_node_id'] for x in params.enterprise['managed_nodes'] if x['role_id'] == role_id]
+            node_ids = [x['managed_node_id'] for x in get_enterprise_index(params).find('managed_nodes', 'role_id', role_id)]
             if len(node_ids) > 0:
                 nodes = {x['node_id']: x['data'].get('displayname') or params.enterprise['enterprise_name'] for x in params.enterprise['nodes']}
                 ret['managed_nodes'] = [{
@@ -2489,7 +2491,7 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                 } for x in node_ids if x in nodes]
 
         if 'role_enforcements' in params.enterprise:
-            enforcements = next((x for x in params.enterprise['role_enforcements'] if role_id == x['role_id']), None)
+            enforcements = get_enterprise_index(params).get('role_enforcements', role_id)
             if isinstance(enforcements, dict):
                 ret['enforcements'] = {}
                 for k, v in enforcements.get('enforcements', {}).items():
@@ -2539,9 +2541,10 @@ class EnterpriseRoleCommand(EnterpriseCommand):
         print('{0:>24s}: {1}'.format('Node', self.get_node_path(params, role['node_id'])))
         print('{0:>24s}: {1}'.format('Default Role', 'Yes' if role['new_user_inherit'] else 'No'))
         if 'role_users' in params.enterprise:
-            user_ids = [r['enterprise_user_id'] for r in params.enterprise['role_users'] if r['role_id'] == role_id]
+            enterprise_index = get_enterprise_index(params)
+            user_ids = [r['enterprise_user_id'] for r in enterprise_index.find('role_users', 'role_id', role_id)]
             if len(user_ids) > 0:
-                users = {u['enterprise_user_id']: u['username'] for u in params.enterprise['users']}
+                users = {x: u['username'] for x, u in ((x, enterprise_index.get('users', x)) for x in user_ids) if u}
                 user_ids.sort(key=lambda x: users[x])
                 for i, user_id in enumerate(user_ids):
                     print('{0:>25s} {1:<32s} {2}'.format(
@@ -2549,9 +2552,10 @@ class EnterpriseRoleCommand(EnterpriseCommand):
                     ))
 
         if 'role_teams' in params.enterprise:
-            team_ids = [r['team_uid'] for r in params.enterprise['role_teams'] if r['role_id'] == role_id]
+            enterprise_index = get_enterprise_index(params)
+            team_ids = [r['team_uid'] for r in enterprise_index.find('role_teams', 'role_id', role_id)]
             if len(team_ids) > 0:
-                teams = {t['team_uid']: t['name'] for t in params.enterprise['teams']}
+                teams = {x: t['name'] for x, t in ((x, enterprise_index.get('teams', x)) for x in team_ids) if t}
                 team_ids.sort(key=lambda x: teams[x])
                 for i, team_id in enumerate(team_ids):
                     print('{0:>25s} {1:<32s} {2}'.format(
@@ -2560,7 +2564,7 @@ class EnterpriseRoleCommand(EnterpriseCommand):
 
         if 'managed_nodes' in params.enterprise:
             node_ids = {x['managed_node_id']: x['cascade_node_management']
-                        for x in params.enterprise['managed_nodes'] if x['role_id'] == role_id}
+                        for x in get_enterprise_index(params).find('managed_nodes', 'role_id', role_id)}
             is_msp = EnterpriseCommand.is_msp(params)
             if len(node_ids) > 0:
                 nodes = {}
@@ -2906,8 +2910,8 @@ class EnterpriseTeamCommand(EnterpriseCommand):
                         logging.warning('\'%s\' team is not %s: %s', team_name, verb, rs['message'])
                 elif command in {'team_enterprise_user_add', 'team_queue_user', 'team_enterprise_user_remove'}:
                     user_id = rq['enterprise_user_id']
-                    user_names = [x['username'] for x in params.enterprise['users'] if x['enterprise_user_id'] == user_id]
-                    user_name = user_names[0] if len(user_names) > 0 else str(user_id)
+                    user = get_enterprise_index(params).get('users', user_id)
+                    user_name = user['username'] if user else str(user_id)
                     if rs['result'] == 'success':
                         logging.info('\'%s\' %s team %s user %s', team_name, 'queued' if command == 'team_queue_user' else '',
                                      'deleted' if command == 'team_enterprise_user_remove' else 'added', user_name)
@@ -2939,19 +2943,27 @@ class EnterpriseTeamCommand(EnterpriseCommand):
             print('{0:>16s}: {1}'.format('Restrict Share?', 'Yes' if team['restrict_sharing'] else 'No'))
             print('{0:>16s}: {1}'.format('Restrict View?', 'Yes' if team['restrict_view'] else 'No'))
 
+        enterprise_index = get_enterprise_index(params)
         if 'role_teams' in params.enterprise:
-            role_ids = [r['role_id'] for r in params.enterprise['role_teams'] if r['team_uid'] == team_uid]
+            role_ids = [r['role_id'] for r in enterprise_index.find('role_teams', 'team_uid', team_uid)]
             if len(role_ids) > 0:
-                roles = {r['role_id']: r['data'].get('displayname', '[empty]') for r in params.enterprise['roles']}
+                roles = {x: r['data'].get('displayname', '[empty]')
+                         for x, r in ((x, enterprise_index.get('roles', x)) for x in role_ids) if r}
                 role_ids.sort(key=lambda x: roles[x])
                 for i, role_id in enumerate(role_ids):
                     print('{0:>17s} {1:<24s} {2}'.format(
                         'Role(s):' if i == 0 else '', roles[role_id], role_id if is_verbose else ''
                     ))
 
-        user_names = {u['enterprise_user_id']: u.get('username', '[empty]') for u in params.enterprise['users']}
+        user_teams = enterprise_index.find('team_users', 'team_uid', team_uid)
+        queued_team_users = enterprise_index.get('queued_team_users', team_uid)
+        queued_user_ids = list(queued_team_users['users']) if queued_team_users else []
+        user_names = {}
+        for user_id in itertools.chain((x['enterprise_user_id'] for x in user_teams), queued_user_ids):
+            user = enterprise_index.get('users', user_id)
+            if user:
+                user_names[user_id] = user.get('username', '[empty]')
         if 'team_users' in params.enterprise:
-            user_teams = [x for x in params.enterprise['team_users'] if x['team_uid'] == team_uid]
             user_teams.sort(key=lambda x: user_names.get(x['enterprise_user_id']))
             for i, tu in enumerate(user_teams):
                 user_id = tu['enterprise_user_id']
@@ -2963,10 +2975,7 @@ class EnterpriseTeamCommand(EnterpriseCommand):
                 ))
 
         if 'queued_team_users' in params.enterprise:
-            user_ids = []
-            for qtu in params.enterprise['queued_team_users']:
-                if qtu['team_uid'] == team['team_uid']:
-                    user_ids.extend(qtu['users'])
+            user_ids = queued_user_ids
             user_ids.sort(key=lambda x: user_names.get(x))
             for i in range(len(user_ids)):
                 print('{0:>16s}: {1:<24s} {2}'.format('Queued User(s)' if i == 0 else '', user_names[user_ids[i]], user_ids[i] if is_verbose else ''))
@@ -3403,7 +3412,7 @@ class DeviceApproveCommand(EnterpriseCommand):
                             found = True
                             break
                         ent_user_id = device.get('enterprise_user_id')
-                        u = next((x for x in params.enterprise['users'] if x.get('enterprise_user_id') == ent_user_id), None)
+                        u = get_enterprise_index(params).get('users', ent_user_id)
                         if u:
                             if u.get('username') == name:
                                 found = True
@@ -3596,8 +3605,7 @@ class DeviceApproveCommand(EnterpriseCommand):
 
             rows = []
             for k, v in matching_devices.items():
-                user = next((x for x in params.enterprise['users']
-                             if x.get('enterprise_user_id') == v.get('enterprise_user_id')), None)
+                user = get_enterprise_index(params).get('users', v.get('enterprise_user_id'))
                 if not user:
                     continue
 
@@ -222,7 +222,7 @@ class FolderListCommand(Command, RecordMixin):
                     if rv not in (2, 3):
                         continue    # skip fileRef and application records - they use file-report command
 
-                    r = vault.KeeperRecord.load(params, rec)
+                    r = vault.KeeperRecord.load(params, rec, use_cache=True)
                     if not r:
                         continue
 
@@ -15,6 +15,7 @@ import logging
 from .base import report_output_parser, Command, try_resolve_path, FolderMixin, dump_report_data, field_to_title
 from ..error import CommandError
 from .. import vault, generator, vault_extensions
+from ..breachwatch import get_reused_password_index
 
 password_report_parser = argparse.ArgumentParser(prog='password-report', parents=[report_output_parser], description='Display record password report.')
 password_report_parser.add_argument('--policy', dest='policy', action='store',
@@ -89,12 +90,13 @@ class PasswordReportCommand(Command):
 
         records = list(FolderMixin.get_records_in_folder_tree(params, folder_uid))
         table = []
-        header = ['record_uid', 'title', 'description', 'length', 'lower', 'upper', 'digits', 'special']
+        header = ['record_uid', 'title', 'description', 'length', 'lower', 'upper', 'digits', 'special', 'reused']
+        reused_index = get_reused_password_index(params)
 
         fmt = kwargs.get('format')
 
         for record_uid in records:
-            record = vault.KeeperRecord.load(params, record_uid)
+            record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
             if not record:
                 continue
             if record.version not in (2, 3):
@@ -123,7 +125,8 @@ class PasswordReportCommand(Command):
             if isinstance(description, str):
                 if len(description) > 32:
                     description = description[:30] + '...'
-            table.append([record_uid, title, description, strength.length, strength.lower, strength.caps, strength.digits, strength.symbols])
+            reused = max(reused_index.get_password_use_count(params, record_uid) - 1, 0)
+            table.append([record_uid, title, description, strength.length, strength.lower, strength.caps, strength.digits, strength.symbols, reused])
 
         if fmt != 'json':
             header = [field_to_title(x) for x in header]
@@ -614,7 +614,7 @@ class SearchCommand(Command):
 
         # Search records
         if 'r' in categories:
-            records = list(vault_extensions.find_records(params, pattern))
+            records = list(vault_extensions.find_records(params, pattern, use_cache=True))
             if records:
                 print('')
                 table = []
@@ -677,7 +677,8 @@ class RecordListCommand(Command):
             record_version = None if verbose else (1, 2, 3)
             record_type = None
 
-        records = [x for x in vault_extensions.find_records(params, pattern, record_type=record_type, record_version=record_version)]
+        records = [x for x in vault_extensions.find_records(params, pattern, record_type=record_type,
+                                                            record_version=record_version, use_cache=True)]
         if any(records):
             headers = ['record_uid', 'type', 'title', 'description', 'shared']
             if fmt == 'table':
@@ -1046,11 +1047,9 @@ class TrashRestoreCommand(Command, TrashMixin):
         api.execute_batch(params, batch)
         api.sync_down(params)
         TrashMixin.last_revision = 0
+        if params.breach_watch:
+            params.breach_watch.scan_and_store_record_statuses(params, to_restore, True, False, False)
         for record_uid in to_restore:
-            if params.breach_watch:
-                params.breach_watch.scan_and_store_record_status(params, record_uid, True, False, False)
-                api.sync_down(params)
-
             params.queue_audit_event('record_restored', record_uid=record_uid)
 
         params.sync_data = True
@@ -39,7 +39,7 @@ class RecordFileReportCommand(Command):
         facade = record_facades.FileRefRecordFacade()
         table = []
         for record_uid in params.record_cache:
-            rec = vault.KeeperRecord.load(params, record_uid)
+            rec = vault.KeeperRecord.load(params, record_uid, use_cache=True)
             if isinstance(rec, vault.PasswordRecord):
                 if not rec.attachments:
                     continue
@@ -72,7 +72,7 @@ class RecordFileReportCommand(Command):
             elif isinstance(rec, vault.TypedRecord):
                 facade.record = rec
                 for file_uid in facade.file_ref:
-                    file_rec = vault.KeeperRecord.load(params, file_uid)
+                    file_rec = vault.KeeperRecord.load(params, file_uid, use_cache=True)
                     if isinstance(file_rec, vault.FileRecord):
                         row = [rec.title, rec.record_uid, rec.record_type, file_rec.record_uid, file_rec.title or file_rec.name, file_rec.size]
                         if try_download:
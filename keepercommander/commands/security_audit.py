@@ -6,6 +6,7 @@ from typing import Dict, List, Optional, Any
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey
 
 from keepercommander import api, crypto, utils
+from keepercommander.breachwatch import get_reused_password_index
 from keepercommander.commands.base import GroupCommand, raise_parse_exception, suppress_exit, field_to_title, \
     dump_report_data
 from keepercommander.commands.enterprise_common import EnterpriseCommand
@@ -178,6 +179,8 @@ class SecurityAuditReportCommand(EnterpriseCommand):
         from_page = 0
         complete = False
         rows = []
+        # the current user's reused password count is known locally
+        own_reused = get_reused_password_index(params).get_reused_count(params, owned=True) if show_updated else None
         while not complete:
             rq = APIRequest_pb2.SecurityReportRequest()
             rq.fromPage = from_page
@@ -212,6 +215,8 @@ class SecurityAuditReportCommand(EnterpriseCommand):
                     'securityScore': 25,
                     'twoFactorChannel': 'Off' if sr.twoFactor == 'two_factor_disabled' else 'On'
                 }
+                if own_reused is not None and email == params.user:
+                    row['reused'] = own_reused
                 master_pw_strength = 1
 
                 if sr.encryptedReportData:
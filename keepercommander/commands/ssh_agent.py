@@ -187,7 +187,7 @@ def try_extract_private_key(params, record_or_uid):
     if isinstance(record_or_uid, vault.KeeperRecord):
         record = record_or_uid
     elif isinstance(record_or_uid, str):
-        record = vault.KeeperRecord.load(params, record_or_uid)
+        record = vault.KeeperRecord.load(params, record_or_uid, use_cache=True)
         if not record:
             return
     else:
@@ -238,7 +238,7 @@ def try_extract_private_key(params, record_or_uid):
             if file_refs and isinstance(file_refs.value, list):
                 key_file_uids = []
                 for file_uid in file_refs.value:
-                    file_record = vault.KeeperRecord.load(params, file_uid)
+                    file_record = vault.KeeperRecord.load(params, file_uid, use_cache=True)
                     if isinstance(file_record, vault.FileRecord):
                         names = [file_record.title]
                         if file_record.name and file_record.name != file_record.title:
@@ -693,7 +693,7 @@ class SshAgentContext(logging.Handler):
             if not key:
                 continue
 
-            record = vault.KeeperRecord.load(params, record_uid)
+            record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
             private_key_pem, passphrase = key
             try:
                 private_key = load_private_key(private_key_pem, passphrase)
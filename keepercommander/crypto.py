@@ -10,7 +10,10 @@
 #
 
 import io
+import itertools
+import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
@@ -150,6 +153,52 @@ def decrypt_ec(data, ec_private_key):
     return decrypt_aes_v2(data[65:], encryption_key)
 
 
+# number of decryptions submitted to the thread pool as one unit of work
+_BATCH_CHUNK_SIZES = {
+    decrypt_rsa: 16,
+    decrypt_ec: 16,
+}
+_DEFAULT_BATCH_CHUNK_SIZE = 512
+
+
+def _decrypt_chunk(tasks):
+    results = []
+    for uid, decrypt_func, data, key in tasks:
+        try:
+            results.append((uid, decrypt_func(data, key)))
+        except Exception as e:
+            results.append((uid, e))
+    return results
+
+
+def decrypt_batch(tasks, parallel=True, max_workers=None):
+    """Decrypts many values at once
+
+    Each task is a tuple of (uid, decrypt function, encrypted data, key). Tasks are grouped by decrypt function
+    and processed on a thread pool when parallel is set; the crypto backend releases the GIL.
+    Returns a dictionary of uid to decrypted bytes or to the exception raised by the decrypt function.
+    """
+    tasks = list(tasks)
+    max_workers = max_workers or os.cpu_count() or 1
+    if not parallel or max_workers < 2 or len(tasks) < 2:
+        return dict(_decrypt_chunk(tasks))
+
+    chunks = []
+    tasks.sort(key=lambda x: id(x[1]))
+    for decrypt_func, group in itertools.groupby(tasks, key=lambda x: x[1]):
+        group = list(group)
+        chunk_size = _BATCH_CHUNK_SIZES.get(decrypt_func, _DEFAULT_BATCH_CHUNK_SIZE)
+        chunks.extend((group[i:i + chunk_size] for i in range(0, len(group), chunk_size)))
+    if len(chunks) < 2:
+        return dict(_decrypt_chunk(tasks))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        for chunk_results in executor.map(_decrypt_chunk, chunks):
+            results.update(chunk_results)
+    return results
+
+
 def derive_key_v1(password, salt, iterations):
     kdf = PBKDF2HMAC(algorithm=SHA256(), length=32, salt=salt, iterations=iterations, backend=_CRYPTO_BACKEND)
     return kdf.derive(password.encode('utf-8'))
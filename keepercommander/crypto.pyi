@@ -1,4 +1,4 @@
-from typing import Optional, BinaryIO, Tuple
+from typing import Optional, BinaryIO, Tuple, Any, Callable, Dict, Iterable, Union
 
 from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePrivateKey, EllipticCurvePublicKey
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPrivateKey
@@ -33,6 +33,9 @@ def decrypt_rsa(data: bytes, rsa_key: RSAPrivateKey) -> bytes: ...
 def encrypt_ec(data: bytes, ec_public_key: EllipticCurvePublicKey) -> bytes: ...
 def decrypt_ec(data: bytes, ec_private_key: EllipticCurvePrivateKey) -> bytes: ...
 
+def decrypt_batch(tasks: Iterable[Tuple[Any, Callable[[bytes, Any], bytes], bytes, Any]], parallel: bool = ...,
+                  max_workers: Optional[int] = ...) -> Dict[Any, Union[bytes, Exception]]: ...
+
 def derive_key_v1(password: str, salt: bytes, iterations: int) -> bytes: ...
 def derive_keyhash_v1(password: str, salt: bytes, iterations: int) -> bytes: ...
 def derive_keyhash_v2(domain: str, password: str, salt: bytes, iterations: int) -> bytes: ...
@@ -12,13 +12,13 @@
 import abc
 import json
 import logging
-from typing import Optional, List, Set, Tuple, Dict
+from typing import Optional, List, Set, Tuple, Dict, Iterable, Callable
 
 from google.protobuf import message
 
 from .params import KeeperParams
 from .proto import enterprise_pb2 as proto
-from . import api, utils, crypto
+from . import api, utils, crypto, enterprise_cache
 
 
 def query_enterprise(params):  # type: (KeeperParams) -> None
@@ -63,11 +63,168 @@ class EnterpriseInfo(object):
         return self._enterprise_name
 
 
+def get_enterprise_index(params):  # type: (KeeperParams) -> Optional[EnterpriseIndex]
+    if params.enterprise is None:
+        return None
+    index = params.enterprise_index    # type: Optional[EnterpriseIndex]
+    if index is None or index.source is not params.enterprise:
+        index = EnterpriseIndex(params.enterprise)
+        params.enterprise_index = index
+    return index
+
+
+class EnterpriseIndex(object):
+    """Primary key and secondary indexes over the entity lists stored in params.enterprise
+
+    A collection is indexed on first access and then kept up to date by the enterprise loader.
+    """
+    PRIMARY_KEYS = {
+        'nodes': ('node_id',),
+        'users': ('enterprise_user_id',),
+        'teams': ('team_uid',),
+        'roles': ('role_id',),
+        'licenses': ('enterprise_license_id',),
+        'queued_teams': ('team_uid',),
+        'queued_team_users': ('team_uid',),
+        'scims': ('scim_id',),
+        'sso_services': ('sso_service_provider_id',),
+        'bridges': ('bridge_id',),
+        'email_provision': ('id',),
+        'role_enforcements': ('role_id',),
+        'managed_companies': ('mc_enterprise_id',),
+        'user_aliases': ('username',),
+        'devices_request_for_admin_approval': ('enterprise_user_id', 'device_id'),
+        'team_users': ('team_uid', 'enterprise_user_id'),
+        'role_users': ('role_id', 'enterprise_user_id'),
+        'role_teams': ('role_id', 'team_uid'),
+        'managed_nodes': ('role_id', 'managed_node_id'),
+        'role_privileges': ('role_id', 'managed_node_id', 'privilege'),
+    }    # type: Dict[str, Tuple[str, ...]]
+
+    SECONDARY_KEYS = {
+        'nodes': ('parent_id',),
+        'users': ('node_id', 'username'),
+        'teams': ('node_id',),
+        'roles': ('node_id',),
+        'queued_teams': ('node_id',),
+        'user_aliases': ('enterprise_user_id',),
+        'team_users': ('team_uid', 'enterprise_user_id'),
+        'role_users': ('role_id', 'enterprise_user_id'),
+        'role_teams': ('role_id', 'team_uid'),
+        'managed_nodes': ('role_id', 'managed_node_id'),
+        'role_privileges': ('role_id',),
+    }    # type: Dict[str, Tuple[str, ...]]
+
+    CASE_INSENSITIVE_KEYS = {'username'}
+
+    def __init__(self, source):  # type: (dict) -> None
+        self.source = source
+        self._primary = {}      # type: Dict[str, Dict[any, dict]]
+        self._secondary = {}    # type: Dict[str, Dict[str, Dict[any, Dict[any, dict]]]]
+
+    @staticmethod
+    def _normalize(field, value):
+        if field in EnterpriseIndex.CASE_INSENSITIVE_KEYS and isinstance(value, str):
+            return value.lower()
+        return value
+
+    def get_primary_key(self, name, entity):  # type: (str, dict) -> any
+        fields = EnterpriseIndex.PRIMARY_KEYS[name]
+        if len(fields) == 1:
+            return entity.get(fields[0])
+        return tuple(entity.get(x) for x in fields)
+
+    def get_index_values(self, name, entity):  # type: (str, dict) -> Tuple
+        """Returns secondary index values of the entity. Pass them to put() after the entity is changed in place"""
+        return tuple(self._normalize(x, entity.get(x)) for x in EnterpriseIndex.SECONDARY_KEYS.get(name, ()))
+
+    def is_indexed(self, name):  # type: (str) -> bool
+        return name in self._primary
+
+    def _ensure(self, name):  # type: (str) -> Dict[any, dict]
+        primary = self._primary.get(name)
+        if primary is None:
+            primary = {}
+            self._primary[name] = primary
+            self._secondary[name] = {x: {} for x in EnterpriseIndex.SECONDARY_KEYS.get(name, ())}
+            for entity in self.source.get(name) or []:
+                self.put(name, entity)
+        return primary
+
+    def put(self, name, entity, previous=None):  # type: (str, dict, Optional[Tuple]) -> None
+        primary = self._ensure(name)
+        pk = self.get_primary_key(name, entity)
+        primary[pk] = entity
+        secondary = self._secondary[name]
+        for i, field in enumerate(EnterpriseIndex.SECONDARY_KEYS.get(name, ())):
+            value = self._normalize(field, entity.get(field))
+            if previous is not None and previous[i] != value:
+                bucket = secondary[field].get(previous[i])
+                if bucket is not None:
+                    bucket.pop(pk, None)
+                    if not bucket:
+                        del secondary[field][previous[i]]
+            if value is not None:
+                bucket = secondary[field].get(value)
+                if bucket is None:
+                    bucket = {}
+                    secondary[field][value] = bucket
+                bucket[pk] = entity
+
+    def remove(self, name, entity):  # type: (str, dict) -> None
+        primary = self._primary.get(name)
+        if primary is None:
+            return
+        pk = self.get_primary_key(name, entity)
+        if primary.pop(pk, None) is None:
+            return
+        secondary = self._secondary[name]
+        for field in EnterpriseIndex.SECONDARY_KEYS.get(name, ()):
+            value = self._normalize(field, entity.get(field))
+            bucket = secondary[field].get(value)
+            if bucket is not None:
+                bucket.pop(pk, None)
+                if not bucket:
+                    del secondary[field][value]
+
+    def clear(self, name=None):  # type: (Optional[str]) -> None
+        if name:
+            self._primary.pop(name, None)
+            self._secondary.pop(name, None)
+        else:
+            self._primary.clear()
+            self._secondary.clear()
+
+    def get(self, name, key):  # type: (str, any) -> Optional[dict]
+        """Returns entity by primary key. Link entities are keyed by a tuple of both IDs"""
+        return self._ensure(name).get(key)
+
+    def get_all(self, name):  # type: (str) -> List[dict]
+        return list(self._ensure(name).values())
+
+    def find(self, name, field, value):  # type: (str, str, any) -> List[dict]
+        """Returns entities having the field value. The field should be listed in SECONDARY_KEYS"""
+        self._ensure(name)
+        secondary = self._secondary[name].get(field)
+        if secondary is None:
+            value = self._normalize(field, value)
+            return [x for x in self.source.get(name) or [] if self._normalize(field, x.get(field)) == value]
+        bucket = secondary.get(self._normalize(field, value))
+        return list(bucket.values()) if bucket else []
+
+    def find_in(self, name, field, values):  # type: (str, str, Iterable) -> List[dict]
+        result = []
+        for value in values:
+            result.extend(self.find(name, field, value))
+        return result
+
+
 class _EnterpriseLoader(object):
     def __init__(self):
         super(_EnterpriseLoader, self).__init__()
         self._enterprise = EnterpriseInfo()
         self._continuationToken = b''
+        self._storage = None    # type: Optional[enterprise_cache.SqliteEnterpriseCache]
         self._data_types = {   # type: dict[int, _EnterpriseDataParser]
             proto.NODES: _EnterpriseNodeEntity(self._enterprise),
             proto.USERS: _EnterpriseUserEntity(self._enterprise),
@@ -115,7 +272,9 @@ class _EnterpriseLoader(object):
             params.enterprise = {}
             self._continuationToken = b''
 
+        storage_names = None    # type: Optional[Set[str]]
         if not self._enterprise.tree_key or not self._continuationToken:
+            is_first_load = not self._enterprise.tree_key
             rq = proto.GetEnterpriseDataKeysRequest()
             rs = api.communicate_rest(params, rq, 'enterprise/get_enterprise_data_keys',
                                       rs_type=proto.GetEnterpriseDataKeysResponse)
@@ -174,6 +333,34 @@ class _EnterpriseLoader(object):
                 keys['ecc_encrypted_private_key'] = utils.base64_url_encode(ec_encrypted_private_key)
 
             params.enterprise['keys'] = keys
+            if is_first_load:
+                self._storage = enterprise_cache.open_enterprise_cache(params, self._enterprise.tree_key)
+                if self._storage:
+                    token = self._storage.load(params)
+                    if token:
+                        self._continuationToken = token
+                        self._enterprise._enterprise_name = params.enterprise.get('enterprise_name') or ''
+                        storage_names = set()
+        elif self._continuationToken:
+            storage_names = set()
+
+        if not params.enterprise_cache:
+            self._storage = None
+        try:
+            self._load_data(params, storage_names)
+        finally:
+            self.flush(params)
+            if self._storage:
+                self._storage.close()
+
+    def flush(self, params):  # type: (KeeperParams) -> None
+        for parser in self._data_types.values():
+            parser.flush(params)
+
+    def _load_data(self, params, storage_names):  # type: (KeeperParams, Optional[Set[str]]) -> None
+        storage = self._storage
+        if storage and storage_names is None:
+            storage_names = {x.get_keeper_entity_name() for x in self._data_types.values()}
         entities = set()
         while True:
             rq = proto.EnterpriseDataRequest()
@@ -185,6 +372,8 @@ class _EnterpriseLoader(object):
             if rs.cacheStatus == proto.CLEAR:
                 for d in self._data_types.values():
                     d.clear(params)
+                    if storage_names is not None:
+                        storage_names.add(d.get_keeper_entity_name())
                 self._enterprise._enterprise_name = ''
 
             if not self._enterprise.enterprise_name and rs.generalData:
@@ -198,10 +387,13 @@ class _EnterpriseLoader(object):
                 parser = self._data_types.get(ed.entity)
                 if parser:
                     parser.parse(params, ed)
+                    if storage_names is not None:
+                        storage_names.add(parser.get_keeper_entity_name())
 
             self._continuationToken = rs.continuationToken
             if not rs.hasMore:
                 break
+        self.flush(params)
         if proto.MANAGED_NODES in entities:
             self.load_missing_role_keys(params)
         if not entities.isdisjoint([proto.MANAGED_NODES, proto.NODES, proto.ROLE_USERS]):
@@ -209,6 +401,11 @@ class _EnterpriseLoader(object):
                 del params.enterprise['user_root_nodes']
             if 'user_managed_nodes' in params.enterprise:
                 del params.enterprise['user_managed_nodes']
+        if storage:
+            try:
+                storage.save(params, self._continuationToken, storage_names)
+            except Exception as e:
+                logging.warning('Enterprise cache cannot be saved: %s', e)
 
     @staticmethod
     def load_missing_role_keys(params):   # type: (KeeperParams) -> None
@@ -251,8 +448,18 @@ class _EnterpriseLoader(object):
 
 
 class _EnterpriseDataParser(abc.ABC):
+    """Base class for enterprise entity parsers
+
+    A parser keeps a map of its entities by key between calls, so an EnterpriseData chunk costs time
+    proportional to the chunk size. New entities are appended to the params.enterprise list right away.
+    Deleted entities are removed from the map, and the list drops them in flush().
+    """
     def __init__(self, enterprise):    # type: (EnterpriseInfo) -> None
         self.enterprise = enterprise
+        self._entities = None      # type: Optional[List[dict]]
+        self._entity_map = {}      # type: Dict[any, dict]
+        self._cascade_maps = {}    # type: Dict[str, Dict[any, Dict[any, dict]]]
+        self._has_deleted = False
 
     @abc.abstractmethod
     def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
@@ -270,6 +477,10 @@ class _EnterpriseDataParser(abc.ABC):
     def to_keeper_entity(self, proto_entity, keeper_entity):
         pass
 
+    @abc.abstractmethod
+    def get_entity_key(self, keeper_entity):  # type: (dict) -> any
+        pass
+
     def get_entities(self, params, create_if_absent=True):  # type: (KeeperParams, bool) -> Optional[List]
         name = self.get_keeper_entity_name()
         if name not in params.enterprise:
@@ -278,10 +489,127 @@ class _EnterpriseDataParser(abc.ABC):
             params.enterprise[name] = []
         return params.enterprise[name]
 
+    def get_index(self, params):  # type: (KeeperParams) -> Optional[EnterpriseIndex]
+        index = params.enterprise_index    # type: Optional[EnterpriseIndex]
+        if index and index.source is params.enterprise and index.is_indexed(self.get_keeper_entity_name()):
+            return index
+
+    def add_cascade_key(self, keeper_entity_id_name):  # type: (str) -> None
+        if keeper_entity_id_name not in self._cascade_maps:
+            self._cascade_maps[keeper_entity_id_name] = {}
+            self._entities = None
+
+    def get_entity_map(self, params):  # type: (KeeperParams) -> Dict[any, dict]
+        entities = self.get_entities(params)
+        if self._entities is not entities:
+            self._entities = entities
+            self._has_deleted = False
+            self._entity_map = {}
+            for cascade_map in self._cascade_maps.values():
+                cascade_map.clear()
+            for keeper_entity in entities:
+                self._put_entity_key(self.get_entity_key(keeper_entity), keeper_entity)
+        return self._entity_map
+
+    def _put_entity_key(self, key, keeper_entity):  # type: (any, dict) -> None
+        self._entity_map[key] = keeper_entity
+        for field, cascade_map in self._cascade_maps.items():
+            value = keeper_entity.get(field)
+            keys = cascade_map.get(value)
+            if keys is None:
+                keys = {}
+                cascade_map[value] = keys
+            keys[key] = keeper_entity
+
+    def add_entity(self, key, keeper_entity):  # type: (any, dict) -> None
+        """Adds a new entity. Call get_entity_map() first"""
+        self._put_entity_key(key, keeper_entity)
+        self._entities.append(keeper_entity)
+
+    def remove_entity(self, key):  # type: (any) -> Optional[dict]
+        """Removes an entity by key. Call get_entity_map() first"""
+        keeper_entity = self._entity_map.pop(key, None)
+        if keeper_entity is not None:
+            self._has_deleted = True
+            for field, cascade_map in self._cascade_maps.items():
+                value = keeper_entity.get(field)
+                keys = cascade_map.get(value)
+                if keys is not None:
+                    keys.pop(key, None)
+                    if not keys:
+                        del cascade_map[value]
+        return keeper_entity
+
+    def flush(self, params):  # type: (KeeperParams) -> None
+        """Drops deleted entities from the params.enterprise list"""
+        if self._has_deleted:
+            self._has_deleted = False
+            entities = self.get_entities(params, create_if_absent=False)
+            if entities is not None and entities is self._entities:
+                entities.clear()
+                entities.extend(self._entity_map.values())
+
     def clear(self, params):  # type: (KeeperParams) -> None
         entities = self.get_entities(params, create_if_absent=False)
         if entities:
             entities.clear()
+        self._entities = entities
+        self._entity_map = {}
+        for cascade_map in self._cascade_maps.values():
+            cascade_map.clear()
+        self._has_deleted = False
+        index = self.get_index(params)
+        if index:
+            index.clear(self.get_keeper_entity_name())
+
+    def cascade_delete(self, params, keeper_entity_id, deleted_entities):   # type: (KeeperParams, str, Set) -> None
+        if self.get_entities(params, create_if_absent=False) is None:
+            return
+        self.add_cascade_key(keeper_entity_id)
+        self.get_entity_map(params)
+        cascade_map = self._cascade_maps[keeper_entity_id]
+        index = self.get_index(params)
+        name = self.get_keeper_entity_name()
+        for entity_id in deleted_entities:
+            keys = cascade_map.get(entity_id)
+            if keys:
+                for key in list(keys.keys()):
+                    keeper_entity = self.remove_entity(key)
+                    if index and keeper_entity is not None:
+                        index.remove(name, keeper_entity)
+
+    def upsert_entities(self, params, enterprise_data, entity_key):
+        # type: (KeeperParams, proto.EnterpriseData, Callable[[message.Message], any]) -> Set
+        """Applies an EnterpriseData chunk to entities and returns keys of deleted entities"""
+        entity_map = self.get_entity_map(params)
+        entity_type = self.get_entity_type()
+        name = self.get_keeper_entity_name()
+        index = self.get_index(params)
+        deleted_entities = set()
+        for entityData in enterprise_data.data:
+            entity = entity_type()
+            entity.ParseFromString(entityData)
+            key = entity_key(entity)
+            if enterprise_data.delete:
+                keeper_entity = self.remove_entity(key)
+                if keeper_entity is not None:
+                    deleted_entities.add(key)
+                    if index:
+                        index.remove(name, keeper_entity)
+            else:
+                keeper_entity = entity_map.get(key)
+                if keeper_entity is None:
+                    keeper_entity = {}
+                    self.to_keeper_entity(entity, keeper_entity)
+                    self.add_entity(key, keeper_entity)
+                    if index:
+                        index.put(name, keeper_entity)
+                else:
+                    previous = index.get_index_values(name, keeper_entity) if index else None
+                    self.to_keeper_entity(entity, keeper_entity)
+                    if index:
+                        index.put(name, keeper_entity, previous)
+        return deleted_entities
 
 
 class _EnterpriseEntity(_EnterpriseDataParser):
@@ -297,6 +625,9 @@ class _EnterpriseEntity(_EnterpriseDataParser):
     def get_proto_entity_id(self, proto_entity):  # type: (message.Message) -> any
         pass
 
+    def get_entity_key(self, keeper_entity):  # type: (dict) -> any
+        return self.get_keeper_entity_id(keeper_entity)
+
     @staticmethod
     def fix_data(d):  # type: (bytes) -> bytes
         idx = d.rfind(b'}')
@@ -307,32 +638,13 @@ class _EnterpriseEntity(_EnterpriseDataParser):
     def register_link(self, keeper_entity_id_name, parser):  # type: (str, _EnterpriseDataParser) -> None
         if isinstance(parser, _EnterpriseLink):
             self._links.append((keeper_entity_id_name, parser))
+            parser.add_cascade_key(keeper_entity_id_name)
 
     def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
         if not enterprise_data.data:
             return
 
-        entities = self.get_entities(params)
-        entity_map = {self.get_keeper_entity_id(x): x for x in entities}
-        entity_type = self.get_entity_type()
-        deleted_entities = set()
-        for entityData in enterprise_data.data:
-            entity = entity_type()
-            entity.ParseFromString(entityData)
-            entity_id = self.get_proto_entity_id(entity)
-            if enterprise_data.delete:
-                if entity_id in entity_map:
-                    entity_map.pop(entity_id)
-                    deleted_entities.add(entity_id)
-            else:
-                keeper_entity = entity_map.get(entity_id)
-                if not keeper_entity:
-                    keeper_entity = {}
-                    entity_map[entity_id] = keeper_entity
-                self.to_keeper_entity(entity, keeper_entity)
-
-        entities.clear()
-        entities.extend(entity_map.values())
+        deleted_entities = self.upsert_entities(params, enterprise_data, self.get_proto_entity_id)
         if len(deleted_entities) > 0:
             for keeper_entity_id_name, link in self._links:
                 link.cascade_delete(params, keeper_entity_id_name, deleted_entities)
@@ -355,47 +667,14 @@ class _EnterpriseLink(_EnterpriseDataParser):
     def get_proto_entity2_id(self, proto_entity):  # type: (message.Message) -> any
         pass
 
-    def cascade_delete(self, params, keeper_entity_id, deleted_entities):   # type: (KeeperParams, str, Set) -> None
-        entities = self.get_entities(params, create_if_absent=False)
-        if not entities:
-            return
-        to_keep = [x for x in entities if keeper_entity_id not in x or x[keeper_entity_id] not in deleted_entities]
-        if len(to_keep) < len(entities):
-            entities.clear()
-            entities.extend(to_keep)
-
-    def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
-        entities = self.get_entities(params)
-        entity_map = {
-            '{0}:{1}'.format(self.get_keeper_entity1_id(x), self.get_keeper_entity2_id(x)): x for x in entities
-        }
-        entity_type = self.get_entity_type()
-        for entityData in enterprise_data.data:
-            entity = entity_type()
-            entity.ParseFromString(entityData)
-            entity1_id = self.get_proto_entity1_id(entity)
-            entity2_id = self.get_proto_entity2_id(entity)
-            key = '{0}:{1}'.format(entity1_id, entity2_id)
-            if enterprise_data.delete:
-                if key in entity_map:
-                    entity_map.pop(key)
-            else:
-                keeper_entity = entity_map.get(key)
-                if not keeper_entity:
-                    keeper_entity = {}
-                    entity_map[key] = keeper_entity
-                self.to_keeper_entity(entity, keeper_entity)
+    def get_entity_key(self, keeper_entity):  # type: (dict) -> any
+        return self.get_keeper_entity1_id(keeper_entity), self.get_keeper_entity2_id(keeper_entity)
 
-        entities.clear()
-        entities.extend(entity_map.values())
+    def get_proto_entity_key(self, proto_entity):  # type: (message.Message) -> any
+        return self.get_proto_entity1_id(proto_entity), self.get_proto_entity2_id(proto_entity)
 
-    def get_entities(self, params, create_if_absent=True):  # type: (KeeperParams, bool) -> Optional[List]
-        name = self.get_keeper_entity_name()
-        if name not in params.enterprise:
-            if not create_if_absent:
-                return None
-            params.enterprise[name] = []
-        return params.enterprise[name]
+    def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
+        self.upsert_entities(params, enterprise_data, self.get_proto_entity_key)
 
 
 def _set_or_remove(obj, key, value):  # type: (dict, str, any) -> None
@@ -776,10 +1055,10 @@ class _EnterpriseRolePrivilegeEntity(_EnterpriseEntity):
         _set_or_remove(keeper_entity, 'privilege', proto_entity.privilegeType)
 
     def get_keeper_entity_id(self, entity):  # type: (dict) -> any
-        return '{0}:{1}:{2}'.format(entity.get('role_id'), entity.get('managed_node_id'), entity.get('privilege'))
+        return entity.get('role_id'), entity.get('managed_node_id'), entity.get('privilege')
 
     def get_proto_entity_id(self, entity):  # type: (proto.RolePrivilege) -> any
-        return '{0}:{1}:{2}'.format(entity.roleId, entity.managedNodeId, entity.privilegeType)
+        return entity.roleId, entity.managedNodeId, entity.privilegeType
 
     def get_entity_type(self):
         return proto.RolePrivilege
@@ -790,9 +1069,9 @@ class _EnterpriseRolePrivilegeEntity(_EnterpriseEntity):
 
 class _EnterpriseRoleEnforcements(_EnterpriseDataParser):
     def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
-        entities = self.get_entities(params)
-        entity_map = {x['role_id']: x for x in entities}
+        entity_map = self.get_entity_map(params)
         entity_type = self.get_entity_type()
+        index = self.get_index(params)
         for entityData in enterprise_data.data:
             entity = entity_type()
             entity.ParseFromString(entityData)
@@ -810,12 +1089,14 @@ class _EnterpriseRoleEnforcements(_EnterpriseDataParser):
                         'role_id': role_id,
                         'enforcements': {}
                     }
-                    entity_map[role_id] = keeper_entity
+                    self.add_entity(role_id, keeper_entity)
+                    if index:
+                        index.put(self.get_keeper_entity_name(), keeper_entity)
                 enforcements = keeper_entity['enforcements']
                 enforcements[enforcement_type] = entity.value
 
-        entities.clear()
-        entities.extend(entity_map.values())
+    def get_entity_key(self, keeper_entity):  # type: (dict) -> any
+        return keeper_entity.get('role_id')
 
     def get_entity_type(self):
         return proto.RoleEnforcement
@@ -865,9 +1146,9 @@ class _EnterpriseManagedCompanyEntity(_EnterpriseEntity):
 
 class _EnterpriseQueuedTeamUserEntity(_EnterpriseDataParser):
     def parse(self, params, enterprise_data, **kwargs):  # type: (KeeperParams, proto.EnterpriseData, dict) -> None
-        entities = self.get_entities(params)
-        entity_map = {x['team_uid']: x for x in entities}
+        entity_map = self.get_entity_map(params)
         entity_type = self.get_entity_type()
+        index = self.get_index(params)
         for entityData in enterprise_data.data:
             entity = entity_type()
             entity.ParseFromString(entityData)
@@ -883,12 +1164,14 @@ class _EnterpriseQueuedTeamUserEntity(_EnterpriseDataParser):
                         'team_uid': team_uid,
                         'users': set()
                     }
-                    entity_map[team_uid] = keeper_entity
+                    self.add_entity(team_uid, keeper_entity)
+                    if index:
+                        index.put(self.get_keeper_entity_name(), keeper_entity)
                 users = keeper_entity['users']
                 users.update(entity.users)
 
-        entities.clear()
-        entities.extend(entity_map.values())
+    def get_entity_key(self, keeper_entity):  # type: (dict) -> any
+        return keeper_entity.get('team_uid')
 
     def get_entity_type(self):
         return proto.QueuedTeamUser
@@ -936,10 +1219,10 @@ class _EnterpriseAdminApprovalRequestEntity(_EnterpriseEntity):
         _set_or_remove(keeper_entity, 'email', proto_entity.email)
 
     def get_keeper_entity_id(self, entity):  # type: (dict) -> any
-        return '{0}:{1}'.format(entity.get('enterprise_user_id'), entity.get('device_id'))
+        return entity.get('enterprise_user_id'), entity.get('device_id')
 
     def get_proto_entity_id(self, entity):  # type: (proto.DeviceRequestForAdminApproval) -> any
-        return '{0}:{1}'.format(entity.enterpriseUserId, entity.deviceId)
+        return entity.enterpriseUserId, entity.deviceId
 
     def get_entity_type(self):
         return proto.DeviceRequestForAdminApproval
@@ -0,0 +1,170 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import hashlib
+import hmac
+import logging
+from typing import Dict, Iterable, Optional
+
+from . import crypto, utils
+from .params import KeeperParams
+from .storage import cache_utils, sqlite_dao, sqlite
+
+# params.enterprise entries that are not received from enterprise/get_enterprise_data_for_user
+ENTERPRISE_CACHE_EXTRAS = ('enterprise_name', 'distributor', 'role_keys', 'role_keys2')
+
+
+class EnterpriseCacheMetadata:
+    def __init__(self):
+        self.continuation_token = b''
+
+
+class EnterpriseCacheEntity:
+    def __init__(self):
+        self.name = ''
+        self.data = b''
+
+
+def get_enterprise_cache_database_name(params):  # type: (KeeperParams) -> str
+    return cache_utils.get_cache_database_name(params.config_filename, 'enterprise', params.account_uid_bytes)
+
+
+def get_enterprise_cache_owner(params, tree_key):  # type: (KeeperParams, bytes) -> str
+    """Snapshots are keyed by enterprise ID and tree key. A new tree key starts a new snapshot"""
+    key_hash = hmac.new(tree_key, b'enterprise_cache', hashlib.sha256).digest()[:16]
+    return f'{params.enterprise_id}_{utils.base64_url_encode(key_hash)}'
+
+
+def _restore_value(name, value):
+    if name == 'queued_team_users' and isinstance(value, list):
+        for entity in value:
+            if isinstance(entity.get('users'), list):
+                entity['users'] = set(entity['users'])
+    return value
+
+
+class SqliteEnterpriseCache:
+    """Encrypted on-disk snapshot of params.enterprise and the enterprise data continuation token
+
+    Every params.enterprise entry is stored as a separate row encrypted with the enterprise tree key.
+    Rows are written only when the entry has changed since the last load or save.
+    """
+    def __init__(self, database_name, owner, tree_key):   # type: (str, str, bytes) -> None
+        self.database_name = database_name
+        self.owner = owner
+        self._tree_key = tree_key
+        cache_utils.create_database_file(database_name)
+        self._connection_manager = sqlite_dao.SqliteConnectionManager(database_name)
+        self._fingerprints = {}    # type: Dict[str, bytes]
+        self._rescan = False
+
+        metadata_schema = sqlite_dao.TableSchema.load_schema(EnterpriseCacheMetadata, [],
+                                                             owner_column='enterprise_key')
+        entity_schema = sqlite_dao.TableSchema.load_schema(EnterpriseCacheEntity, ['name'],
+                                                           owner_column='enterprise_key')
+        get_connection = self._connection_manager.get_connection
+        sqlite_dao.verify_database(get_connection(), (metadata_schema, entity_schema))
+
+        self._metadata = sqlite.SqliteRecordStorage(get_connection, metadata_schema, owner)
+        self._entities = sqlite_dao.SqliteStorage(get_connection, entity_schema, owner)
+
+    def close(self):
+        self._connection_manager.close()
+
+    def load(self, params):    # type: (KeeperParams) -> Optional[bytes]
+        """Populates params.enterprise from the snapshot. Returns the continuation token or None"""
+        metadata = self._metadata.load()
+        if not metadata or not metadata.continuation_token:
+            return None
+        try:
+            token = crypto.decrypt_aes_v2(metadata.continuation_token, self._tree_key)
+            entries = {}
+            fingerprints = {}
+            for entity in self._entities.select_all():
+                data = crypto.decrypt_aes_v2(entity.data, self._tree_key)
+                entries[entity.name] = _restore_value(entity.name, cache_utils.decode_json(data))
+                fingerprints[entity.name] = cache_utils.fingerprint(data)
+        except Exception as e:
+            logging.debug('Enterprise cache "%s" cannot be loaded: %s', self.database_name, e)
+            self.clear()
+            return None
+
+        params.enterprise.update(entries)
+        self._fingerprints = fingerprints
+        logging.debug('Enterprise cache: loaded %d entries', len(entries))
+        return token
+
+    def save(self, params, continuation_token, names):
+        # type: (KeeperParams, bytes, Iterable[str]) -> None
+        """Stores params.enterprise entries that have changed. names lists the entries that could have changed
+
+        Entries and the continuation token are written in one transaction. After a failed save the next one
+        compares every entry.
+        """
+        names = set(names)
+        names.update(ENTERPRISE_CACHE_EXTRAS)
+        if self._rescan:
+            names.update(params.enterprise.keys())
+            names.update(self._fingerprints.keys())
+
+        to_put = []
+        to_delete = []
+        fingerprints = {}    # type: Dict[str, Optional[bytes]]
+        for name in names:
+            value = params.enterprise.get(name)
+            if value is None:
+                if name in self._fingerprints:
+                    fingerprints[name] = None
+                    to_delete.append(name)
+                continue
+            data = cache_utils.encode_json(value)
+            fingerprint = cache_utils.fingerprint(data)
+            if self._fingerprints.get(name) != fingerprint:
+                fingerprints[name] = fingerprint
+                entity = EnterpriseCacheEntity()
+                entity.name = name
+                entity.data = crypto.encrypt_aes_v2(data, self._tree_key)
+                to_put.append(entity)
+
+        metadata = EnterpriseCacheMetadata()
+        metadata.continuation_token = crypto.encrypt_aes_v2(continuation_token or b'', self._tree_key)
+        self._rescan = True
+        with self._connection_manager.transaction():
+            if to_delete:
+                self._entities.delete_by_filter('name', to_delete, multiple_criteria=True)
+            if to_put:
+                self._entities.put(to_put)
+            self._metadata.store(metadata)
+        self._rescan = False
+
+        for name, fingerprint in fingerprints.items():
+            if fingerprint is None:
+                self._fingerprints.pop(name, None)
+            else:
+                self._fingerprints[name] = fingerprint
+        logging.debug('Enterprise cache: %d entries stored, %d entries deleted', len(to_put), len(to_delete))
+
+    def clear(self):
+        with self._connection_manager.transaction():
+            self._entities.delete_all()
+            self._metadata.delete_all()
+        self._fingerprints.clear()
+
+
+def open_enterprise_cache(params, tree_key):     # type: (KeeperParams, bytes) -> Optional[SqliteEnterpriseCache]
+    if not params.enterprise_cache or not tree_key or not params.account_uid_bytes:
+        return None
+    try:
+        database_name = get_enterprise_cache_database_name(params)
+        return SqliteEnterpriseCache(database_name, get_enterprise_cache_owner(params, tree_key), tree_key)
+    except Exception as e:
+        logging.warning('Enterprise cache is disabled: %s', e)
+        params.enterprise_cache = False
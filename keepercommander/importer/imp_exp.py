@@ -517,7 +517,7 @@ def import_teams(params, teams, full_sync=False):   # type: (KeeperParams, List[
             'enterprise_user_id': user_id,
         } for team_uid, user_id in users_to_remove))
     if rqs:
-        rs = api.execute_batch(params, rqs)
+        rs = api.execute_batch(params, rqs, max_parallel=4)
         api.query_enterprise(params)
         if rs:
             users_added = 0
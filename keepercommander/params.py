@@ -8,11 +8,14 @@
 # Contact: ops@keepersecurity.com
 #
 
+import threading
 import warnings
 from datetime import datetime
-from typing import Dict, NamedTuple, Optional
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
 from urllib.parse import urlparse, urlunparse
 
+import requests
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 
 LAST_RECORD_UID = 'last_record_uid'
@@ -36,12 +39,16 @@ class RestApiContext:
     def __init__(self, server='https://keepersecurity.com/api/v2/', locale='en_US'):
         self.server_base = server
         self.transmission_key = None
+        self.encrypted_transmission_key = None    # type: Optional[Tuple[Tuple[bytes, int], bytes]]
         self.__server_key_id = 7
         self.locale = locale
         self.__store_server_key = False
         self.proxies = None
         self._certificate_check = True
         self.fail_on_throttle = False
+        self._pool_size = 10
+        self._session = None     # type: Optional[requests.Session]
+        self._session_lock = threading.Lock()
 
     def __get_server_base(self):
         return self.__server_base
@@ -70,6 +77,36 @@ class RestApiContext:
             }
         else:
             self.proxies = None
+        self.close_session()
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, value):
+        if isinstance(value, int) and value > 0:
+            self._pool_size = value
+            self.close_session()
+
+    def get_session(self):   # type: () -> requests.Session
+        """Returns the HTTP session shared by all REST calls. Connections are kept alive and reused"""
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                if self._session is None:
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size)
+                    self._session = requests.Session()
+                    self._session.mount('https://', adapter)
+                    self._session.mount('http://', adapter)
+                session = self._session
+        return session
+
+    def close_session(self):
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
 
     @property
     def certificate_check(self):
@@ -79,6 +116,7 @@ class RestApiContext:
     def certificate_check(self, value):
         if isinstance(value, bool):
             self._certificate_check = value
+            self.close_session()
             if value:
                 warnings.simplefilter('default', InsecureRequestWarning)
             else:
@@ -113,7 +151,14 @@ class KeeperParams:
         self.enterprise_rsa_key = None
         self.revision = 0
         self.sync_down_token = None    # type: Optional[bytes]
+        self.vault_cache = False
+        self.vault_storage = None
+        self.enterprise_cache = False
+        self.parallel_decryption = True
         self.record_cache = {}
+        self.keeper_record_cache = {}  # type: Dict[str, Any]
+        self.record_search_index = None
+        self.reused_password_index = None
         self.meta_data_cache = {}
         self.non_shared_data_cache = {}
         self.shared_folder_cache = {}
@@ -126,6 +171,7 @@ class KeeperParams:
         self.user_cache = {}
         self.subfolder_cache = {}
         self.subfolder_record_cache = {}
+        self.record_folder_cache = {}  # type: Dict[str, Set[str]]
         self.root_folder = None
         self.current_folder = None
         self.folder_cache = {}
@@ -136,6 +182,7 @@ class KeeperParams:
         self.settings = None
         self.enforcements = None
         self.enterprise = None
+        self.enterprise_index = None
         self.automators = None
         self.enterprise_loader = None
         self.enterprise_id = 0
@@ -179,7 +226,13 @@ class KeeperParams:
         self.enterprise_rsa_key = None
         self.revision = 0
         self.sync_down_token = None
+        if self.vault_storage:
+            self.vault_storage.close()
+            self.vault_storage = None
         self.record_cache.clear()
+        self.keeper_record_cache.clear()
+        self.record_search_index = None
+        self.reused_password_index = None
         self.meta_data_cache.clear()
         self.non_shared_data_cache.clear()
         self.shared_folder_cache.clear()
@@ -191,6 +244,7 @@ class KeeperParams:
         self.key_cache.clear()
         self.subfolder_cache .clear()
         self.subfolder_record_cache.clear()
+        self.record_folder_cache.clear()
         if self.folder_cache:
             self.folder_cache.clear()
         self.user_cache.clear()
@@ -201,6 +255,7 @@ class KeeperParams:
         self.settings = None
         self.enforcements = None
         self.enterprise = None
+        self.enterprise_index = None
         self.automators = None
         self.enterprise_loader = None
         self.enterprise_id = 0
@@ -13,6 +13,7 @@ import requests
 import os
 import json
 import logging
+import random
 import ssl
 import time
 
@@ -114,6 +115,47 @@ SERVER_PUBLIC_KEYS = {
 }   # type: Dict[int, Union[rsa.RSAPublicKey, ec.EllipticCurvePublicKey]]
 
 
+THROTTLE_BASE_DELAY = 2.0
+THROTTLE_MAX_DELAY = 60.0
+
+
+def get_throttle_delay(attempt):    # type: (int) -> float
+    """Jittered exponential backoff delay in seconds for a throttled request"""
+    delay = min(THROTTLE_MAX_DELAY, THROTTLE_BASE_DELAY * (2 ** min(attempt, 16)))
+    return random.uniform(delay / 2, delay)
+
+
+def get_encrypted_transmission_key(context):    # type: (RestApiContext) -> bytes
+    """Returns the transmission key encrypted with the server public key
+
+    The encrypted key is cached on the context for the current (transmission key, server key ID) pair.
+    """
+    cache_key = (context.transmission_key, context.server_key_id)
+    cached = context.encrypted_transmission_key
+    if cached and cached[0] == cache_key:
+        return cached[1]
+
+    server_public_key = SERVER_PUBLIC_KEYS[context.server_key_id]
+    if isinstance(server_public_key, rsa.RSAPublicKey):
+        encrypted_transmission_key = crypto.encrypt_rsa(context.transmission_key, server_public_key)
+    elif isinstance(server_public_key, ec.EllipticCurvePublicKey):
+        encrypted_transmission_key = crypto.encrypt_ec(context.transmission_key, server_public_key)
+    else:
+        raise ValueError('Invalid server public key')
+    context.encrypted_transmission_key = (cache_key, encrypted_transmission_key)
+    return encrypted_transmission_key
+
+
+def build_api_request(context, payload):
+    # type: (RestApiContext, proto.ApiRequestPayload) -> bytes
+    api_request = proto.ApiRequest()
+    api_request.encryptedTransmissionKey = get_encrypted_transmission_key(context)
+    api_request.publicKeyId = context.server_key_id
+    api_request.locale = context.locale or 'en_US'
+    api_request.encryptedPayload = crypto.encrypt_aes_v2(payload.SerializeToString(), context.transmission_key)
+    return api_request.SerializeToString()
+
+
 def execute_rest(context, endpoint, payload):
     # type: (RestApiContext, str, proto.ApiRequestPayload) -> Union[bytes, dict]
     if not context.transmission_key:
@@ -122,32 +164,21 @@ def execute_rest(context, endpoint, payload):
     if not context.server_key_id:
         context.server_key_id = 7
 
+    throttle_attempt = 0
     run_request = True
     while run_request:
         run_request = False
 
-        api_request = proto.ApiRequest()
-        server_public_key = SERVER_PUBLIC_KEYS[context.server_key_id]
-        if isinstance(server_public_key, rsa.RSAPublicKey):
-            api_request.encryptedTransmissionKey = crypto.encrypt_rsa(context.transmission_key, server_public_key)
-        elif isinstance(server_public_key, ec.EllipticCurvePublicKey):
-            api_request.encryptedTransmissionKey = crypto.encrypt_ec(context.transmission_key, server_public_key)
-        else:
-            raise ValueError('Invalid server public key')
-        api_request.publicKeyId = context.server_key_id
-        api_request.locale = context.locale or 'en_US'
-
-        api_request.encryptedPayload = crypto.encrypt_aes_v2(payload.SerializeToString(), context.transmission_key)
-
-        request_data = api_request.SerializeToString()
+        request_data = build_api_request(context, payload)
         if endpoint.startswith('https://'):
             url = endpoint
         else:
             url = context.server_base + endpoint
 
         try:
-            rs = requests.post(url, data=request_data, headers={'Content-Type': 'application/octet-stream'},
-                               proxies=context.proxies, verify=context.certificate_check)
+            rs = context.get_session().post(url, data=request_data,
+                                            headers={'Content-Type': 'application/octet-stream'},
+                                            proxies=context.proxies, verify=context.certificate_check)
         except requests.exceptions.SSLError as e:
             doc_url = 'https://docs.keeper.io/secrets-manager/commander-cli/using-commander/troubleshooting-commander-cli#ssl-certificate-errors'
             if len(e.args) > 0:
@@ -177,6 +208,7 @@ def execute_rest(context, endpoint, payload):
                 logging.debug('<<< Response Error: [%s]', failure)
                 if rs.status_code == 401:
                     if failure.get('error') == 'key':
+                        context.encrypted_transmission_key = None
                         server_key_id = failure['key_id']
                         if server_key_id != context.server_key_id:
                             context.server_key_id = server_key_id
@@ -184,8 +216,10 @@ def execute_rest(context, endpoint, payload):
                             continue
                 elif rs.status_code == 403:
                     if failure.get('error') == 'throttled' and not context.fail_on_throttle:
-                        logging.info('Throttled. sleeping for 10 seconds')
-                        time.sleep(10)
+                        delay = get_throttle_delay(throttle_attempt)
+                        throttle_attempt += 1
+                        logging.info('Throttled. sleeping for %.1f seconds', delay)
+                        time.sleep(delay)
                         run_request = True
                         continue
                 return failure
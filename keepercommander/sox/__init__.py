@@ -1,8 +1,6 @@
-import asyncio
 import datetime
 import logging
 import os
-import sqlite3
 import sys
 from typing import Dict
 
@@ -77,7 +75,7 @@ def get_prelim_data(params, enterprise_id=0, rebuild=False, min_updated=0, cache
             def to_record_entity(record):
                 record_uid_bytes = record.recordUid
                 record_uid = utils.base64_url_encode(record_uid_bytes)
-                entity = store.get_records().get_entity(record_uid) or StorageRecord()
+                entity = StorageRecord()
                 entity.record_uid_bytes = record_uid_bytes
                 entity.record_uid = record_uid
                 entity.encrypted_data = record.encryptedData
@@ -85,7 +83,7 @@ def get_prelim_data(params, enterprise_id=0, rebuild=False, min_updated=0, cache
                 return entity
 
             def to_user_entity(user, email_lookup):
-                entity = store.get_users().get_entity(user.enterpriseUserId) or StorageUser()
+                entity = StorageUser()
                 entity.status = user.status
                 user_id = user.enterpriseUserId
                 entity.user_uid = user_id
@@ -144,85 +142,59 @@ def get_prelim_data(params, enterprise_id=0, rebuild=False, min_updated=0, cache
     ecc_key = utils.base64_url_decode(params.enterprise['keys']['ecc_encrypted_private_key'])
     ecc_key = crypto.decrypt_aes_v2(ecc_key, tree_key)
     key = crypto.load_ec_private_key(ecc_key)
-    storage = sqlite_storage.SqliteSoxStorage(
-        get_connection=lambda: sqlite3.connect(database_name), owner=params.user, database_name=database_name
-    )
+    storage = sqlite_storage.SqliteSoxStorage(get_connection=None, owner=params.user, database_name=database_name)
     last_updated = storage.last_prelim_data_update
     only_shared_cached = storage.shared_records_only
     refresh_data = rebuild or not last_updated or min_updated > last_updated or only_shared_cached and not shared_only
     if refresh_data and not cache_only:
         user_lookup = {x['enterprise_user_id']: x['username'] for x in params.enterprise.get('users', [])}
-        storage.clear_non_aging_data()
-        sync_down(user_lookup, storage)
-        storage.set_shared_records_only(shared_only)
+        with storage.transaction():
+            storage.clear_non_aging_data()
+            sync_down(user_lookup, storage)
+            storage.set_shared_records_only(shared_only)
     return sox_data.SoxData(params, storage=storage, no_cache=no_cache)
 
 
 def get_compliance_data(params, node_id, enterprise_id=0, rebuild=False, min_updated=0, no_cache=False, shared_only=False):
     def sync_down(sdata, node_uid, user_node_id_lookup):
         def run_sync_tasks():
-            async def do_tasks(return_exceptions=False):
-                print('Loading compliance data.', file=sys.stderr, end='', flush=True)
+            print('Loading compliance data.', file=sys.stderr, end='', flush=True)
+            try:
                 users_uids = [int(uid) for uid in sdata.get_users()]
                 record_uids_raw = [rec.record_uid_bytes for rec in sdata.get_records().values()]
-                limit = asyncio.Semaphore(10)
                 max_len = API_SOX_REQUEST_USER_LIMIT
                 total_ruids = len(record_uids_raw)
                 ruid_chunks = [record_uids_raw[x:x + max_len] for x in range(0, total_ruids, max_len)]
-                tasks = [sync_chunk(chunk, users_uids, limit) for chunk in ruid_chunks]
-                await asyncio.gather(*tasks, return_exceptions=return_exceptions)
-                sdata.storage.set_compliance_data_updated()
+                rqs = [api.RestRequest(to_request(chunk, users_uids), 'enterprise/run_compliance_report',
+                                       rs_type=enterprise_pb2.ComplianceReportResponse) for chunk in ruid_chunks]
+                print('.' * len(rqs), file=sys.stderr, end='', flush=True)
+                with sdata.storage.transaction():
+                    for _, rs in api.communicate_rest_concurrent(params, rqs, max_workers=10):
+                        if isinstance(rs, Exception):
+                            logging.warning('Compliance data request failed: %s', rs)
+                            continue
+                        print('.', file=sys.stderr, end='', flush=True)
+                        save_response(rs)
+                        print(':', file=sys.stderr, end='', flush=True)
+                    sdata.storage.set_compliance_data_updated()
+            finally:
                 print('', file=sys.stderr, flush=True)
 
-            py_version_3_6 = not hasattr(asyncio, 'run')
-            if not py_version_3_6:
-                try:
-                    asyncio.run(do_tasks(True))
-                finally:
-                    print('', file=sys.stderr, flush=True)
-            else:
-                old_loop = asyncio.get_event_loop()
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    loop.run_until_complete(do_tasks())
-                except KeyboardInterrupt:
-                    logging.info('SIGINT received: cancelling pending tasks')
-                finally:
-                    try:
-                        pending = [task for task in asyncio.Task.all_tasks() if not task.done()]
-                        for task in pending:
-                            task.cancel()
-                        loop.run_until_complete(loop.shutdown_asyncgens())
-                    finally:
-                        asyncio.set_event_loop(old_loop)
-                        loop.stop()
-                        loop.close()
-
-        async def sync_chunk(chunk, uuids, limit):
-            print('.', file=sys.stderr, end='', flush=True)
-            rs = await fetch_response(raw_ruids=chunk, user_uids=uuids, limit=limit)
-            print('.', file=sys.stderr, end='', flush=True)
-            await save_response(rs)
-            print(':', file=sys.stderr, end='', flush=True)
-
-        async def fetch_response(raw_ruids, user_uids, limit=None):
-            async with limit:
-                rq = enterprise_pb2.ComplianceReportRequest()
-                rq.saveReport = False
-                rq.reportName = f'Compliance Report on {datetime.datetime.now()}'
-                report_run = rq.complianceReportRun
-                report_run.users.extend(user_uids)
-                report_run.records.extend(raw_ruids)
-                caf = report_run.reportCriteriaAndFilter
-                caf.nodeId = node_uid
-                caf.criteria.includeNonShared = not shared_only
-                endpoint = 'enterprise/run_compliance_report'
-                return api.communicate_rest(params, rq, endpoint, rs_type=enterprise_pb2.ComplianceReportResponse)
+        def to_request(raw_ruids, user_uids):
+            rq = enterprise_pb2.ComplianceReportRequest()
+            rq.saveReport = False
+            rq.reportName = f'Compliance Report on {datetime.datetime.now()}'
+            report_run = rq.complianceReportRun
+            report_run.users.extend(user_uids)
+            report_run.records.extend(raw_ruids)
+            caf = report_run.reportCriteriaAndFilter
+            caf.nodeId = node_uid
+            caf.criteria.includeNonShared = not shared_only
+            return rq
 
         anon_id = 0
 
-        async def save_response(rs):
+        def save_response(rs):
             def hash_anon_ids(response):
                 # create new user uid for each anonymous user (uid >> 32 == 0)
                 anon_ids = dict()
@@ -242,10 +214,10 @@ def get_compliance_data(params, node_id, enterprise_id=0, rebuild=False, min_upd
                         folder.enterpriseUserIds[idx] = anon_ids.get(user_id, user_id)
                 return response
 
-            await save_all_types(hash_anon_ids(rs))
+            save_all_types(hash_anon_ids(rs))
             print('.', file=sys.stderr, end='', flush=True)
 
-        async def save_all_types(rs):
+        def save_all_types(rs):
             save_users(rs.userProfiles)
             save_records(rs.auditRecords)
             save_teams(rs.auditTeams)
@@ -256,9 +228,11 @@ def get_compliance_data(params, node_id, enterprise_id=0, rebuild=False, min_upd
             save_team_users(rs.auditTeamUsers)
 
         def save_users(user_profiles):
+            stored = {x.user_uid: x for x in sdata.storage.users.get_entities(
+                [up.enterpriseUserId for up in user_profiles])}
             entities = []
             for up in user_profiles:
-                entity = sdata.storage.users.get_entity(up.enterpriseUserId) or StorageUser()
+                entity = stored.get(up.enterpriseUserId) or StorageUser()
                 entity.user_uid = entity.user_uid or up.enterpriseUserId
                 entity.email = entity.email or encrypt_data(params, up.email)
                 entity.job_title = entity.job_title or encrypt_data(params, up.jobTitle)
@@ -269,10 +243,12 @@ def get_compliance_data(params, node_id, enterprise_id=0, rebuild=False, min_upd
             sdata.storage.users.put_entities(entities)
 
         def save_teams(audit_teams):
+            stored = {x.team_uid: x for x in sdata.storage.teams.get_entities(
+                [utils.base64_url_encode(team.teamUid) for team in audit_teams])}
             entities = []
             for team in audit_teams:
                 team_uid = utils.base64_url_encode(team.teamUid)
-                entity = sdata.storage.teams.get_entity(team_uid) or StorageTeam()
+                entity = stored.get(team_uid) or StorageTeam()
                 entity.team_uid = team_uid
                 entity.team_name = team.teamName
                 entity.restrict_edit = team.restrictEdit
@@ -334,10 +310,12 @@ def get_compliance_data(params, node_id, enterprise_id=0, rebuild=False, min_upd
             sdata.storage.get_sf_team_links().put_links(links)
 
         def save_records(records):
+            stored = {x.record_uid: x for x in sdata.storage.records.get_entities(
+                [utils.base64_url_encode(record.recordUid) for record in records])}
             entities = []
             for record in records:
                 rec_uid = utils.base64_url_encode(record.recordUid)
-                entity = sdata.storage.records.get_entity(rec_uid)
+                entity = stored.get(rec_uid)
                 if entity:
                     entity.in_trash = record.inTrash
                     entity.has_attachments = record.hasAttachments
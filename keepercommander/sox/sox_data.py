@@ -1,3 +1,5 @@
+import hashlib
+import json
 import logging
 from typing import Iterable, Dict, Set, List, Optional
 
@@ -48,6 +50,7 @@ class SoxData:
         self._shared_folders = {}               # type: Dict[str, sox_types.SharedFolder]
         self.ec_private_key = get_ec_private_key(params)
         self.tree_key = params.enterprise.get('unencrypted_tree_key', b'')
+        self.parallel_decryption = params.parallel_decryption
         task = RebuildTask(True)
         self.rebuild_data(task, no_cache)
 
@@ -141,20 +144,56 @@ class SoxData:
 
             return record_lookup
 
+        def decrypt_record_data(store, entities):
+            # type: (sqlite_storage.SqliteSoxStorage, List[storage_types.StorageRecord]) -> Dict[str, dict]
+            data_hashes = {x.record_uid: hashlib.blake2b(x.encrypted_data, digest_size=16).digest()
+                           for x in entities if x.encrypted_data}
+            cached = {x.record_uid: x for x in store.record_data.get_entities(data_hashes.keys())
+                      if x.data_hash == data_hashes.get(x.record_uid)}
+            tasks = [(x.record_uid, crypto.decrypt_aes_v2, x.data, self.tree_key) for x in cached.values()]
+            tasks.extend(((x.record_uid, crypto.decrypt_ec, x.encrypted_data, self.ec_private_key)
+                          for x in entities if x.record_uid in data_hashes and x.record_uid not in cached))
+            results = crypto.decrypt_batch(tasks, parallel=self.parallel_decryption)
+            stale = [x for x in entities if x.record_uid in cached and isinstance(results.get(x.record_uid), Exception)]
+            if stale:
+                results.update(crypto.decrypt_batch(((x.record_uid, crypto.decrypt_ec, x.encrypted_data,
+                                                      self.ec_private_key) for x in stale),
+                                                    parallel=self.parallel_decryption))
+                for x in stale:
+                    del cached[x.record_uid]
+
+            record_data = {}
+            updated = []
+            for record_uid, data_json in results.items():
+                if isinstance(data_json, Exception):
+                    continue
+                try:
+                    record_data[record_uid] = json.loads(data_json.decode())
+                except ValueError:
+                    continue
+                if record_uid not in cached:
+                    entity = storage_types.StorageRecordData(record_uid)
+                    entity.data_hash = data_hashes[record_uid]
+                    entity.data = crypto.encrypt_aes_v2(data_json, self.tree_key)
+                    updated.append(entity)
+            if updated:
+                store.record_data.put_entities(updated)
+            return record_data
+
         def load_records(store, changes):
             # type: (sqlite_storage.SqliteSoxStorage, RebuildTask) -> Dict[str, sox_types.Record]
             entities = []   # type: List[storage_types.StorageRecord]
             if changes.records:
-                for uid in changes.records:
-                    entity = store.records.get_entity(uid)
-                    if entity:
-                        entities.append(entity)
+                entities.extend(store.records.get_entities(changes.records))
             else:
                 entities.extend(store.records.get_all())
 
             record_lookup = {}
+            record_data = decrypt_record_data(store, [x for x in entities if x.record_uid not in self._records])
             for entity in entities:
                 record = self._records.get(entity.record_uid) or sox_types.Record()
+                if entity.record_uid in record_data:
+                    record.data = record_data[entity.record_uid]
                 record.update_properties(entity, self.ec_private_key)
                 record_lookup[record.record_uid] = record
 
@@ -8,6 +8,7 @@
 # Copyright 2022 Keeper Security Inc.
 # Contact: ops@keepersecurity.coms
 #
+import contextlib
 import datetime
 import logging
 import os
@@ -15,7 +16,7 @@ import os
 from ..storage import sqlite_dao, sqlite
 from .storage_types import StorageRecord, StorageUser, StorageUserRecordLink, StorageTeam, StorageRole, \
     StorageRecordPermissions, StorageTeamUserLink, StorageSharedFolderRecordLink, StorageSharedFolderUserLink, \
-    StorageSharedFolderTeamLink, StorageRecordAging
+    StorageSharedFolderTeamLink, StorageRecordAging, StorageRecordData
 from ..storage.types import IEntityStorage
 
 
@@ -30,6 +31,10 @@ class Metadata:
 
 class SqliteSoxStorage:
     def __init__(self, get_connection, owner, database_name=''):
+        self._connection_manager = None
+        if get_connection is None:
+            self._connection_manager = sqlite_dao.SqliteConnectionManager(database_name)
+            get_connection = self._connection_manager.get_connection
         self.get_connection = get_connection
         self.owner = owner
         self.database_name = database_name
@@ -38,6 +43,7 @@ class SqliteSoxStorage:
         user_schema = sqlite_dao.TableSchema.load_schema(StorageUser, 'user_uid')
         record_schema = sqlite_dao.TableSchema.load_schema(StorageRecord, 'record_uid')
         record_aging_schema = sqlite_dao.TableSchema.load_schema(StorageRecordAging, 'record_uid')
+        record_data_schema = sqlite_dao.TableSchema.load_schema(StorageRecordData, 'record_uid')
         user_record_schema = sqlite_dao.TableSchema.load_schema(StorageUserRecordLink, ['record_uid', 'user_uid'],
                                                                 indexes={'UserUID': 'user_uid'})
         team_schema = sqlite_dao.TableSchema.load_schema(StorageTeam, 'team_uid')
@@ -58,8 +64,8 @@ class SqliteSoxStorage:
                                                                        indexes={'TeamUID': 'team_uid'})
         sqlite_dao.verify_database(
             self.get_connection(),
-            (metadata_schema, user_schema, record_schema, record_aging_schema, user_record_schema, team_schema,
-             team_user_schema, role_schema, record_permissions_schema, shared_folder_record_schema,
+            (metadata_schema, user_schema, record_schema, record_aging_schema, record_data_schema, user_record_schema,
+             team_schema, team_user_schema, role_schema, record_permissions_schema, shared_folder_record_schema,
              shared_folder_user_schema, shared_folder_team_schema)
         )
 
@@ -67,6 +73,7 @@ class SqliteSoxStorage:
         self._users = sqlite.SqliteEntityStorage(self.get_connection, user_schema)
         self._records = sqlite.SqliteEntityStorage(self.get_connection, record_schema)
         self._record_aging = sqlite.SqliteEntityStorage(self.get_connection, record_aging_schema)
+        self._record_data = sqlite.SqliteEntityStorage(self.get_connection, record_data_schema)
         self._user_record_links = sqlite.SqliteLinkStorage(self.get_connection, user_record_schema)
         self._teams = sqlite.SqliteEntityStorage(self.get_connection, team_schema)
         self._team_user_links = sqlite.SqliteLinkStorage(self.get_connection, team_user_schema)
@@ -76,6 +83,19 @@ class SqliteSoxStorage:
         self._sf_user_links = sqlite.SqliteLinkStorage(self.get_connection, shared_folder_user_schema)
         self._sf_team_links = sqlite.SqliteLinkStorage(self.get_connection, shared_folder_team_schema)
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """Commits all storage changes made within the scope at once"""
+        if self._connection_manager:
+            with self._connection_manager.transaction():
+                yield
+        else:
+            yield
+
+    def close(self):
+        if self._connection_manager:
+            self._connection_manager.close()
+
     def _get_history(self):
         return self._metadata.load() or Metadata()
 
@@ -128,6 +148,9 @@ class SqliteSoxStorage:
     def get_record_aging(self):
         return self._record_aging
 
+    def get_record_data(self):
+        return self._record_data
+
     def get_user_record_links(self):
         return self._user_record_links
 
@@ -157,6 +180,10 @@ class SqliteSoxStorage:
     def record_aging(self):
         return self.get_record_aging()
 
+    @property
+    def record_data(self):  # type: () -> IEntityStorage
+        return self.get_record_data()
+
     @property
     def users(self):  # type: () -> IEntityStorage
         return self.get_users()
@@ -175,41 +202,56 @@ class SqliteSoxStorage:
         self._metadata.store(history)
 
     def clear_aging_data(self):
-        self._record_aging.delete_all()
-        self.set_records_dated(0)
-        self.set_last_pw_audit(0)
+        with self.transaction():
+            self._record_aging.delete_all()
+            self.set_records_dated(0)
+            self.set_last_pw_audit(0)
 
     def clear_non_aging_data(self):
-        self._records.delete_all()
-        self._users.delete_all()
-        self._user_record_links.delete_all()
-        self._teams.delete_all()
-        self._roles.delete_all()
-        self._sf_team_links.delete_all()
-        self._sf_user_links.delete_all()
-        self._sf_record_links.delete_all()
-        self._team_user_links.delete_all()
-        self._record_permissions.delete_all()
-        self.set_prelim_data_updated(0)
-        self.set_compliance_data_updated(0)
+        with self.transaction():
+            self._records.delete_all()
+            self._users.delete_all()
+            self._user_record_links.delete_all()
+            self._teams.delete_all()
+            self._roles.delete_all()
+            self._sf_team_links.delete_all()
+            self._sf_user_links.delete_all()
+            self._sf_record_links.delete_all()
+            self._team_user_links.delete_all()
+            self._record_permissions.delete_all()
+            self.set_prelim_data_updated(0)
+            self.set_compliance_data_updated(0)
 
     def rebuild_prelim_data(self, users, records, links):
-        self.clear_non_aging_data()
-        self._users.put_entities(users)
-        self._records.put_entities(records)
-        self._user_record_links.put_links(links)
-        self.set_prelim_data_updated()
+        with self.transaction():
+            self.clear_non_aging_data()
+            self._users.put_entities(users)
+            self._records.put_entities(records)
+            self._user_record_links.put_links(links)
+            record_uids = {x.record_uid for x in records}
+            stale_uids = [x.record_uid for x in self._record_data.get_all() if x.record_uid not in record_uids]
+            if stale_uids:
+                self._record_data.delete_uids(stale_uids)
+            self.set_prelim_data_updated()
 
     def clear_all(self):
-        self.clear_non_aging_data()
-        self._record_aging.delete_all()
-        self._metadata.delete_all()
+        with self.transaction():
+            self.clear_non_aging_data()
+            self._record_aging.delete_all()
+            self._record_data.delete_all()
+            self._metadata.delete_all()
 
     def delete_db(self):
         try:
-            conn = self.get_connection()
-            conn.close()
+            if self._connection_manager:
+                self._connection_manager.close()
+            else:
+                conn = self.get_connection()
+                conn.close()
             os.remove(self.database_name)
+            for suffix in ('-wal', '-shm'):
+                if os.path.isfile(self.database_name + suffix):
+                    os.remove(self.database_name + suffix)
         except Exception as e:
             logging.info(f'could not delete db from filesystem, name = {self.database_name}')
             logging.info(f'Exception e:\n{e}')
@@ -39,6 +39,16 @@ class StorageRecordAging(IUid):
         return self.record_uid
 
 
+class StorageRecordData(IUid):
+    def __init__(self, record_uid=''):
+        self.record_uid = record_uid
+        self.data_hash = b''
+        self.data = b''
+
+    def uid(self):
+        return self.record_uid
+
+
 class StorageTeam(IUid):
     def __init__(self):
         self.team_uid = ''
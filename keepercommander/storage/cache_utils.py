@@ -0,0 +1,61 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import hashlib
+import json
+import os
+from typing import Any, Optional
+
+from .. import utils
+
+
+def get_cache_database_name(config_filename, prefix, account_uid_bytes):
+    # type: (Optional[str], str, bytes) -> str
+    """Returns the per-account cache database path next to the configuration file"""
+    path = os.path.dirname(os.path.abspath(config_filename or '1'))
+    account_uid = utils.base64_url_encode(account_uid_bytes)
+    return os.path.join(path, f'{prefix}_{account_uid}.db')
+
+
+def create_database_file(database_name):   # type: (str) -> bool
+    """Creates an empty database file readable by the owner only. Returns False if the file exists"""
+    if os.path.exists(database_name):
+        return False
+    os.close(os.open(database_name, os.O_WRONLY | os.O_CREAT, 0o600))
+    return True
+
+
+def json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'$bytes': utils.base64_url_encode(value)}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def json_object_hook(obj):
+    if len(obj) == 1 and '$bytes' in obj:
+        return utils.base64_url_decode(obj['$bytes'])
+    return obj
+
+
+def encode_json(value):   # type: (Any) -> bytes
+    """Serializes cached values. Bytes are stored as {"$bytes": base64url} and sets as lists"""
+    return json.dumps(value, default=json_default, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(data):   # type: (bytes) -> Any
+    return json.loads(data, object_hook=json_object_hook)
+
+
+def fingerprint(data):   # type: (bytes) -> bytes
+    """Detects changed cache entries between saves"""
+    return hashlib.blake2b(data, digest_size=16).digest()
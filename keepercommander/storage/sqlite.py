@@ -29,8 +29,9 @@ class SqliteEntityStorage(sqlite_dao.SqliteStorage, IEntityStorage):
         return results[0] if results else None
 
     def get_entities(self, pk_values):
-        for value in pk_values:
-            yield self.get_entity(value)
+        """Streams the stored entities for the primary key values. Missing keys are skipped, order is not kept"""
+        for entity in self.select_by_values(self.schema.primary_key[0], pk_values):
+            yield entity
 
     def get_all(self):
         for entity in self.select_all():
@@ -1,4 +1,5 @@
 import collections
+import contextlib
 import logging
 import sqlite3
 from typing import Dict, Union, Sequence, Any, List, Optional, Type, Callable, Iterable, Iterator
@@ -193,6 +194,71 @@ def verify_database(connection, tables, apply_changes=True):
     return result
 
 
+class ScopedConnection(sqlite3.Connection):
+    """SQLite connection that defers commit and rollback to the outermost transaction scope"""
+    def __init__(self, *args, **kwargs):
+        super(ScopedConnection, self).__init__(*args, **kwargs)
+        self.transaction_depth = 0
+
+    def commit(self):
+        if self.transaction_depth == 0:
+            super(ScopedConnection, self).commit()
+
+    def rollback(self):
+        if self.transaction_depth == 0:
+            super(ScopedConnection, self).rollback()
+
+
+class SqliteConnectionManager:
+    """Owns a single connection to a SQLite database
+
+    The connection is opened on first use with WAL journaling. Storage calls made inside
+    a transaction() scope are committed once when the outermost scope exits.
+    """
+    PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', -32000),
+    )
+
+    def __init__(self, database_name, pragmas=None):   # type: (str, Optional[Sequence]) -> None
+        self.database_name = database_name
+        self.pragmas = SqliteConnectionManager.PRAGMAS if pragmas is None else pragmas
+        self._connection = None     # type: Optional[ScopedConnection]
+
+    def get_connection(self):   # type: () -> ScopedConnection
+        if self._connection is None:
+            connection = sqlite3.connect(self.database_name, factory=ScopedConnection)
+            for name, value in self.pragmas:
+                try:
+                    connection.execute(f'PRAGMA {name}={value}')
+                except sqlite3.Error as e:
+                    logging.debug('SQLite: pragma "%s" failed: %s', name, e)
+            self._connection = connection
+        return self._connection
+
+    @contextlib.contextmanager
+    def transaction(self):
+        connection = self.get_connection()
+        connection.transaction_depth += 1
+        try:
+            yield connection
+        except Exception:
+            connection.transaction_depth -= 1
+            connection.rollback()
+            raise
+        else:
+            connection.transaction_depth -= 1
+            connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.transaction_depth = 0
+            self._connection.close()
+            self._connection = None
+
+
 class SqliteStorage:
     def __init__(self, get_connection, schema, owner=None):
         # type: (Callable[[], sqlite3.Connection], TableSchema, Union[str, int, None]) -> None
@@ -312,6 +378,37 @@ class SqliteStorage:
         for row in curr:
             yield self._populate_data_object(row)
 
+    def select_by_values(self, column, values, chunk_size=500):
+        # type: (str, Iterable[Any], int) -> Iterator[Any]
+        """Selects rows where the column matches any of the values. Values are queried in chunks"""
+        column = self._adjust_filter_columns(column)[0]
+
+        def select_chunk(chunk):
+            key = f'select-by-values: {column}: {len(chunk)}'
+            query = self._queries.get(key)
+            if not query:
+                wheres = []
+                if self.schema.owner_column:
+                    wheres.append(f'{self.schema.owner_column}=:{self.schema.owner_column}')
+                wheres.append(f'{column} IN (' + ', '.join((f':v{i}' for i in range(len(chunk)))) + ')')
+                query = 'SELECT ' + ', '.join(self.schema.columns) + f' FROM {self.schema.table_name} ' + \
+                        'WHERE ' + ' AND '.join(wheres)
+                self._queries[key] = query
+            params = {f'v{i}': x for i, x in enumerate(chunk)}
+            if self.schema.owner_column:
+                params[self.schema.owner_column] = self.owner
+            for row in self.get_connection().execute(query, params).fetchall():
+                yield self._populate_data_object(row)
+
+        values_chunk = []
+        for value in values:
+            values_chunk.append(value)
+            if len(values_chunk) >= chunk_size:
+                yield from select_chunk(values_chunk)
+                values_chunk = []
+        if values_chunk:
+            yield from select_chunk(values_chunk)
+
     def delete_all(self):   # type: () -> int
         query = self._queries.get('delete-all')
         if not query:
@@ -59,6 +59,11 @@ class IEntityStorage(abc.ABC):
     def get_entity(self, uid):
         pass
 
+    @abc.abstractmethod
+    def get_entities(self, uids):
+        """Yields the stored entities for uids. Missing uids are skipped and the input order is not kept"""
+        pass
+
     @abc.abstractmethod
     def get_all(self):
         pass
@@ -14,6 +14,7 @@ U = TypeVar('U', bound=IUid)
 
 class IEntityStorage(Generic[U]):
     def get_entity(self, uid: str) -> Optional[U]:  ...
+    def get_entities(self, uids: Iterable[str]) -> Iterable[U]: ...
     def get_all(self) -> Iterable[U]: ...
     def put_entities(self, entities: Iterable[U]) -> None:  ...
     def delete_uids(self, uids: Iterable[str]) -> None: ...
@@ -29,21 +29,63 @@ def get_folder_path(params, folder_uid, delimiter='/'):
     return path
 
 
+def add_folder_record(params, folder_uid, record_uid):   # type: (KeeperParams, str, str) -> None
+    """Adds a record to the folder keeping the record to folder index in sync"""
+    if folder_uid not in params.subfolder_record_cache:
+        params.subfolder_record_cache[folder_uid] = set()
+    params.subfolder_record_cache[folder_uid].add(record_uid)
+    if record_uid not in params.record_folder_cache:
+        params.record_folder_cache[record_uid] = set()
+    params.record_folder_cache[record_uid].add(folder_uid)
+
+
+def remove_folder_records(params, folder_uid):   # type: (KeeperParams, str) -> None
+    records = params.subfolder_record_cache.pop(folder_uid, None)
+    if records:
+        for record_uid in records:
+            folders = params.record_folder_cache.get(record_uid)
+            if folders:
+                folders.discard(folder_uid)
+                if not folders:
+                    del params.record_folder_cache[record_uid]
+
+
+def remove_records_from_folders(params, folder_records):   # type: (KeeperParams, Dict[str, Set[str]]) -> None
+    """Removes records from folders in bulk. folder_records maps folder UID to the record UIDs to remove"""
+    for folder_uid, record_uids in folder_records.items():
+        records = params.subfolder_record_cache.get(folder_uid)
+        if records:
+            records.difference_update(record_uids)
+        for record_uid in record_uids:
+            folders = params.record_folder_cache.get(record_uid)
+            if folders:
+                folders.discard(folder_uid)
+                if not folders:
+                    del params.record_folder_cache[record_uid]
+
+
+def rebuild_record_folder_cache(params):   # type: (KeeperParams) -> None
+    params.record_folder_cache.clear()
+    for folder_uid, records in params.subfolder_record_cache.items():
+        for record_uid in records:
+            if record_uid not in params.record_folder_cache:
+                params.record_folder_cache[record_uid] = set()
+            params.record_folder_cache[record_uid].add(folder_uid)
+
+
 def find_folders(params, record_uid):   # type: (KeeperParams, str) -> Iterable[str]
-    for fuid in params.subfolder_record_cache:
-        if record_uid in params.subfolder_record_cache[fuid]:
-            if fuid:
-                yield fuid
+    for fuid in params.record_folder_cache.get(record_uid) or ():
+        if fuid:
+            yield fuid
 
 
 def find_all_folders(params, record_uid):   # type: (KeeperParams, str) -> Iterable[BaseFolderNode]
-    for fuid in params.subfolder_record_cache:
-        if record_uid in params.subfolder_record_cache[fuid]:
-            if fuid:
-                if fuid in params.folder_cache:
-                    yield params.folder_cache[fuid]
-            else:
-                yield params.root_folder
+    for fuid in params.record_folder_cache.get(record_uid) or ():
+        if fuid:
+            if fuid in params.folder_cache:
+                yield params.folder_cache[fuid]
+        else:
+            yield params.root_folder
 
 
 def find_parent_top_folder(params, record_uid):
@@ -57,10 +99,9 @@ def find_parent_top_folder(params, record_uid):
     contained_folder_uids = []
 
     # Get all folders that might contain the given record
-    for fuid in params.subfolder_record_cache:
+    for fuid in params.record_folder_cache.get(record_uid) or ():
         if fuid:    # record is in root folder
-            if record_uid in params.subfolder_record_cache[fuid]:
-                contained_folder_uids.append(fuid)
+            contained_folder_uids.append(fuid)
 
     shared_folders_containing_record = []
 
@@ -11,11 +11,12 @@
 
 import json
 import logging
-from typing import Any, List, Dict
+import time
+from typing import Any, List, Dict, Optional, Set, Tuple
 
 import google
 
-from . import api, utils, crypto
+from . import api, utils, crypto, subfolder, vault_cache
 from .display import bcolors
 from .params import KeeperParams, RecordOwner
 from .proto import SyncDown_pb2, record_pb2, client_pb2, breachwatch_pb2
@@ -23,16 +24,62 @@ from .proto.SyncDown_pb2 import BreachWatchRecord
 from .subfolder import RootFolderNode, UserFolderNode, SharedFolderNode, SharedFolderFolderNode
 
 
-def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> None
-    """Sync full or partial data down to the client"""
+def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Dict[str, int]
+    """Sync full or partial data down to the client
+
+    Only entities changed by the server response and their dependents are decrypted.
+    Returns the number of entities touched by each decryption phase.
+    """
 
     params.sync_data = False
+    storage = vault_cache.open_vault_cache(params)
+    if storage and params.sync_down_token is None:
+        if storage.load(params):
+            subfolder.rebuild_record_folder_cache(params)
+            params.keeper_record_cache.clear()
+            if params.record_search_index:
+                params.record_search_index.invalidate()
+            if params.reused_password_index:
+                params.reused_password_index.invalidate()
     token = params.sync_down_token
     if not token:
         logging.info('Syncing...')
 
+    dirty_records = set()               # type: Set[str]
+    dirty_meta_data = set()             # type: Set[str]
+    dirty_non_shared_data = set()       # type: Set[str]
+    dirty_teams = set()                 # type: Set[str]
+    dirty_shared_folders = set()        # type: Set[str]
+    dirty_shared_folder_records = {}    # type: Dict[str, Set[str]]
+    dirty_folders = set()               # type: Set[str]
+    dirty_folder_records = set()        # type: Set[str]
+    dirty_record_links = set()          # type: Set[str]
+    dirty_record_rotations = set()      # type: Set[str]
+    folder_tree_changed = False
+    resolve_all_usernames = False
+    shared_folder_entry_indexes = {}    # type: Dict[Tuple[str, str], Tuple[List[dict], Dict[str, dict]]]
+
+    def get_shared_folder_entries(sf, collection, key_name):
+        # type: (dict, str, str) -> Tuple[List[dict], Dict[str, dict]]
+        """Returns a shared folder collection with its entries keyed by key_name.
+        The key map is kept for the whole sync and rebuilt when the collection list is replaced"""
+        entries = sf.get(collection)
+        if entries is None:
+            entries = []
+            sf[collection] = entries
+        index_key = (sf['shared_folder_uid'], collection)
+        entry_index = shared_folder_entry_indexes.get(index_key)
+        if entry_index is None or entry_index[0] is not entries:
+            entry_index = entries, {x[key_name]: x for x in reversed(entries)}
+            shared_folder_entry_indexes[index_key] = entry_index
+        return entry_index
+
+    def log_removal_phase(phase, count, started):   # type: (str, int, float) -> None
+        logging.debug('Removed %s: %d in %.3f s', phase, count, time.perf_counter() - started)
+
     def delete_record_key(rec_uid):
         if rec_uid in params.record_cache:
+            dirty_records.add(rec_uid)
             record = params.record_cache[rec_uid]
             if 'record_key_unencrypted' in record:
                 del record['record_key_unencrypted']
@@ -43,6 +90,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
 
     def delete_shared_folder_key(sf_uid):
         if sf_uid in params.shared_folder_cache:
+            dirty_shared_folders.add(sf_uid)
             shared_folder = params.shared_folder_cache[sf_uid]
             if 'shared_folder_key_unencrypted' in shared_folder:
                 del shared_folder['shared_folder_key_unencrypted']
@@ -54,6 +102,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
 
     def delete_team_key(team_uid):
         if team_uid in params.team_cache:
+            dirty_teams.add(team_uid)
             team = params.team_cache[team_uid]
             if 'team_key_unencrypted' in team:
                 del team['team_key_unencrypted']
@@ -84,43 +133,56 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
             params.available_team_cache = None
             params.subfolder_cache.clear()
             params.subfolder_record_cache.clear()
+            params.record_folder_cache.clear()
             params.record_history.clear()
             params.record_owner_cache.clear()
 
         if len(response.removedRecords) > 0:
             logging.debug('Processing removed records')
+            started = time.perf_counter()
+            # remove records from user folders and the root folder
+            user_folder_records = {}    # type: Dict[str, Set[str]]
             for record_uid_bytes in response.removedRecords:
                 record_uid = utils.base64_url_encode(record_uid_bytes)
                 # remove record metadata
                 if record_uid in params.meta_data_cache:
                     del params.meta_data_cache[record_uid]
+                    dirty_meta_data.add(record_uid)
                 # delete record key
                 delete_record_key(record_uid)
-                # remove record from user folders
-                for folder_uid in params.subfolder_record_cache:
-                    if record_uid in params.subfolder_record_cache[folder_uid]:
-                        if folder_uid in params.subfolder_cache:
-                            folder = params.subfolder_cache[folder_uid]
-                            if folder.get('type') == 'user_folder':
-                                params.subfolder_record_cache[folder_uid].remove(record_uid)
-                        elif folder_uid == '':
-                            params.subfolder_record_cache[folder_uid].remove(record_uid)
+                for folder_uid in params.record_folder_cache.get(record_uid) or ():
+                    if folder_uid in params.subfolder_cache:
+                        if params.subfolder_cache[folder_uid].get('type') != 'user_folder':
+                            continue
+                    elif folder_uid != '':
+                        continue
+                    user_folder_records.setdefault(folder_uid, set()).add(record_uid)
+            subfolder.remove_records_from_folders(params, user_folder_records)
+            dirty_folder_records.update(user_folder_records.keys())
+            log_removal_phase('records', len(response.removedRecords), started)
 
         if len(response.removedTeams) > 0:
             logging.debug('Processing removed teams')
+            started = time.perf_counter()
+            removed_team_uids = set()
             for team_uid_bytes in response.removedTeams:
                 team_uid = utils.base64_url_encode(team_uid_bytes)
+                removed_team_uids.add(team_uid)
                 delete_team_key(team_uid)
-                # remove team from shared folder
-                for shared_folder_uid in params.shared_folder_cache:
-                    shared_folder = params.shared_folder_cache[shared_folder_uid]
-                    if 'teams' in shared_folder:
-                        shared_folder['teams'] = [x for x in shared_folder['teams'] if x['team_uid'] != team_uid]
                 if team_uid in params.team_cache:
                     del params.team_cache[team_uid]
+            # remove teams from shared folders
+            for sf_uid, shared_folder in params.shared_folder_cache.items():
+                if 'teams' in shared_folder:
+                    if any(True for x in shared_folder['teams'] if x['team_uid'] in removed_team_uids):
+                        dirty_shared_folders.add(sf_uid)
+                        shared_folder['teams'] = [x for x in shared_folder['teams']
+                                                  if x['team_uid'] not in removed_team_uids]
+            log_removal_phase('teams', len(response.removedTeams), started)
 
         if len(response.removedSharedFolders) > 0:
             logging.debug('Processing removed shared folders')
+            started = time.perf_counter()
             for sf_uid_bytes in response.removedSharedFolders:
                 sf_uid = utils.base64_url_encode(sf_uid_bytes)
                 if sf_uid in params.shared_folder_cache:
@@ -136,9 +198,11 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                         for r in shared_folder['records']:
                             if 'record_uid' in r:
                                 delete_record_key(r['record_uid'])
+            log_removal_phase('shared folders', len(response.removedSharedFolders), started)
 
         if len(response.removedRecordLinks) > 0:
             logging.debug('Processing removed record links')
+            started = time.perf_counter()
             for link in response.removedRecordLinks:
                 record_uid = utils.base64_url_encode(link.childRecordUid)
                 if record_uid in params.record_cache:
@@ -147,49 +211,40 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     parent_uid = utils.base64_url_encode(link.parentRecordUid)
                     if parent_uid in parents:
                         del parents[parent_uid]
-
-        if len(response.removedUserFolders) > 0:
-            for f_uid_bytes in response.removedUserFolders:
-                f_uid = utils.base64_url_encode(f_uid_bytes)
-                if f_uid in params.subfolder_cache:
-                    del params.subfolder_cache[f_uid]
-                if f_uid in params.subfolder_record_cache:
-                    del params.subfolder_record_cache[f_uid]
-
-        if len(response.removedSharedFolderFolders) > 0:
-            for sffr in response.removedSharedFolderFolders:
-                f_uid_bytes = sffr.folderUid or sffr.sharedFolderUid
-                f_uid = utils.base64_url_encode(f_uid_bytes)
+            log_removal_phase('record links', len(response.removedRecordLinks), started)
+
+        removed_folder_count = len(response.removedUserFolders) + len(response.removedSharedFolderFolders) + \
+            len(response.removedUserFolderSharedFolders)
+        if removed_folder_count > 0:
+            folder_tree_changed = True
+            started = time.perf_counter()
+            removed_folder_uids = [utils.base64_url_encode(x) for x in response.removedUserFolders]
+            removed_folder_uids.extend((utils.base64_url_encode(x.folderUid or x.sharedFolderUid)
+                                        for x in response.removedSharedFolderFolders))
+            removed_folder_uids.extend((utils.base64_url_encode(x.sharedFolderUid)
+                                        for x in response.removedUserFolderSharedFolders))
+            for f_uid in removed_folder_uids:
                 if f_uid in params.subfolder_cache:
                     del params.subfolder_cache[f_uid]
-                if f_uid in params.subfolder_record_cache:
-                    del params.subfolder_record_cache[f_uid]
-
-        if len(response.removedUserFolderSharedFolders) > 0:
-            for ufsfr in response.removedUserFolderSharedFolders:
-                f_uid = utils.base64_url_encode(ufsfr.sharedFolderUid)
-                if f_uid in params.subfolder_cache:
-                    del params.subfolder_cache[f_uid]
-                if f_uid in params.subfolder_record_cache:
-                    del params.subfolder_record_cache[f_uid]
-
-        if len(response.removedUserFolderRecords) > 0:
+                    dirty_folders.add(f_uid)
+                subfolder.remove_folder_records(params, f_uid)
+                dirty_folder_records.add(f_uid)
+            log_removal_phase('folders', removed_folder_count, started)
+
+        removed_folder_record_count = len(response.removedUserFolderRecords) + \
+            len(response.removedSharedFolderFolderRecords)
+        if removed_folder_record_count > 0:
+            started = time.perf_counter()
+            removed_folder_records = {}    # type: Dict[str, Set[str]]
             for ufrr in response.removedUserFolderRecords:
                 f_uid = utils.base64_url_encode(ufrr.folderUid) if ufrr.folderUid else ''
-                if f_uid in params.subfolder_record_cache:
-                    rs = params.subfolder_record_cache[f_uid]
-                    r_uid = utils.base64_url_encode(ufrr.recordUid)
-                    if r_uid in rs:
-                        rs.remove(r_uid)
-
-        if len(response.removedSharedFolderFolderRecords) > 0:
+                removed_folder_records.setdefault(f_uid, set()).add(utils.base64_url_encode(ufrr.recordUid))
             for sfrr in response.removedSharedFolderFolderRecords:
                 f_uid = utils.base64_url_encode(sfrr.folderUid or sfrr.sharedFolderUid)
-                if f_uid in params.subfolder_record_cache:
-                    rs = params.subfolder_record_cache[f_uid]
-                    r_uid = utils.base64_url_encode(sfrr.recordUid)
-                    if r_uid in rs:
-                        rs.remove(r_uid)
+                removed_folder_records.setdefault(f_uid, set()).add(utils.base64_url_encode(sfrr.recordUid))
+            subfolder.remove_records_from_folders(params, removed_folder_records)
+            dirty_folder_records.update(removed_folder_records.keys())
+            log_removal_phase('folder records', removed_folder_record_count, started)
 
         if len(response.recordLinks) > 0:
             for rl in response.recordLinks:
@@ -199,6 +254,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     parents = {}
                     params.record_link_cache[child_uid] = parents
                 parent_uid = utils.base64_url_encode(rl.parentRecordUid)
+                dirty_records.add(child_uid)
                 parents[parent_uid] = {
                     'child_uid': child_uid,
                     'parent_uid': parent_uid,
@@ -218,6 +274,8 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     'owner_account_uid': utils.base64_url_encode(rmd.ownerAccountUid or params.account_uid_bytes)
                 }  # type: dict
                 record_uid = meta_data['record_uid']
+                dirty_meta_data.add(record_uid)
+                dirty_records.add(record_uid)
                 params.meta_data_cache[record_uid] = meta_data
                 params.record_owner_cache[record_uid] = RecordOwner(meta_data['owner'], meta_data['owner_account_uid'])
 
@@ -246,10 +304,12 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
             for r in response.records:
                 record = convert_record(r)
                 params.record_cache[record['record_uid']] = record
+                dirty_records.add(record['record_uid'])
 
         if len(response.nonSharedData) > 0:
             for nsd in response.nonSharedData:
                 record_uid = utils.base64_url_encode(nsd.recordUid)
+                dirty_non_shared_data.add(record_uid)
                 params.non_shared_data_cache[record_uid] = {
                     'record_uid': record_uid,
                     'data': utils.base64_url_encode(nsd.data),
@@ -272,6 +332,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     team = {'team_uid': team_uid}
                     params.team_cache[team_uid] = team
                 assign_team(t, team)
+                dirty_teams.add(team_uid)
 
                 if len(t.removedSharedFolders) > 0 and 'shared_folder_keys' in team:
                     sf_keys = team['shared_folder_keys']
@@ -289,6 +350,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     sf_keys = team['shared_folder_keys']  # type: List[Dict]
                     for sfk in t.sharedFolderKeys:
                         sf_uid = utils.base64_url_encode(sfk.sharedFolderUid)
+                        dirty_shared_folders.add(sf_uid)
                         sf_key = next((x for x in sf_keys if x['shared_folder_uid'] == sf_uid), None)
                         if sf_key is None:
                             sf_key = {
@@ -300,6 +362,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
 
         if len(response.sharedFolders) > 0:
             logging.debug('Processing shared_folders')
+            folder_tree_changed = True
             r = max((x.revision for x in response.sharedFolders))
             if r > revision:
                 revision = r
@@ -333,6 +396,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     if 'shared_folder_key_unencrypted' in shared_folder:
                         del shared_folder['shared_folder_key_unencrypted']
                 assign_shared_folder(p_sf, shared_folder)
+                dirty_shared_folders.add(shared_folder_uid)
 
                 if p_sf.sharedFolderKey:
                     shared_folder['shared_folder_key'] = utils.base64_url_encode(p_sf.sharedFolderKey)
@@ -348,16 +412,17 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 shared_folder_uid = utils.base64_url_encode(sfu.sharedFolderUid)
                 account_uid = utils.base64_url_encode(sfu.accountUid) if sfu.accountUid else utils.base64_url_encode(params.account_uid_bytes)
                 if shared_folder_uid in params.shared_folder_cache:
+                    dirty_shared_folders.add(shared_folder_uid)
                     sf = params.shared_folder_cache[shared_folder_uid]
-                    if 'users' not in sf:
-                        sf['users'] = []
-                    sf_user = next((x for x in sf['users'] if x['account_uid'] == account_uid), None)
+                    sf_users, sf_user_index = get_shared_folder_entries(sf, 'users', 'account_uid')
+                    sf_user = sf_user_index.get(account_uid)
                     if sf_user is None:
                         sf_user = {
                             'username': sfu.username,
                             'account_uid': account_uid
                         }
-                        sf['users'].append(sf_user)
+                        sf_users.append(sf_user)
+                        sf_user_index[account_uid] = sf_user
                     sf_user['manage_records'] = sfu.manageRecords
                     sf_user['manage_users'] = sfu.manageUsers
 
@@ -365,16 +430,17 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
             for sft in response.sharedFolderTeams:
                 shared_folder_uid = utils.base64_url_encode(sft.sharedFolderUid)
                 if shared_folder_uid in params.shared_folder_cache:
+                    dirty_shared_folders.add(shared_folder_uid)
                     sf = params.shared_folder_cache[shared_folder_uid]
-                    if 'teams' not in sf:
-                        sf['teams'] = []
+                    sf_teams, sf_team_index = get_shared_folder_entries(sf, 'teams', 'team_uid')
                     team_uid = utils.base64_url_encode(sft.teamUid)
-                    sf_team = next((x for x in sf['teams'] if x['team_uid'] == team_uid), None)
+                    sf_team = sf_team_index.get(team_uid)
                     if sf_team is None:
                         sf_team = {
                             'team_uid': team_uid
                         }
-                        sf['teams'].append(sf_team)
+                        sf_teams.append(sf_team)
+                        sf_team_index[team_uid] = sf_team
                     sf_team['name'] = sft.name if hasattr(sft, 'name') else ''
                     sf_team['manage_records'] = sft.manageRecords
                     sf_team['manage_users'] = sft.manageUsers
@@ -393,55 +459,67 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 shared_folder_uid = utils.base64_url_encode(sfr.sharedFolderUid)
                 if shared_folder_uid in params.shared_folder_cache:
                     sf = params.shared_folder_cache[shared_folder_uid]
-                    if 'records' not in sf:
-                        sf['records'] = []
+                    sf_records, sf_record_index = get_shared_folder_entries(sf, 'records', 'record_uid')
                     record_uid = utils.base64_url_encode(sfr.recordUid)
-                    sf_record = next((x for x in sf['records'] if x['record_uid'] == record_uid), None)  # type: Dict
+                    dirty_shared_folders.add(shared_folder_uid)
+                    dirty_shared_folder_records.setdefault(shared_folder_uid, set()).add(record_uid)
+                    dirty_records.add(record_uid)
+                    sf_record = sf_record_index.get(record_uid)  # type: Dict
                     if sf_record is None:
                         sf_record = {
                             'record_uid': record_uid
                         }
-                        sf['records'].append(sf_record)
+                        sf_records.append(sf_record)
+                        sf_record_index[record_uid] = sf_record
                     assign_shared_folder_record(sfr, sf_record)
                     params.record_owner_cache[record_uid] = \
                         RecordOwner(sf_record['owner'], sf_record['owner_account_uid'])
 
         if len(response.removedSharedFolderRecords) > 0:
+            started = time.perf_counter()
+            removed_sf_records = {}    # type: Dict[str, Set[str]]
             for rsfr in response.removedSharedFolderRecords:
                 shared_folder_uid = utils.base64_url_encode(rsfr.sharedFolderUid)
                 record_uid = utils.base64_url_encode(rsfr.recordUid)
                 delete_record_key(record_uid)
-                if shared_folder_uid in params.shared_folder_cache:
-                    sf = params.shared_folder_cache[shared_folder_uid]  # type: dict
-                    if 'records' in sf:
-                        pos = next((i for i, x in enumerate(sf['records']) if x['record_uid'] == record_uid), -1)
-                        if pos >= 0:
-                            del sf['records'][pos]
+                removed_sf_records.setdefault(shared_folder_uid, set()).add(record_uid)
+            for shared_folder_uid, record_uids in removed_sf_records.items():
+                sf = params.shared_folder_cache.get(shared_folder_uid)
+                if sf and 'records' in sf:
+                    sf['records'] = [x for x in sf['records'] if x['record_uid'] not in record_uids]
+                    dirty_shared_folders.add(shared_folder_uid)
+            log_removal_phase('shared folder records', len(response.removedSharedFolderRecords), started)
 
         if len(response.removedSharedFolderUsers) > 0:
+            started = time.perf_counter()
+            removed_sf_users = {}    # type: Dict[str, Tuple[Set[str], Set[str]]]
             for rsfu in response.removedSharedFolderUsers:
                 shared_folder_uid = utils.base64_url_encode(rsfu.sharedFolderUid)
-                if shared_folder_uid in params.shared_folder_cache:
-                    sf = params.shared_folder_cache[shared_folder_uid]
-                    if 'users' in sf:
-                        if len(rsfu.username) > 0:
-                            pos = next((i for i, x in enumerate(sf['users']) if x['username'] == rsfu.username), -1)
-                        else:
-                            account_uid = utils.base64_url_encode(rsfu.accountUid)
-                            pos = next((i for i, x in enumerate(sf['users']) if x['account_uid'] == account_uid), -1)
-                        if pos >= 0:
-                            del sf['users'][pos]
+                usernames, account_uids = removed_sf_users.setdefault(shared_folder_uid, (set(), set()))
+                if len(rsfu.username) > 0:
+                    usernames.add(rsfu.username)
+                else:
+                    account_uids.add(utils.base64_url_encode(rsfu.accountUid))
+            for shared_folder_uid, (usernames, account_uids) in removed_sf_users.items():
+                sf = params.shared_folder_cache.get(shared_folder_uid)
+                if sf and 'users' in sf:
+                    sf['users'] = [x for x in sf['users']
+                                   if x['username'] not in usernames and x['account_uid'] not in account_uids]
+                    dirty_shared_folders.add(shared_folder_uid)
+            log_removal_phase('shared folder users', len(response.removedSharedFolderUsers), started)
 
         if len(response.removedSharedFolderTeams) > 0:
+            started = time.perf_counter()
+            removed_sf_teams = {}    # type: Dict[str, Set[str]]
             for rsft in response.removedSharedFolderTeams:
                 shared_folder_uid = utils.base64_url_encode(rsft.sharedFolderUid)
-                team_uid = utils.base64_url_encode(rsft.teamUid)
-                if shared_folder_uid in params.shared_folder_cache:
-                    sf = params.shared_folder_cache[shared_folder_uid]
-                    if 'teams' in sf:
-                        pos = next((i for i, x in enumerate(sf['teams']) if x['team_uid'] == team_uid), -1)
-                        if pos >= 0:
-                            del sf['teams'][pos]
+                removed_sf_teams.setdefault(shared_folder_uid, set()).add(utils.base64_url_encode(rsft.teamUid))
+            for shared_folder_uid, team_uids in removed_sf_teams.items():
+                sf = params.shared_folder_cache.get(shared_folder_uid)
+                if sf and 'teams' in sf:
+                    sf['teams'] = [x for x in sf['teams'] if x['team_uid'] not in team_uids]
+                    dirty_shared_folders.add(shared_folder_uid)
+            log_removal_phase('shared folder teams', len(response.removedSharedFolderTeams), started)
 
         if len(response.userFolders) > 0:
             def convert_user_folder(uf):
@@ -457,17 +535,17 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     o['parent_uid'] = utils.base64_url_encode(uf.parentUid)
                 return o
 
+            folder_tree_changed = True
             for uf in response.userFolders:
                 user_folder = convert_user_folder(uf)
                 params.subfolder_cache[user_folder['folder_uid']] = user_folder
+                dirty_folders.add(user_folder['folder_uid'])
 
         if len(response.userFolderRecords) > 0:
             for ufr in response.userFolderRecords:
                 fuid = utils.base64_url_encode(ufr.folderUid) if ufr.folderUid else ''
-                if fuid not in params.subfolder_record_cache:
-                    params.subfolder_record_cache[fuid] = set()
-                record_uid = utils.base64_url_encode(ufr.recordUid)
-                params.subfolder_record_cache[fuid].add(record_uid)
+                subfolder.add_folder_record(params, fuid, utils.base64_url_encode(ufr.recordUid))
+                dirty_folder_records.add(fuid)
 
         if len(response.userFolderSharedFolders) > 0:
             def convert_user_folder_shared_folder(ufsf):
@@ -483,12 +561,15 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                         o['folder_uid'] = utils.base64_url_encode(ufsf.folderUid)
                 return o
 
+            folder_tree_changed = True
             for ufsf in response.userFolderSharedFolders:
                 uf_sf = convert_user_folder_shared_folder(ufsf)
                 sf_uid = uf_sf['shared_folder_uid']
                 params.subfolder_cache[sf_uid] = uf_sf
+                dirty_folders.add(sf_uid)
 
         if len(response.sharedFolderFolders) > 0:
+            folder_tree_changed = True
             for p_sff in response.sharedFolderFolders:
                 sff = {
                     'shared_folder_uid': utils.base64_url_encode(p_sff.sharedFolderUid),
@@ -502,19 +583,19 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 if p_sff.parentUid:
                     sff['parent_uid'] = utils.base64_url_encode(p_sff.parentUid)
                 params.subfolder_cache[sff['folder_uid']] = sff
+                dirty_folders.add(sff['folder_uid'])
 
         if len(response.sharedFolderFolderRecords) > 0:
             for sffr in response.sharedFolderFolderRecords:
                 key = utils.base64_url_encode(sffr.folderUid or sffr.sharedFolderUid)
-                if key not in params.subfolder_record_cache:
-                    params.subfolder_record_cache[key] = set()
-                record_uid = utils.base64_url_encode(sffr.recordUid)
-                params.subfolder_record_cache[key].add(record_uid)
+                subfolder.add_folder_record(params, key, utils.base64_url_encode(sffr.recordUid))
+                dirty_folder_records.add(key)
 
         if len(response.sharingChanges) > 0:
             for sharing_change in response.sharingChanges:
                 record_uid = utils.base64_url_encode(sharing_change.recordUid)
                 if record_uid in params.record_cache:
+                    dirty_records.add(record_uid)
                     record = params.record_cache[record_uid]
                     record['shared'] = sharing_change.shared
                     if 'shares' in record:
@@ -535,6 +616,8 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
         if len(response.users) > 0:
             for user in response.users:
                 account_uid = utils.base64_url_encode(user.accountUid)
+                if account_uid not in params.user_cache:
+                    resolve_all_usernames = True
                 params.user_cache[account_uid] = user.username
         account_uid = utils.base64_url_encode(params.account_uid_bytes)
         if account_uid not in params.user_cache:
@@ -555,56 +638,91 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     'last_rotation_status': rr.lastRotationStatus,
                 }
                 params.record_rotation_cache[record_uid] = rr_obj
+                dirty_record_rotations.add(record_uid)
 
         params.sync_down_token = response.continuationToken
 
     params.revision = revision
 
-    for sf in params.shared_folder_cache.values():
-        owner = sf.get('owner_username')
-        if not owner:
-            account_uid = sf.get('owner_account_uid')
+    stats = {}    # type: Dict[str, int]
+    if full_sync:
+        dirty_meta_data.update(params.meta_data_cache.keys())
+        dirty_teams.update(params.team_cache.keys())
+        dirty_shared_folders.update(params.shared_folder_cache.keys())
+        dirty_records.update(params.record_cache.keys())
+        dirty_non_shared_data.update(params.non_shared_data_cache.keys())
+        dirty_folders.update(params.subfolder_cache.keys())
+        resolve_all_usernames = True
+        folder_tree_changed = True
+        params.keeper_record_cache.clear()
+        if params.record_search_index:
+            params.record_search_index.invalidate()
+        if params.reused_password_index:
+            params.reused_password_index.invalidate()
+    else:
+        for record_uid in dirty_records:
+            params.keeper_record_cache.pop(record_uid, None)
+        if params.record_search_index:
+            params.record_search_index.invalidate(dirty_records)
+        if params.reused_password_index:
+            params.reused_password_index.invalidate(dirty_records)
+
+    def resolve_username(obj, account_uid_key, username_key):
+        if not obj.get(username_key):
+            account_uid = obj.get(account_uid_key)
             if account_uid and account_uid in params.user_cache:
-                sf['owner_username'] = params.user_cache[account_uid]
-
+                obj[username_key] = params.user_cache[account_uid]
+
+    username_count = 0
+    if resolve_all_usernames:
+        sf_uids = params.shared_folder_cache.keys()
+        md_uids = params.meta_data_cache.keys()
+    else:
+        sf_uids = dirty_shared_folders
+        md_uids = dirty_meta_data
+    for shared_folder_uid in sf_uids:
+        sf = params.shared_folder_cache.get(shared_folder_uid)
+        if not sf:
+            continue
+        resolve_username(sf, 'owner_account_uid', 'owner_username')
+        username_count += 1
         if 'users' in sf:
             for u in sf['users']:
-                username = u.get('username')
-                if not username:
-                    account_uid = u['account_uid']
-                    if account_uid and account_uid in params.user_cache:
-                        u['username'] = params.user_cache[account_uid]
+                resolve_username(u, 'account_uid', 'username')
+                username_count += 1
 
         if 'records' in sf:
-            for r in sf['records']:
-                owner = r.get('owner_username')
-                if not owner:
-                    account_uid = r['owner_account_uid']
-                    if account_uid and account_uid in params.user_cache:
-                        r['owner_username'] = params.user_cache[account_uid]
-
-    for md in params.meta_data_cache.values():
-        owner = md.get('owner_username')
-        if not owner:
-            account_uid = md.get('owner_account_uid')
-            if account_uid and account_uid in params.user_cache:
-                md['owner_username'] = params.user_cache[account_uid]
-
-    if params.breach_watch_records:
+            sf_record_uids = None if resolve_all_usernames else dirty_shared_folder_records.get(shared_folder_uid)
+            if resolve_all_usernames or sf_record_uids:
+                for r in sf['records']:
+                    if sf_record_uids is None or r['record_uid'] in sf_record_uids:
+                        resolve_username(r, 'owner_account_uid', 'owner_username')
+                        username_count += 1
+
+    for record_uid in md_uids:
+        md = params.meta_data_cache.get(record_uid)
+        if md:
+            resolve_username(md, 'owner_account_uid', 'owner_username')
+            username_count += 1
+
+    if resolve_all_usernames and params.breach_watch_records:
         for bwr in params.breach_watch_records.values():
-            scanned_by = bwr.get('scanned_by')
-            if not scanned_by:
-                account_uid = bwr.get('scanned_by_account_uid')
-                if account_uid and account_uid in params.user_cache:
-                    bwr['scanned_by'] = params.user_cache[account_uid]
+            resolve_username(bwr, 'scanned_by_account_uid', 'scanned_by')
+            username_count += 1
+    stats['usernames'] = username_count
 
     to_delete = set()
 
     logging.debug('Decrypting meta data keys')
-    for record_uid, meta_data in params.meta_data_cache.items():
-        if 'record_key_unencrypted' in meta_data:
+    stats['meta_data_keys'] = 0
+    record_keys = {}
+    key_tasks = []
+    for record_uid in dirty_meta_data:
+        meta_data = params.meta_data_cache.get(record_uid)
+        if meta_data is None or 'record_key_unencrypted' in meta_data:
             continue
-        record_key = None
+        stats['meta_data_keys'] += 1
+        record_keys[record_uid] = None
         try:
             if 'record_key' not in meta_data:
                 # old record that doesn't have a record key so make one
@@ -619,22 +737,30 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 # temporary flag for decryption routine below
                 meta_data['old_record_flag'] = True
                 meta_data['is_converted_record_type'] = True
+                record_keys[record_uid] = record_key
             else:
                 record_key_encrypted = utils.base64_url_decode(meta_data['record_key'])
                 key_type = meta_data['record_key_type']
                 if key_type == 1:                        # AES256CBC
-                    record_key = crypto.decrypt_aes_v1(record_key_encrypted, params.data_key)
+                    key_tasks.append((record_uid, crypto.decrypt_aes_v1, record_key_encrypted, params.data_key))
                 elif meta_data['record_key_type'] == 2:  # RSA
-                    record_key = crypto.decrypt_rsa(record_key_encrypted, params.rsa_key2)
+                    key_tasks.append((record_uid, crypto.decrypt_rsa, record_key_encrypted, params.rsa_key2))
                 elif key_type == 3:                      # AES256GCM
-                    record_key = crypto.decrypt_aes_v2(record_key_encrypted, params.data_key)
+                    key_tasks.append((record_uid, crypto.decrypt_aes_v2, record_key_encrypted, params.data_key))
                 elif meta_data['record_key_type'] == 4:  # EC
-                    record_key = crypto.decrypt_ec(record_key_encrypted, params.ecc_key)
+                    key_tasks.append((record_uid, crypto.decrypt_ec, record_key_encrypted, params.ecc_key))
         except Exception as e:
             logging.debug('Record %s meta data decryption error: %s', record_uid, e)
 
+    for record_uid, record_key in crypto.decrypt_batch(key_tasks, parallel=params.parallel_decryption).items():
+        if isinstance(record_key, Exception):
+            logging.debug('Record %s meta data decryption error: %s', record_uid, record_key)
+        else:
+            record_keys[record_uid] = record_key
+
+    for record_uid, record_key in record_keys.items():
         if record_key and len(record_key) == 32:
-            meta_data['record_key_unencrypted'] = record_key
+            params.meta_data_cache[record_uid]['record_key_unencrypted'] = record_key
         else:
             to_delete.add(record_uid)
 
@@ -643,7 +769,12 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
     to_delete.clear()
 
     logging.debug('Decrypting team keys')
-    for team_uid, team in params.team_cache.items():
+    stats['team_keys'] = 0
+    for team_uid in dirty_teams:
+        team = params.team_cache.get(team_uid)
+        if team is None:
+            continue
+        stats['team_keys'] += 1
         if 'team_key_unencrypted' not in team:
             try:
                 encrypted_team_key = utils.base64_url_decode(team['team_key'])
@@ -662,6 +793,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
             if 'shared_folder_keys' in team:
                 for sf_key in team['shared_folder_keys']:
                     if 'shared_folder_key_unencrypted' not in sf_key:
+                        dirty_shared_folders.add(sf_key['shared_folder_uid'])
                         encrypted_sf_key = utils.base64_url_decode(sf_key['shared_folder_key'])
                         try:
                             if sf_key['key_type'] == 2:
@@ -681,20 +813,40 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
     to_delete.clear()
 
     logging.debug('Decrypting shared folder keys')
-    for shared_folder_uid, shared_folder in params.shared_folder_cache.items():
-        if 'shared_folder_key_unencrypted' not in shared_folder and 'shared_folder_key' in shared_folder:
-            # shared folder key
-            try:
-                encrypted_sf_key = utils.base64_url_decode(shared_folder['shared_folder_key'])
-                key_type = shared_folder['key_type']
-                if key_type == 2:
-                    sf_key = crypto.decrypt_rsa(encrypted_sf_key, params.rsa_key2)
-                else:
-                    sf_key = crypto.decrypt_aes_v1(encrypted_sf_key, params.data_key)
-                shared_folder['shared_folder_key_unencrypted'] = sf_key
-            except Exception as e:
-                logging.debug('Shared folder %s key decryption error: %s', shared_folder_uid, e)
+    stats['shared_folder_keys'] = 0
+    sf_keys_changed = set()
+    key_tasks = []
+    for shared_folder_uid in dirty_shared_folders:
+        shared_folder = params.shared_folder_cache.get(shared_folder_uid)
+        if shared_folder is None:
+            continue
+        stats['shared_folder_keys'] += 1
+        if 'shared_folder_key_unencrypted' not in shared_folder:
+            sf_keys_changed.add(shared_folder_uid)
+            if 'shared_folder_key' in shared_folder:
+                # shared folder key
+                try:
+                    encrypted_sf_key = utils.base64_url_decode(shared_folder['shared_folder_key'])
+                    key_type = shared_folder['key_type']
+                    if key_type == 2:
+                        key_tasks.append((shared_folder_uid, crypto.decrypt_rsa, encrypted_sf_key, params.rsa_key2))
+                    else:
+                        key_tasks.append((shared_folder_uid, crypto.decrypt_aes_v1, encrypted_sf_key, params.data_key))
+                except Exception as e:
+                    logging.debug('Shared folder %s key decryption error: %s', shared_folder_uid, e)
+
+    for shared_folder_uid, sf_key in crypto.decrypt_batch(key_tasks, parallel=params.parallel_decryption).items():
+        if isinstance(sf_key, Exception):
+            logging.debug('Shared folder %s key decryption error: %s', shared_folder_uid, sf_key)
+        else:
+            params.shared_folder_cache[shared_folder_uid]['shared_folder_key_unencrypted'] = sf_key
 
+    shared_folder_records = {}
+    key_tasks = []
+    for shared_folder_uid in dirty_shared_folders:
+        shared_folder = params.shared_folder_cache.get(shared_folder_uid)
+        if shared_folder is None:
+            continue
         if 'shared_folder_key_unencrypted' not in shared_folder:
             # team's shared folder key
             for team_uid, team in params.team_cache.items():
@@ -724,28 +876,48 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 shared_folder['name_unencrypted'] = shared_folder_uid
 
             if 'records' in shared_folder:
-                for sfr in shared_folder['records']:
-                    if 'record_key_unencrypted' not in sfr:
-                        try:
-                            encrypted_key = utils.base64_url_decode(sfr['record_key'])
-                            if len(encrypted_key) == 60:
-                                decrypted_key = crypto.decrypt_aes_v2(encrypted_key, sf_key)
-                            else:
-                                decrypted_key = crypto.decrypt_aes_v1(encrypted_key, sf_key)
-                            sfr['record_key_unencrypted'] = decrypted_key
-                        except Exception as e:
-                            logging.debug('Shared folder %s record key decryption error: %s', shared_folder_uid, e)
+                sf_record_uids = None if shared_folder_uid in sf_keys_changed else \
+                    dirty_shared_folder_records.get(shared_folder_uid)
+                if shared_folder_uid in sf_keys_changed or sf_record_uids:
+                    for sfr in shared_folder['records']:
+                        if sf_record_uids is not None and sfr['record_uid'] not in sf_record_uids:
+                            continue
+                        if 'record_key_unencrypted' not in sfr:
+                            try:
+                                encrypted_key = utils.base64_url_decode(sfr['record_key'])
+                                task_uid = (shared_folder_uid, sfr['record_uid'])
+                                shared_folder_records[task_uid] = sfr
+                                if len(encrypted_key) == 60:
+                                    key_tasks.append((task_uid, crypto.decrypt_aes_v2, encrypted_key, sf_key))
+                                else:
+                                    key_tasks.append((task_uid, crypto.decrypt_aes_v1, encrypted_key, sf_key))
+                            except Exception as e:
+                                logging.debug('Shared folder %s record key decryption error: %s', shared_folder_uid, e)
         else:
             to_delete.add(shared_folder_uid)
 
+    for task_uid, decrypted_key in crypto.decrypt_batch(key_tasks, parallel=params.parallel_decryption).items():
+        if isinstance(decrypted_key, Exception):
+            logging.debug('Shared folder %s record key decryption error: %s', task_uid[0], decrypted_key)
+        else:
+            shared_folder_records[task_uid]['record_key_unencrypted'] = decrypted_key
+
+    if len(to_delete) > 0:
+        folder_tree_changed = True
     for shared_folder_uid in to_delete:
         del params.shared_folder_cache[shared_folder_uid]
         if shared_folder_uid in params.subfolder_cache:
             del params.subfolder_cache[shared_folder_uid]
+            dirty_folders.add(shared_folder_uid)
     to_delete.clear()
 
     logging.debug('Resolve record keys. Meta data')
-    for record_uid, record in params.record_cache.items():
+    stats['record_keys'] = 0
+    for record_uid in dirty_records:
+        record = params.record_cache.get(record_uid)
+        if record is None:
+            continue
+        stats['record_keys'] += 1
         if 'record_key_unencrypted' not in record:
             # meta data
             if record_uid in params.meta_data_cache:
@@ -770,82 +942,117 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
 
     if len(to_delete) > 0:
         logging.debug('Decrypt linked keys')
-        for child_uid, parents in params.record_link_cache.items():
-            if child_uid in to_delete:
-                for parent_uid, link in parents.items():
-                    if 'record_key_unencrypted' not in link and parent_uid in params.record_cache:
-                        parent_record = params.record_cache[parent_uid]
-                        if 'record_key_unencrypted' in parent_record:
-                            try:
-                                encrypted_record_key = utils.base64_url_decode(link['record_key'])
-                                link['record_key_unencrypted'] = crypto.decrypt_aes_v2(
-                                    encrypted_record_key, parent_record['record_key_unencrypted'])
-                            except Exception as e:
-                                logging.debug('Record link %s key decryption error: %s', child_uid, e)
+        for child_uid in list(to_delete):
+            parents = params.record_link_cache.get(child_uid)
+            if not parents:
+                continue
+            for parent_uid, link in parents.items():
+                if 'record_key_unencrypted' not in link and parent_uid in params.record_cache:
+                    parent_record = params.record_cache[parent_uid]
+                    if 'record_key_unencrypted' in parent_record:
+                        try:
+                            encrypted_record_key = utils.base64_url_decode(link['record_key'])
+                            link['record_key_unencrypted'] = crypto.decrypt_aes_v2(
+                                encrypted_record_key, parent_record['record_key_unencrypted'])
+                        except Exception as e:
+                            logging.debug('Record link %s key decryption error: %s', child_uid, e)
 
-                child_record = params.record_cache[child_uid]
-                if 'record_key_unencrypted' not in child_record:
-                    for parent_uid, link in parents.items():
-                        if 'record_key_unencrypted' in link:
-                            child_record['record_key_unencrypted'] = link['record_key_unencrypted']
-                            to_delete.remove(child_uid)
-                            break
+            child_record = params.record_cache[child_uid]
+            if 'record_key_unencrypted' not in child_record:
+                for parent_uid, link in parents.items():
+                    if 'record_key_unencrypted' in link:
+                        child_record['record_key_unencrypted'] = link['record_key_unencrypted']
+                        to_delete.remove(child_uid)
+                        break
 
-    to_delete.clear()
-    for record_uid, record in params.record_cache.items():
-        if 'record_key_unencrypted' not in record:
+    if len(to_delete) > 0:
+        for record_uid in to_delete:
             logging.debug('Record %s key could not be resolved', record_uid)
-            to_delete.add(record_uid)
-
-    for record_uid in to_delete:
-        if record_uid in params.record_link_cache:
-            del params.record_link_cache[record_uid]
-        for parents in params.record_link_cache.values():
-            if record_uid in parents:
+            if record_uid in params.record_link_cache:
+                del params.record_link_cache[record_uid]
+            del params.record_cache[record_uid]
+        for child_uid, parents in params.record_link_cache.items():
+            for record_uid in to_delete.intersection(parents.keys()):
                 del parents[record_uid]
-        del params.record_cache[record_uid]
+                dirty_record_links.add(child_uid)
     to_delete.clear()
 
     logging.debug('Decrypting records')
-    for record_uid, record in params.record_cache.items():
+    stats['records'] = 0
+    data_tasks = []
+    for record_uid in dirty_records:
+        record = params.record_cache.get(record_uid)
+        if record is None or 'data_unencrypted' in record:
+            continue
+        stats['records'] += 1
         record_key = record['record_key_unencrypted']
-        if 'data_unencrypted' not in record:
-            try:
-                if 'version' in record and record['version'] >= 3:
-                    record['data_unencrypted'] = crypto.decrypt_aes_v2(utils.base64_url_decode(record['data']), record_key) if 'data' in record else b'{}'
-                else:
-                    record['data_unencrypted'] = crypto.decrypt_aes_v1(utils.base64_url_decode(record['data']), record_key) if 'data' in record else b'{}'
-                    extra = record.get('extra')
-                    if extra:
-                        record['extra_unencrypted'] = crypto.decrypt_aes_v1(utils.base64_url_decode(extra), record_key)
-                    else:
-                        record['extra_unencrypted'] = b'{}'
-            except Exception as e:
-                logging.debug('Record %s data/extra decryption error: %s', record_uid, e)
+        is_v3 = 'version' in record and record['version'] >= 3
+        decrypt_func = crypto.decrypt_aes_v2 if is_v3 else crypto.decrypt_aes_v1
+        record_tasks = []
+        try:
+            if 'data' in record:
+                record_tasks.append(((record_uid, 'data'), decrypt_func, utils.base64_url_decode(record['data']), record_key))
+            if not is_v3:
+                extra = record.get('extra')
+                if extra:
+                    record_tasks.append(((record_uid, 'extra'), decrypt_func, utils.base64_url_decode(extra), record_key))
+        except Exception as e:
+            logging.debug('Record %s data/extra decryption error: %s', record_uid, e)
+            continue
+        data_tasks.extend(record_tasks)
+        record['data_unencrypted'] = b'{}'
+        if not is_v3:
+            record['extra_unencrypted'] = b'{}'
+
+    for (record_uid, field), decrypted_data in \
+            crypto.decrypt_batch(data_tasks, parallel=params.parallel_decryption).items():
+        record = params.record_cache[record_uid]
+        if isinstance(decrypted_data, Exception):
+            logging.debug('Record %s data/extra decryption error: %s', record_uid, decrypted_data)
+            if field == 'data':
+                record.pop('data_unencrypted', None)
+                record.pop('extra_unencrypted', None)
+            else:
+                record.pop('extra_unencrypted', None)
+        elif f'{field}_unencrypted' in record:
+            record[f'{field}_unencrypted'] = decrypted_data
 
     logging.debug('Decrypting non shared data')
-    for record_uid, nsd in params.non_shared_data_cache.items():
-        if 'data_unencrypted' not in nsd and record_uid in params.record_cache:
-            record = params.record_cache[record_uid]
-            data = nsd.get('data')
-            if data:
-                version = record.get('version') or 0
+    stats['non_shared_data'] = 0
+    dirty_non_shared_data.update(dirty_records.intersection(params.non_shared_data_cache.keys()))
+    for record_uid in dirty_non_shared_data:
+        nsd = params.non_shared_data_cache.get(record_uid)
+        if nsd is None or 'data_unencrypted' in nsd or record_uid not in params.record_cache:
+            continue
+        stats['non_shared_data'] += 1
+        record = params.record_cache[record_uid]
+        data = nsd.get('data')
+        if data:
+            version = record.get('version') or 0
+            try:
+                if version >= 3:
+                    nsd['data_unencrypted'] = crypto.decrypt_aes_v2(utils.base64_url_decode(data), params.data_key)
+                else:
+                    nsd['data_unencrypted'] = crypto.decrypt_aes_v1(utils.base64_url_decode(data), params.data_key)
+            except:
                 try:
-                    if version >= 3:
+                    if version < 3:
                         nsd['data_unencrypted'] = crypto.decrypt_aes_v2(utils.base64_url_decode(data), params.data_key)
                     else:
                         nsd['data_unencrypted'] = crypto.decrypt_aes_v1(utils.base64_url_decode(data), params.data_key)
-                except:
-                    try:
-                        if version < 3:
-                            nsd['data_unencrypted'] = crypto.decrypt_aes_v2(utils.base64_url_decode(data), params.data_key)
-                        else:
-                            nsd['data_unencrypted'] = crypto.decrypt_aes_v1(utils.base64_url_decode(data), params.data_key)
-                    except Exception as e:
-                        logging.debug('Non Shared Data %s data decryption error: %s', record_uid, e)
+                except Exception as e:
+                    logging.debug('Non Shared Data %s data decryption error: %s', record_uid, e)
 
     logging.debug('Decrypting folders')
-    for folder_uid, sf in params.subfolder_cache.items():
+    if len(sf_keys_changed) > 0:
+        # shared folder folders depend on their shared folder key
+        dirty_folders.update((x['folder_uid'] for x in params.subfolder_cache.values()
+                              if x['type'] == 'shared_folder_folder' and x['shared_folder_uid'] in sf_keys_changed))
+    stats['folders'] = 0
+    for folder_uid in dirty_folders:
+        sf = params.subfolder_cache.get(folder_uid)
+        if sf is None:
+            continue
         folder_type = sf['type']
         if folder_type == 'user_folder':
             if 'folder_key_unencrypted' not in sf:
@@ -869,6 +1076,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     logging.debug('Shared folder folder %s data decryption error: %s', sf['folder_uid'], e)
         else:
             continue
+        stats['folders'] += 1
         if 'folder_key_unencrypted' in sf:
             if 'data_unencrypted' not in sf:
                 try:
@@ -877,10 +1085,12 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 except Exception as e:
                     logging.debug('Error decrypting shared folder folder %s data: %s', sf['folder_uid'], e)
 
-    prepare_folder_tree(params)
+    if folder_tree_changed or len(dirty_folders) > 0 or params.root_folder is None:
+        prepare_folder_tree(params)
 
     # Populate BreachWatch records data
     params.breach_watch_records = params.breach_watch_records or {}
+    stats['breach_watch'] = len(resp_bw_recs)
     for p_bwr in resp_bw_recs:
         record_uid = utils.base64_url_encode(p_bwr.recordUid)
         if not record_uid:
@@ -903,6 +1113,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                 data_obj = client_pb2.BreachWatchData()
                 data_obj.ParseFromString(data)
                 bwr['data_unencrypted'] = google.protobuf.json_format.MessageToDict(data_obj)
+            resolve_username(bwr, 'scanned_by_account_uid', 'scanned_by')
             params.breach_watch_records[record_uid] = bwr
         except Exception as e:
             logging.debug('Decrypt bw data: %s', e)
@@ -936,6 +1147,34 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
         if record_count:
             logging.info('Decrypted [%d] record(s)', record_count)
 
+    if storage:
+        changes = None    # type: Optional[Dict[str, Set[Any]]]
+        if not full_sync:
+            changes = {
+                'record_cache': dirty_records,
+                'meta_data_cache': dirty_meta_data,
+                'non_shared_data_cache': dirty_non_shared_data,
+                'shared_folder_cache': dirty_shared_folders,
+                'team_cache': dirty_teams,
+                'record_link_cache': dirty_records.union(dirty_record_links),
+                'record_rotation_cache': dirty_record_rotations,
+                'record_owner_cache': dirty_records.union(dirty_meta_data),
+                'subfolder_cache': dirty_folders,
+                'subfolder_record_cache': dirty_folder_records,
+                'breach_watch_records': {utils.base64_url_encode(x.recordUid) for x in resp_bw_recs},
+            }
+            if resolve_all_usernames:
+                # usernames are resolved in every shared folder, meta data and BreachWatch record
+                for cache_name in ('shared_folder_cache', 'meta_data_cache', 'breach_watch_records'):
+                    del changes[cache_name]
+        try:
+            storage.save(params, changes)
+        except Exception as e:
+            logging.warning('Vault cache save error: %s', e)
+
+    logging.debug('Sync down entities: %s', ', '.join((f'{k}={v}' for k, v in stats.items())))
+    return stats
+
 
 def _sync_record_types(params):  # type: (KeeperParams) -> Any
     rq = record_pb2.RecordTypesRequest()
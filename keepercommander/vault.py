@@ -106,8 +106,13 @@ class KeeperRecord(abc.ABC):
         return record
 
     @staticmethod
-    def load(params, rec):
-        # type: (KeeperParams, Union[str, Dict[str, Any]]) -> Optional['KeeperRecord']
+    def load(params, rec, *, use_cache=False):
+        # type: (KeeperParams, Union[str, Dict[str, Any]], bool) -> Optional['KeeperRecord']
+        """Loads a record from the record cache
+
+        use_cache returns the parsed record shared with other callers. It is kept until sync_down sees the record
+        change, so the caller must not modify it.
+        """
         if isinstance(rec, str):
             if rec not in params.record_cache:
                 return
@@ -119,6 +124,22 @@ class KeeperRecord(abc.ABC):
 
         if 'data_unencrypted' not in record:
             return
+
+        record_uid = record.get('record_uid')
+        if use_cache and params.record_cache.get(record_uid) is record:
+            revision = record.get('revision', 0)
+            cached = params.keeper_record_cache.get(record_uid)
+            if cached and cached.revision == revision:
+                return cached
+            keeper_record = KeeperRecord.parse(record)
+            if keeper_record:
+                params.keeper_record_cache[record_uid] = keeper_record
+            return keeper_record
+
+        return KeeperRecord.parse(record)
+
+    @staticmethod
+    def parse(record):    # type: (Dict[str, Any]) -> Optional['KeeperRecord']
         version = record.get('version', 0)
 
         if version == 2:
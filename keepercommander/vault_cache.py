@@ -0,0 +1,199 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import crypto, utils
+from .params import KeeperParams, RecordOwner
+from .storage import cache_utils, sqlite_dao, sqlite
+
+# params attributes persisted by the vault cache. All of them are maintained by sync_down
+VAULT_CACHES = ('record_cache', 'meta_data_cache', 'non_shared_data_cache', 'shared_folder_cache', 'team_cache',
+                'record_link_cache', 'record_rotation_cache', 'record_owner_cache', 'user_cache', 'subfolder_cache',
+                'subfolder_record_cache', 'breach_watch_records', 'record_type_cache')
+
+
+class VaultCacheMetadata:
+    def __init__(self):
+        self.revision = 0
+        self.continuation_token = b''
+
+
+class VaultCacheEntity:
+    def __init__(self):
+        self.cache_name = ''
+        self.uid = ''
+        self.data = b''
+
+
+def get_vault_cache_database_name(params):  # type: (KeeperParams) -> str
+    return cache_utils.get_cache_database_name(params.config_filename, 'vault', params.account_uid_bytes)
+
+
+def _restore_value(cache_name, uid, value):   # type: (str, str, Any) -> Tuple[Any, Any]
+    if cache_name == 'subfolder_record_cache':
+        return uid, set(value)
+    if cache_name == 'record_owner_cache':
+        return uid, RecordOwner(*value)
+    if cache_name == 'record_type_cache':
+        return int(uid), value
+    return uid, value
+
+
+class SqliteVaultCache:
+    """Encrypted on-disk copy of the vault data maintained by sync_down
+
+    Every cache entry is stored as a separate row encrypted with the user's data key.
+    Rows are written only when the entry has changed since the last load or save.
+    """
+    def __init__(self, database_name, owner, data_key):   # type: (str, str, bytes) -> None
+        self.database_name = database_name
+        self.owner = owner
+        self._data_key = data_key
+        cache_utils.create_database_file(database_name)
+        self._connection_manager = sqlite_dao.SqliteConnectionManager(database_name)
+        self._fingerprints = {}    # type: Dict[str, Dict[str, bytes]]
+        self._rescan = False
+
+        metadata_schema = sqlite_dao.TableSchema.load_schema(VaultCacheMetadata, [], owner_column='account_uid')
+        entity_schema = sqlite_dao.TableSchema.load_schema(VaultCacheEntity, ['cache_name', 'uid'],
+                                                           owner_column='account_uid')
+        get_connection = self._connection_manager.get_connection
+        sqlite_dao.verify_database(get_connection(), (metadata_schema, entity_schema))
+
+        self._metadata = sqlite.SqliteRecordStorage(get_connection, metadata_schema, owner)
+        self._entities = sqlite_dao.SqliteStorage(get_connection, entity_schema, owner)
+
+    def close(self):
+        self._connection_manager.close()
+
+    def load(self, params):    # type: (KeeperParams) -> bool
+        """Populates params caches from the store. Returns False if nothing usable is stored"""
+        metadata = self._metadata.load()
+        if not metadata or not metadata.continuation_token:
+            return False
+        try:
+            token = crypto.decrypt_aes_v2(metadata.continuation_token, self._data_key)
+            caches = {x: {} for x in VAULT_CACHES}    # type: Dict[str, Dict[Any, Any]]
+            fingerprints = {x: {} for x in VAULT_CACHES}    # type: Dict[str, Dict[str, bytes]]
+            for entity in self._entities.select_all():
+                cache = caches.get(entity.cache_name)
+                if cache is None:
+                    continue
+                data = crypto.decrypt_aes_v2(entity.data, self._data_key)
+                key, value = _restore_value(entity.cache_name, entity.uid, cache_utils.decode_json(data))
+                cache[key] = value
+                fingerprints[entity.cache_name][entity.uid] = cache_utils.fingerprint(data)
+        except Exception as e:
+            logging.debug('Vault cache "%s" cannot be loaded: %s', self.database_name, e)
+            self.clear()
+            return False
+
+        for cache_name, cache in caches.items():
+            current = getattr(params, cache_name)
+            if isinstance(current, dict):
+                current.clear()
+                current.update(cache)
+            else:
+                setattr(params, cache_name, cache)
+        params.sync_down_token = token
+        params.revision = metadata.revision
+        self._fingerprints = fingerprints
+        logging.debug('Vault cache: loaded %d record(s) at revision %d', len(params.record_cache), params.revision)
+        return True
+
+    def _iterate_changes(self, params, changes):
+        # type: (KeeperParams, Optional[Dict[str, Iterable[Any]]]) -> Iterator[Tuple[str, str, Optional[bytes], Optional[bytes]]]
+        """Yields (cache name, uid, data, fingerprint) of changed entries. Removed entries have no data"""
+        for cache_name in VAULT_CACHES:
+            cache = getattr(params, cache_name) or {}
+            known = self._fingerprints.setdefault(cache_name, {})
+            keys = changes.get(cache_name) if changes is not None else None
+            if keys is None:
+                keys = list(cache.keys())
+                present = {str(x) for x in keys}
+                removed = [x for x in known if x not in present]
+            else:
+                removed = [str(x) for x in keys if x not in cache]
+                keys = [x for x in keys if x in cache]
+            for key in keys:
+                uid = str(key)
+                data = cache_utils.encode_json(cache[key])
+                fingerprint = cache_utils.fingerprint(data)
+                if known.get(uid) != fingerprint:
+                    yield cache_name, uid, data, fingerprint
+            for uid in removed:
+                if uid in known:
+                    yield cache_name, uid, None, None
+
+    def save(self, params, changes=None):    # type: (KeeperParams, Optional[Dict[str, Iterable[Any]]]) -> None
+        """Stores cache entries changed since the last load or save
+
+        changes maps a cache name to the keys added, updated or removed by sync_down.
+        Only those keys are compared. Caches that are not listed, or all caches if changes is None, are rescanned.
+        Entries and the continuation token are written in one transaction. After a failed save the next one rescans.
+        """
+        if self._rescan:
+            changes = None
+        to_put = []
+        to_delete = []
+        fingerprints = []    # type: List[Tuple[str, str, Optional[bytes]]]
+        for cache_name, uid, data, fingerprint in self._iterate_changes(params, changes):
+            fingerprints.append((cache_name, uid, fingerprint))
+            if data is None:
+                to_delete.append((cache_name, uid))
+            else:
+                entity = VaultCacheEntity()
+                entity.cache_name = cache_name
+                entity.uid = uid
+                entity.data = crypto.encrypt_aes_v2(data, self._data_key)
+                to_put.append(entity)
+
+        metadata = VaultCacheMetadata()
+        metadata.revision = params.revision
+        metadata.continuation_token = crypto.encrypt_aes_v2(params.sync_down_token or b'', self._data_key)
+        self._rescan = True
+        with self._connection_manager.transaction():
+            if to_delete:
+                self._entities.delete_by_filter(['cache_name', 'uid'], to_delete, multiple_criteria=True)
+            if to_put:
+                self._entities.put(to_put)
+            self._metadata.store(metadata)
+        self._rescan = False
+
+        for cache_name, uid, fingerprint in fingerprints:
+            known = self._fingerprints.setdefault(cache_name, {})
+            if fingerprint is None:
+                known.pop(uid, None)
+            else:
+                known[uid] = fingerprint
+        logging.debug('Vault cache: %d entities stored, %d entities deleted', len(to_put), len(to_delete))
+
+    def clear(self):
+        with self._connection_manager.transaction():
+            self._entities.delete_all()
+            self._metadata.delete_all()
+        self._fingerprints.clear()
+
+
+def open_vault_cache(params):     # type: (KeeperParams) -> Optional[SqliteVaultCache]
+    if not params.vault_cache or not params.data_key or not params.account_uid_bytes:
+        return None
+    if params.vault_storage is None:
+        try:
+            database_name = get_vault_cache_database_name(params)
+            params.vault_storage = SqliteVaultCache(
+                database_name, utils.base64_url_encode(params.account_uid_bytes), params.data_key)
+        except Exception as e:
+            logging.warning('Vault cache is disabled: %s', e)
+            params.vault_cache = False
+    return params.vault_storage
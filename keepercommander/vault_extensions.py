@@ -11,7 +11,12 @@
 import abc
 import itertools
 import re
-from typing import Optional, Union, Iterator, Dict, Set, Callable, Any, Iterable
+from typing import Optional, Union, Iterator, Dict, Set, Callable, Any, Iterable, List, Tuple
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
 
 from . import crypto, utils, vault, record_types
 from .params import KeeperParams
@@ -32,15 +37,31 @@ def _match_value(pattern, value):  # type: (Callable[[str], Any], Any) -> bool
     return False
 
 
-def matches_record(record, pattern):    # type: (vault.KeeperRecord, Union[str, Callable[[str], Any]]) -> bool
-    if isinstance(pattern, str):
-        pattern = re.compile(pattern, re.IGNORECASE).search
+def _enumerate_strings(value):  # type: (Any) -> Iterator[str]
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for v in value:
+            yield from _enumerate_strings(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _enumerate_strings(v)
 
+
+def _enumerate_search_fields(record):    # type: (vault.KeeperRecord) -> Iterator[Tuple[str, Any]]
     for key, value in record.enumerate_fields():
         m = re.search(r'^\(\w+\)\.?', key)
         if m:
             span = m.span(0)
             key = key[span[1]:]
+        yield key, value
+
+
+def matches_record(record, pattern):    # type: (vault.KeeperRecord, Union[str, Callable[[str], Any]]) -> bool
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern, re.IGNORECASE).search
+
+    for key, value in _enumerate_search_fields(record):
         if key and _match_value(pattern, key):
             return True
         if value and _match_value(pattern, value):
@@ -48,11 +69,159 @@ def matches_record(record, pattern):    # type: (vault.KeeperRecord, Union[str,
     return False
 
 
+# characters that match ASCII letters case-insensitively but do not case fold to them
+_SEARCH_FOLD_TABLE = {0x130: 'i', 0x131: 'i'}
+
+
+def _fold_search_text(text):    # type: (str) -> str
+    return text.translate(_SEARCH_FOLD_TABLE).casefold()
+
+
+def _get_trigrams(text):    # type: (str) -> Set[str]
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+def _get_required_literals(search_str):    # type: (str) -> List[str]
+    """Returns ASCII literals that must be present in any string the pattern matches case-insensitively"""
+    literals = []
+
+    def walk(sub_pattern):
+        run = []
+        for op, av in sub_pattern:
+            if op == sre_parse.LITERAL and av < 128:
+                run.append(chr(av).lower())
+                continue
+            if run:
+                literals.append(''.join(run))
+                run.clear()
+            if op == sre_parse.SUBPATTERN:
+                walk(av[-1])
+            elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] > 0:
+                walk(av[2])
+        if run:
+            literals.append(''.join(run))
+
+    try:
+        walk(sre_parse.parse(search_str, re.IGNORECASE))
+    except Exception:
+        return []
+    return literals
+
+
+class RecordSearchIndex:
+    """Trigram index over the searchable record text
+
+    The index narrows down the records a search pattern can match. Records are still checked with the pattern.
+    sync_down invalidates changed records; they are re-indexed on the next query.
+    """
+    def __init__(self):
+        self._trigrams = {}          # type: Dict[str, Set[str]]
+        self._record_trigrams = {}   # type: Dict[str, Set[str]]
+        self._order = {}             # type: Dict[str, int]
+        self._next_order = 0
+        self._dirty = set()          # type: Set[str]
+        self._rebuild = True
+
+    def invalidate(self, record_uids=None):    # type: (Optional[Iterable[str]]) -> None
+        if record_uids is None:
+            self._rebuild = True
+        else:
+            self._dirty.update(record_uids)
+
+    def _remove_record(self, record_uid):    # type: (str) -> None
+        trigrams = self._record_trigrams.pop(record_uid, None)
+        if trigrams:
+            for trigram in trigrams:
+                uids = self._trigrams.get(trigram)
+                if uids:
+                    uids.discard(record_uid)
+                    if not uids:
+                        del self._trigrams[trigram]
+
+    def _add_record(self, params, record_uid, order=None):    # type: (KeeperParams, str, Optional[int]) -> None
+        trigrams = set()
+        record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
+        if record:
+            for key, value in _enumerate_search_fields(record):
+                if key:
+                    trigrams.update(_get_trigrams(_fold_search_text(key)))
+                if value:
+                    for text in _enumerate_strings(value):
+                        trigrams.update(_get_trigrams(_fold_search_text(text)))
+        for trigram in trigrams:
+            uids = self._trigrams.get(trigram)
+            if uids is None:
+                self._trigrams[trigram] = {record_uid}
+            else:
+                uids.add(record_uid)
+        self._record_trigrams[record_uid] = trigrams
+        if order is None:
+            order = self._next_order
+            self._next_order += 1
+        self._order[record_uid] = order
+
+    def refresh(self, params):    # type: (KeeperParams) -> None
+        if self._rebuild:
+            self._trigrams.clear()
+            self._record_trigrams.clear()
+            self._order.clear()
+            self._next_order = 0
+            self._dirty.clear()
+            self._rebuild = False
+            for record_uid in params.record_cache:
+                self._add_record(params, record_uid)
+        elif self._dirty:
+            for record_uid in self._dirty:
+                self._remove_record(record_uid)
+                if record_uid not in params.record_cache:
+                    self._order.pop(record_uid, None)
+            # new records are appended to the record cache
+            for record_uid in params.record_cache:
+                if record_uid in self._dirty:
+                    self._add_record(params, record_uid, self._order.get(record_uid))
+            self._dirty.clear()
+
+    def sort(self, record_uids):    # type: (Iterable[str]) -> List[str]
+        return sorted(record_uids, key=lambda x: self._order.get(x, 0))
+
+    def find_candidates(self, params, search_str):    # type: (KeeperParams, str) -> Optional[Set[str]]
+        """Returns UIDs of records that may match the pattern, or None if the index cannot tell"""
+        trigrams = set()
+        for literal in _get_required_literals(search_str):
+            trigrams.update(_get_trigrams(literal))
+        if not trigrams:
+            return None
+
+        self.refresh(params)
+        candidates = None    # type: Optional[Set[str]]
+        for trigram in sorted(trigrams, key=lambda x: len(self._trigrams.get(x) or ())):
+            uids = self._trigrams.get(trigram)
+            if not uids:
+                candidates = set()
+                break
+            candidates = set(uids) if candidates is None else candidates.intersection(uids)
+            if not candidates:
+                break
+        return candidates or set()
+
+
+def get_record_search_index(params):    # type: (KeeperParams) -> RecordSearchIndex
+    if params.record_search_index is None:
+        params.record_search_index = RecordSearchIndex()
+    return params.record_search_index
+
+
 def find_records(params,                  # type: KeeperParams
                  search_str=None,         # type: Optional[str]
                  record_type=None,        # type: Union[str, Iterable[str], None]
-                 record_version=None      # type: Union[int, Iterable[int], None]
+                 record_version=None,     # type: Union[int, Iterable[int], None]
+                 use_cache=False          # type: bool
                  ):                       # type: (...) -> Iterator[vault.KeeperRecord]
+    """Finds records matching the search criteria
+
+    Records are matched against parsed records shared through the record cache.
+    Matching records are reloaded unless use_cache is set; use_cache callers must not modify them.
+    """
     pattern = re.compile(search_str, re.IGNORECASE).search if search_str else None
 
     type_filter = None       # type: Optional[Set[str]]
@@ -71,21 +240,29 @@ def find_records(params,                  # type: KeeperParams
         if isinstance(record_version, Iterable):
             version_filter.update((x for x in record_version if isinstance(x, int)))
 
-    for record_uid in params.record_cache:
-        record = vault.KeeperRecord.load(params, record_uid)
+    record_uids = params.record_cache     # type: Iterable[str]
+    if search_str:
+        search_index = get_record_search_index(params)
+        candidates = search_index.find_candidates(params, search_str)
+        if candidates is not None:
+            if search_str in params.record_cache:
+                candidates.add(search_str)
+            record_uids = search_index.sort(candidates)
+
+    for record_uid in record_uids:
+        record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
         if not record:
             continue
         if search_str and record.record_uid == search_str:
-            yield record
-            continue
-        if version_filter and record.version not in version_filter:
+            is_match = True
+        elif version_filter and record.version not in version_filter:
             continue
-        if type_filter and record.record_type not in type_filter:
+        elif type_filter and record.record_type not in type_filter:
             continue
-
-        is_match = matches_record(record, pattern) if pattern else True
+        else:
+            is_match = matches_record(record, pattern) if pattern else True
         if is_match:
-            yield record
+            yield record if use_cache else vault.KeeperRecord.load(params, record_uid)
 
 
 def get_record_description(record):   # type: (vault.KeeperRecord) -> Optional[str]
@@ -0,0 +1,79 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+"""Benchmark: enterprise loader merge cost on a synthetic tenant
+
+Usage: PYTHONPATH=. python unit-tests/benchmark_enterprise_loader.py [users] [links]
+"""
+
+import sys
+import time
+
+from data_enterprise import EnterpriseEnvironment
+from keepercommander import utils
+from keepercommander.enterprise import _EnterpriseLoader
+from keepercommander.params import KeeperParams
+from keepercommander.proto import enterprise_pb2 as proto
+
+PAGE_SIZE = 1000
+TEAMS = 1000
+ROLES = 100
+
+
+def chunks(entity, messages, delete=False):
+    for i in range(0, len(messages), PAGE_SIZE):
+        ed = proto.EnterpriseData(entity=entity, delete=delete)
+        ed.data.extend((x.SerializeToString() for x in messages[i:i+PAGE_SIZE]))
+        yield ed
+
+
+def generate(env, users, links):
+    user_ids = [env.user1_id + i for i in range(users)]
+    team_uids = [utils.base64_url_decode(utils.generate_uid()) for _ in range(TEAMS)]
+    role_ids = [env.role1_id + i for i in range(ROLES)]
+    data = []
+    data.extend(chunks(proto.USERS, [proto.User(
+        enterpriseUserId=x, nodeId=env.node1_id, username=f'user{x}@company.com', encryptedData=f'User {x}',
+        keyType='no_key', status='active') for x in user_ids]))
+    data.extend(chunks(proto.TEAMS, [proto.Team(teamUid=x, name=utils.base64_url_encode(x), nodeId=env.node1_id)
+                                     for x in team_uids]))
+    data.extend(chunks(proto.TEAM_USERS, [proto.TeamUser(
+        teamUid=team_uids[(i + i // users) % TEAMS], enterpriseUserId=user_ids[i % users], userType='USER')
+        for i in range(links // 2)]))
+    data.extend(chunks(proto.ROLE_USERS, [proto.RoleUser(
+        roleId=role_ids[(i + i // users) % ROLES], enterpriseUserId=user_ids[i % users])
+        for i in range(links - links // 2)]))
+    removed = [proto.User(enterpriseUserId=x) for x in user_ids[::50]]
+    return data, list(chunks(proto.USERS, removed, delete=True))
+
+
+def run(users=50000, links=200000):
+    env = EnterpriseEnvironment()
+    full, delta = generate(env, users, links)
+
+    loader = _EnterpriseLoader()
+    loader.enterprise._tree_key = env.tree_key
+    params = KeeperParams()
+    params.enterprise = {}
+
+    for name, chunk_list in (('full load', full), ('delete 2% users', delta)):
+        started = time.perf_counter()
+        for ed in chunk_list:
+            loader._data_types[ed.entity].parse(params, ed)
+        loader.flush(params)
+        elapsed = time.perf_counter() - started
+        print(f'{name:>16}: {len(chunk_list):4d} chunk(s) {elapsed:8.3f} s')
+    print(f'{"remaining":>16}: {len(params.enterprise["users"])} users, '
+          f'{len(params.enterprise["team_users"]) + len(params.enterprise["role_users"])} links')
+
+
+if __name__ == '__main__':
+    run(*(int(x) for x in sys.argv[1:3]))
@@ -0,0 +1,45 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+"""Micro-benchmark: client side cost of building an encrypted REST request
+
+Usage: PYTHONPATH=. python unit-tests/benchmark_rest_api.py [iterations]
+"""
+
+import sys
+import timeit
+
+from keepercommander import params, rest_api, utils
+from keepercommander.proto import APIRequest_pb2
+
+
+def run(iterations=1000):
+    payload = APIRequest_pb2.ApiRequestPayload()
+    payload.payload = utils.generate_aes_key() * 32
+    for key_id in (1, 7):
+        context = params.RestApiContext(server='test.keepersecurity.com')
+        context.transmission_key = utils.generate_aes_key()
+        context.server_key_id = key_id
+
+        def uncached():
+            context.encrypted_transmission_key = None
+            rest_api.build_api_request(context, payload)
+
+        def cached():
+            rest_api.build_api_request(context, payload)
+
+        for name, func in (('re-encrypt', uncached), ('cached', cached)):
+            elapsed = timeit.timeit(func, number=iterations)
+            print(f'key id {key_id} {name:>10}: {elapsed / iterations * 1e6:10.1f} us/request')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,91 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2023 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+"""Benchmark: sync_down merge cost for a single shared folder with many records
+
+Usage: PYTHONPATH=. python unit-tests/benchmark_sync_down.py [records]
+"""
+
+import json
+import sys
+import time
+from unittest import mock
+
+from data_vault import get_connected_params, get_sync_down_responses
+from keepercommander import crypto, utils
+from keepercommander.proto import SyncDown_pb2
+from keepercommander.sync_down import sync_down
+
+
+def generate(params, records):
+    shared_folder_key = utils.generate_aes_key()
+    shared_folder_uid = utils.base64_url_decode(utils.generate_uid())
+
+    full = SyncDown_pb2.SyncDownResponse()
+    full.continuationToken = crypto.get_random_bytes(64)
+    full.cacheStatus = SyncDown_pb2.CLEAR
+    sf = SyncDown_pb2.SharedFolder()
+    sf.sharedFolderUid = shared_folder_uid
+    sf.revision = 1
+    sf.sharedFolderKey = crypto.encrypt_aes_v1(shared_folder_key, params.data_key)
+    sf.keyType = 1
+    sf.name = crypto.encrypt_aes_v1(b'Benchmark', shared_folder_key)
+    sf.cacheStatus = SyncDown_pb2.CLEAR
+    full.sharedFolders.append(sf)
+    full.sharedFolderUsers.append(SyncDown_pb2.SharedFolderUser(
+        sharedFolderUid=shared_folder_uid, accountUid=params.account_uid_bytes, manageRecords=True, manageUsers=True))
+    full.userFolderSharedFolders.append(SyncDown_pb2.UserFolderSharedFolder(sharedFolderUid=shared_folder_uid))
+
+    record_key = utils.generate_aes_key()
+    encrypted_record_key = crypto.encrypt_aes_v1(record_key, shared_folder_key)
+    record_data = crypto.encrypt_aes_v2(json.dumps({'title': 'Record', 'type': 'login', 'fields': []}).encode(),
+                                        record_key)
+    record_uids = [utils.base64_url_decode(utils.generate_uid()) for _ in range(records)]
+    for record_uid in record_uids:
+        full.records.append(SyncDown_pb2.Record(recordUid=record_uid, revision=1, version=3, shared=True,
+                                                data=record_data))
+        full.sharedFolderRecords.append(SyncDown_pb2.SharedFolderRecord(
+            sharedFolderUid=shared_folder_uid, recordUid=record_uid, recordKey=encrypted_record_key,
+            ownerAccountUid=params.account_uid_bytes, owner=True))
+
+    delta = SyncDown_pb2.SyncDownResponse()
+    delta.continuationToken = crypto.get_random_bytes(64)
+    for record_uid in record_uids[::10]:
+        delta.sharedFolderRecords.append(SyncDown_pb2.SharedFolderRecord(
+            sharedFolderUid=shared_folder_uid, recordUid=record_uid, recordKey=encrypted_record_key,
+            ownerAccountUid=params.account_uid_bytes, owner=True, canEdit=True))
+    delta.removedSharedFolderRecords.extend((SyncDown_pb2.SharedFolderRecord(
+        sharedFolderUid=shared_folder_uid, recordUid=x) for x in record_uids[5::10]))
+    return full, delta
+
+
+def run(records=100000):
+    params = get_connected_params()
+    params.revision = 0
+    full, delta = generate(params, records)
+
+    for name, response in (('full sync', full), ('update/remove 20%', delta)):
+        def communicate_rest(p, request, endpoint, rs_type):
+            if endpoint == 'vault/sync_down':
+                return response
+            return get_sync_down_responses(p, request, endpoint, rs_type)
+
+        with mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest):
+            started = time.perf_counter()
+            sync_down(params)
+            elapsed = time.perf_counter() - started
+        print(f'{name:>18}: {len(response.sharedFolderRecords):6d} shared folder record(s) {elapsed:8.3f} s')
+    shared_folder = next(iter(params.shared_folder_cache.values()))
+    print(f'{"remaining":>18}: {len(shared_folder["records"])} shared folder records')
+
+
+if __name__ == '__main__':
+    run(*(int(x) for x in sys.argv[1:2]))
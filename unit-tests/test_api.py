@@ -1,9 +1,13 @@
+import json
+import re
 from unittest import TestCase, mock
 from collections import namedtuple
 
 from data_vault import VaultEnvironment, get_synced_params, get_connected_params
 from helper import KeeperApiHelper
-from keepercommander import api, generator
+from keepercommander import api, generator, params, rest_api, crypto, utils, vault, vault_extensions
+from keepercommander.error import KeeperApiError
+from keepercommander.proto import APIRequest_pb2
 
 vault_env = VaultEnvironment()
 
@@ -45,6 +49,34 @@ class TestSearch(TestCase):
         records = api.search_records(params, 'INVALID')
         self.assertEqual(len(records), 0)
 
+    def test_find_records_search_index(self):
+        params = get_synced_params()
+        record_uids = list(params.record_cache.keys())
+        patterns = ['', 'RECORD', 'Record 1', 'rec.rd', 'cord [12]', '(Record|Folder)', 'INVALID', 'user',
+                    record_uids[1], '^Rec', 'reco?rd']
+
+        def full_scan(pattern):
+            compiled = re.compile(pattern, re.IGNORECASE).search if pattern else None
+            return [x for x in record_uids
+                    if not compiled or x == pattern or
+                    vault_extensions.matches_record(vault.KeeperRecord.load(params, x), compiled)]
+
+        for pattern in patterns:
+            found = [x.record_uid for x in vault_extensions.find_records(params, pattern)]
+            self.assertEqual(found, full_scan(pattern), pattern)
+        self.assertIsNotNone(params.record_search_index)
+        self.assertIsNotNone(params.record_search_index.find_candidates(params, 'Record 1'))
+        self.assertIsNone(params.record_search_index.find_candidates(params, 'R.c'))
+
+        record_uid = record_uids[0]
+        title = vault.KeeperRecord.load(params, record_uid).title
+        params.record_cache[record_uid]['data_unencrypted'] = json.dumps({'title': 'Changed Title'}).encode()
+        params.record_cache[record_uid]['revision'] += 1
+        params.record_search_index.invalidate([record_uid])
+        params.keeper_record_cache.pop(record_uid, None)
+        self.assertEqual([x.record_uid for x in vault_extensions.find_records(params, 'changed tit')], [record_uid])
+        self.assertNotIn(record_uid, [x.record_uid for x in vault_extensions.find_records(params, title)])
+
     def test_search_shared_folders(self):
         params = get_synced_params()
 
@@ -101,3 +133,136 @@ class TestSearch(TestCase):
         }
         with mock.patch('builtins.print'), mock.patch('builtins.input', return_value='decline'):
             self.assertFalse(api.accept_account_transfer_consent(params))
+
+
+class TestRestApi(TestCase):
+    def test_execute_rest_reuses_session(self):
+        context = params.RestApiContext(server='test.keepersecurity.com')
+        context.transmission_key = utils.generate_aes_key()
+
+        def post(url, data=None, **kwargs):
+            rs = mock.Mock()
+            rs.status_code = 200
+            rs.headers = {'Content-Type': 'application/octet-stream'}
+            rs.content = crypto.encrypt_aes_v2(b'response', context.transmission_key)
+            return rs
+
+        session = context.get_session()
+        with mock.patch.object(session, 'post', side_effect=post) as mock_post:
+            for _ in range(3):
+                rs = rest_api.execute_rest(context, 'vault/sync_down', APIRequest_pb2.ApiRequestPayload())
+                self.assertEqual(rs, b'response')
+            self.assertEqual(mock_post.call_count, 3)
+        self.assertIs(context.get_session(), session)
+
+        context.set_proxy('http://proxy.company.com:3128')
+        self.assertIsNot(context.get_session(), session)
+
+    def test_encrypted_transmission_key_cache(self):
+        context = params.RestApiContext(server='test.keepersecurity.com')
+        context.transmission_key = utils.generate_aes_key()
+        with mock.patch('keepercommander.crypto.encrypt_ec', wraps=crypto.encrypt_ec) as mock_encrypt:
+            key1 = rest_api.get_encrypted_transmission_key(context)
+            key2 = rest_api.get_encrypted_transmission_key(context)
+            self.assertEqual(key1, key2)
+            self.assertEqual(mock_encrypt.call_count, 1)
+
+            context.server_key_id = 8
+            key3 = rest_api.get_encrypted_transmission_key(context)
+            self.assertNotEqual(key1, key3)
+            self.assertEqual(mock_encrypt.call_count, 2)
+
+            context.transmission_key = utils.generate_aes_key()
+            rest_api.get_encrypted_transmission_key(context)
+            self.assertEqual(mock_encrypt.call_count, 3)
+
+    def test_execute_rest_throttle_backoff(self):
+        context = params.RestApiContext(server='test.keepersecurity.com')
+        context.transmission_key = utils.generate_aes_key()
+        responses = []
+
+        def post(url, data=None, **kwargs):
+            rs = mock.Mock()
+            if len(responses) < 3:
+                rs.status_code = 403
+                rs.headers = {'Content-Type': 'application/json'}
+                rs.json.return_value = {'error': 'throttled', 'message': 'Throttled'}
+            else:
+                rs.status_code = 200
+                rs.headers = {'Content-Type': 'application/octet-stream'}
+                rs.content = crypto.encrypt_aes_v2(b'response', context.transmission_key)
+            responses.append(rs)
+            return rs
+
+        with mock.patch.object(context.get_session(), 'post', side_effect=post), \
+                mock.patch('time.sleep') as mock_sleep:
+            rs = rest_api.execute_rest(context, 'vault/sync_down', APIRequest_pb2.ApiRequestPayload())
+            self.assertEqual(rs, b'response')
+            delays = [x[0][0] for x in mock_sleep.call_args_list]
+            self.assertEqual(len(delays), 3)
+            for attempt, delay in enumerate(delays):
+                max_delay = rest_api.THROTTLE_BASE_DELAY * (2 ** attempt)
+                self.assertGreaterEqual(delay, max_delay / 2)
+                self.assertLessEqual(delay, max_delay)
+
+    def test_communicate_rest_concurrent(self):
+        params_mock = get_connected_params()
+
+        def communicate_rest(params, request, endpoint, **kwargs):
+            if endpoint == 'fail':
+                raise Exception(request)
+            return request
+
+        rqs = [api.RestRequest(i, 'fail' if i % 3 == 0 else 'ok') for i in range(10)]
+        with mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest):
+            for max_workers in (1, 4):
+                results = dict(api.communicate_rest_concurrent(params_mock, rqs, max_workers=max_workers))
+                self.assertEqual(len(results), len(rqs))
+                for i, rs in results.items():
+                    if i % 3 == 0:
+                        self.assertIsInstance(rs, Exception)
+                    else:
+                        self.assertEqual(rs, i)
+
+
+class TestExecuteBatch(TestCase):
+    def test_execute_batch_throttled(self):
+        params_mock = get_connected_params()
+        calls = []
+
+        def communicate(params, rq):
+            chunk = rq['requests']
+            calls.append(len(chunk))
+            if len(calls) == 1:
+                results = [{'result': 'success'}] * 3
+                results.append({'result': 'fail', 'result_code': 'throttled'})
+                return {'result': 'success', 'results': results}
+            return {'result': 'success', 'results': [{'result': 'success', 'id': x['id']} for x in chunk]}
+
+        rqs = [{'command': 'test', 'id': i} for i in range(10)]
+        with mock.patch('keepercommander.api.communicate', side_effect=communicate), \
+                mock.patch('time.sleep') as mock_sleep:
+            rss = api.execute_batch_ex(params_mock, rqs)
+            mock_sleep.assert_called_once()
+        self.assertEqual(len(rss), len(rqs))
+        self.assertTrue(all(x.response['result'] == 'success' for x in rss))
+        self.assertEqual([x.attempts for x in rss], [1] * 3 + [2] * 7)
+        self.assertEqual(calls, [10, 3, 4])
+        self.assertEqual([x.response['id'] for x in rss[3:]], list(range(3, 10)))
+
+    def test_execute_batch_parallel_error(self):
+        params_mock = get_connected_params()
+
+        def communicate(params, rq):
+            chunk = rq['requests']
+            if any(x['id'] == 0 for x in chunk):
+                raise KeeperApiError('access_denied', 'Access denied')
+            return {'result': 'success', 'results': [{'result': 'success'}] * len(chunk)}
+
+        rqs = [{'command': 'test', 'id': i} for i in range(api.EXECUTE_BATCH_MAX_SIZE * 3)]
+        with mock.patch('keepercommander.api.communicate', side_effect=communicate):
+            rss = api.execute_batch(params_mock, rqs, max_parallel=4)
+        self.assertEqual(len(rss), len(rqs))
+        self.assertEqual(len([x for x in rss if x['result'] != 'success']), api.EXECUTE_BATCH_MAX_SIZE)
+        self.assertEqual(rss[0]['result_code'], 'access_denied')
+        self.assertIsNot(rss[0], rss[1])
@@ -0,0 +1,194 @@
+import base64
+import json
+import tempfile
+from unittest import TestCase, mock
+
+from data_vault import get_synced_params
+from google.protobuf import json_format
+
+from keepercommander import breachwatch_cache, crypto, utils
+from keepercommander.breachwatch import BreachWatch, get_reused_password_index
+from keepercommander.commands.breachwatch import BreachWatchScanCommand
+from keepercommander.proto import breachwatch_pb2, client_pb2
+
+
+class TestBreachWatch(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.params = get_synced_params()
+        self.params.config_filename = f'{self.temp_dir.name}/config.json'
+        self.params.breach_watch = BreachWatch()
+        self.params.breach_watch.password_token = b'token'
+        self.params.breach_watch.rest_api = mock.Mock()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def execute_status(rq):
+        rs = breachwatch_pb2.BreachWatchStatusResponse()
+        for check in rq.hashCheck:
+            rs.hashStatus.add(hash1=check.hash1, euid=utils.generate_aes_key()[:16], breachDetected=False)
+        return rs
+
+    @staticmethod
+    def update_record_data(params, rq, endpoint, rs_type=None):
+        if endpoint != 'breachwatch/update_record_data':
+            return None
+        rs = breachwatch_pb2.BreachWatchUpdateResponse()
+        for bwrq in rq.breachWatchRecordRequest:
+            rs.breachWatchRecordStatus.add(recordUid=bwrq.recordUid, status='OK')
+        return rs
+
+    def set_password(self, record_uid, password):
+        record = self.params.record_cache[record_uid]
+        data = json.loads(record['data_unencrypted'])
+        data['secret2'] = password
+        record['data_unencrypted'] = json.dumps(data).encode()
+        self.params.keeper_record_cache.pop(record_uid, None)
+
+    def sync_record_data(self, params, rq, endpoint, rs_type=None):
+        """Stores submitted BreachWatch data the way sync_down does after a successful update"""
+        rs = self.update_record_data(params, rq, endpoint, rs_type)
+        if rs is not None:
+            for bwrq in rq.breachWatchRecordRequest:
+                record_uid = utils.base64_url_encode(bwrq.recordUid)
+                record_key = params.record_cache[record_uid]['record_key_unencrypted']
+                data_obj = client_pb2.BreachWatchData()
+                data_obj.ParseFromString(crypto.decrypt_aes_v2(bwrq.encryptedData, record_key))
+                params.breach_watch_records[record_uid] = {
+                    'data_unencrypted': json_format.MessageToDict(data_obj)
+                }
+        return rs
+
+    def test_scan_cache(self):
+        cmd = BreachWatchScanCommand()
+        record_uids = [x for x, o in self.params.record_owner_cache.items() if o.owner is True]
+        self.assertEqual(len(record_uids), 2)
+        self.set_password(record_uids[1], 'password1')
+        self.params.breach_watch_records = {}
+
+        with mock.patch.object(BreachWatch, '_execute_status', side_effect=self.execute_status) as mock_status, \
+                mock.patch('keepercommander.api.communicate_rest', side_effect=self.sync_record_data) as mock_rest, \
+                mock.patch.object(BreachWatch, 'delete_euids'), \
+                mock.patch('keepercommander.utils.password_score', return_value=100):
+            cmd.execute(self.params)
+            self.assertEqual(mock_status.call_count, 1)
+            self.assertEqual(mock_rest.call_count, 1)
+            self.assertEqual(len(mock_rest.call_args[0][1].breachWatchRecordRequest), 2)
+
+            mock_status.reset_mock()
+            mock_rest.reset_mock()
+            cmd.execute(self.params)
+            mock_status.assert_not_called()
+            mock_rest.assert_not_called()
+
+            # record BreachWatch data lost on the server: the record is scanned again
+            # the cached status is reused since the other record still references its EUID
+            del self.params.breach_watch_records[record_uids[0]]
+            cmd.execute(self.params)
+            mock_status.assert_not_called()
+            self.assertEqual(mock_rest.call_count, 1)
+            self.assertIn(record_uids[0], self.params.breach_watch_records)
+
+            # a cached EUID that no record references may have been deleted: the password is checked
+            mock_rest.reset_mock()
+            self.params.breach_watch_records.clear()
+            cmd.execute(self.params)
+            self.assertEqual(mock_status.call_count, 1)
+            self.assertEqual(mock_rest.call_count, 1)
+
+            mock_status.reset_mock()
+            del self.params.breach_watch_records[record_uids[0]]
+            cmd.execute(self.params, recheck_days=0)
+            self.assertEqual(mock_status.call_count, 1)
+
+            mock_status.reset_mock()
+            del self.params.breach_watch_records[record_uids[0]]
+            cmd.execute(self.params, force=True)
+            self.assertEqual(mock_status.call_count, 1)
+
+    def test_scan_and_store_record_statuses(self):
+        record_uids = [x.record_uid for x, _ in self.params.breach_watch.get_records_to_scan(self.params)]
+        self.assertGreater(len(record_uids), 1)
+        self.params.enterprise_rsa_key = self.params.rsa_key2.public_key()
+
+        with mock.patch.object(BreachWatch, '_execute_status', side_effect=self.execute_status) as mock_status, \
+                mock.patch('keepercommander.api.communicate_rest', side_effect=self.update_record_data) as mock_rest, \
+                mock.patch('keepercommander.api.sync_down') as mock_sync, \
+                mock.patch.object(BreachWatch, 'save_reused_pw_count') as mock_reused, \
+                mock.patch('keepercommander.utils.password_score', return_value=100):
+            self.params.breach_watch.scan_and_store_record_statuses(self.params, record_uids)
+            self.assertEqual(mock_status.call_count, 1)
+            self.assertEqual(len(mock_status.call_args[0][0].hashCheck), len(record_uids))
+            endpoints = [x[0][2] for x in mock_rest.call_args_list]
+            self.assertEqual(endpoints, ['breachwatch/update_record_data', 'enterprise/update_security_data'])
+            self.assertEqual(len(mock_rest.call_args_list[1][0][1].recordSecurityData), len(record_uids))
+            mock_sync.assert_called_once()
+            mock_reused.assert_called_once()
+
+    def test_reused_password_index(self):
+        index = get_reused_password_index(self.params)
+        self.assertEqual(index.get_reused_count(self.params), 0)
+        record_uids = [x for x, o in self.params.record_owner_cache.items() if o.owner is True]
+        other_uid = next(x for x, o in self.params.record_owner_cache.items() if o.owner is False)
+        self.assertEqual(len(record_uids), 2)
+
+        def set_password(record_uid, password):
+            self.set_password(record_uid, password)
+            index.invalidate([record_uid])
+
+        set_password(record_uids[1], 'password1')
+        self.assertEqual(index.get_reused_count(self.params), 2)
+        self.assertEqual(index.get_reused_count(self.params, owned=True), 2)
+        self.assertEqual(index.get_password_use_count(self.params, record_uids[0]), 2)
+        self.assertEqual(index.get_password_use_count(self.params, other_uid), 1)
+
+        with mock.patch('keepercommander.api.sync_down'), \
+                mock.patch('keepercommander.api.communicate_rest') as mock_rest:
+            self.params.enterprise_ec_key = b'key'
+            BreachWatch.save_reused_pw_count(self.params)
+            self.assertEqual(mock_rest.call_args[0][1].count, 2)
+
+        set_password(record_uids[0], 'password2')
+        self.assertEqual(index.get_reused_count(self.params), 2)
+        self.assertEqual(index.get_reused_count(self.params, owned=True), 0)
+
+        del self.params.record_cache[other_uid]
+        index.invalidate([other_uid])
+        self.assertEqual(index.get_reused_count(self.params), 0)
+
+    def test_scan_keeps_shared_euid(self):
+        cmd = BreachWatchScanCommand()
+        record_uids = [x for x, o in self.params.record_owner_cache.items() if o.owner is True]
+        self.set_password(record_uids[1], 'password1')
+        issued_euids = []
+
+        def execute_status(rq):
+            rs = self.execute_status(rq)
+            issued_euids.extend((x.euid for x in rs.hashStatus))
+            return rs
+
+        with mock.patch.object(BreachWatch, '_execute_status', side_effect=execute_status), \
+                mock.patch('keepercommander.api.communicate_rest', side_effect=self.update_record_data), \
+                mock.patch.object(BreachWatch, 'delete_euids') as mock_delete, \
+                mock.patch('keepercommander.utils.password_score', return_value=100):
+            cmd.execute(self.params)
+            self.assertEqual(len(issued_euids), 1)
+            shared_euid = issued_euids[0]
+            # both records reference the same EUID after sync
+            self.params.breach_watch_records = {x: {'data_unencrypted': {'passwords': [{
+                'value': 'password1', 'status': 'GOOD', 'euid': base64.b64encode(shared_euid).decode()}]}}
+                for x in record_uids}
+
+            self.set_password(record_uids[1], 'password9')
+            self.assertEqual([x.record_uid for x, _ in self.params.breach_watch.get_records_to_scan(self.params)],
+                             [record_uids[1]])
+            cmd.execute(self.params)
+            deleted = [x for c in mock_delete.call_args_list for x in c[0][1]]
+            self.assertNotIn(shared_euid, deleted)
+
+            scan_cache = breachwatch_cache.open_breachwatch_cache(self.params)
+            cached = scan_cache.get_hash_statuses([utils.breach_watch_hash('password1')])
+            scan_cache.close()
+            self.assertEqual([x.euid for x in cached.values()], [shared_euid])
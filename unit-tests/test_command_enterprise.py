@@ -1,13 +1,20 @@
+import gzip
 import logging
 import json
+import os
+import sqlite3
+import tempfile
 from datetime import datetime, timedelta
 from unittest import TestCase, mock
 
 from data_enterprise import EnterpriseEnvironment, get_enterprise_data, enterprise_allocate_ids
-from keepercommander import api, crypto, utils, vault
+from keepercommander import api, crypto, enterprise_cache, utils, vault
+from keepercommander.audit_cache import get_audit_cache_database_name
+from keepercommander.enterprise import EnterpriseIndex, get_enterprise_index, _EnterpriseLoader
 from keepercommander.params import KeeperParams
-from keepercommander.error import CommandError
-from data_vault import VaultEnvironment, get_connected_params
+from keepercommander.proto import enterprise_pb2
+from keepercommander.error import CommandError, KeeperApiError
+from data_vault import VaultEnvironment, get_connected_params, get_synced_params
 from keepercommander.commands import enterprise, aram
 
 
@@ -44,6 +51,47 @@ class TestEnterprise(TestCase):
         self.assertEqual(params.enterprise['unencrypted_tree_key'], ent_env.tree_key)
         self.assertEqual(len(params.enterprise['nodes']), 2)
 
+    def test_enterprise_index(self):
+        params = get_connected_params()
+        api.query_enterprise(params)
+        index = get_enterprise_index(params)
+        self.assertIs(get_enterprise_index(params), index)
+        self.assertEqual(index.get('users', ent_env.user2_id)['username'], ent_env.user2_email)
+        self.assertEqual([x['enterprise_user_id'] for x in index.find('users', 'username', ent_env.user2_email.upper())],
+                         [ent_env.user2_id])
+        self.assertEqual([x['enterprise_user_id'] for x in index.find('role_users', 'role_id', ent_env.role1_id)],
+                         [ent_env.user1_id])
+        self.assertIsNotNone(index.get('team_users', (ent_env.team2_uid, ent_env.user2_id)))
+
+        loader = _EnterpriseLoader()
+        role_users = enterprise_pb2.EnterpriseData(entity=enterprise_pb2.ROLE_USERS)
+        role_users.data.append(enterprise_pb2.RoleUser(
+            roleId=ent_env.role1_id, enterpriseUserId=ent_env.user2_id).SerializeToString())
+        loader._data_types[enterprise_pb2.ROLE_USERS].parse(params, role_users)
+        teams = enterprise_pb2.EnterpriseData(entity=enterprise_pb2.TEAMS)
+        teams.data.append(enterprise_pb2.Team(
+            teamUid=utils.base64_url_decode(ent_env.team1_uid), name=ent_env.team1_name,
+            nodeId=ent_env.node2_id).SerializeToString())
+        loader._data_types[enterprise_pb2.TEAMS].parse(params, teams)
+        users = enterprise_pb2.EnterpriseData(entity=enterprise_pb2.USERS, delete=True)
+        users.data.append(enterprise_pb2.User(enterpriseUserId=ent_env.user1_id).SerializeToString())
+        loader._data_types[enterprise_pb2.USERS].parse(params, users)
+        loader.flush(params)
+
+        self.assertIsNone(index.get('users', ent_env.user1_id))
+        self.assertEqual([x['enterprise_user_id'] for x in index.find('role_users', 'role_id', ent_env.role1_id)],
+                         [ent_env.user2_id])
+        self.assertEqual([x['team_uid'] for x in index.find('teams', 'node_id', ent_env.node2_id)], [ent_env.team1_uid])
+        rebuilt = EnterpriseIndex(params.enterprise)
+        for name, fields in EnterpriseIndex.SECONDARY_KEYS.items():
+            self.assertEqual(index.get_all(name), rebuilt.get_all(name))
+            for entity in rebuilt.get_all(name):
+                for field in fields:
+                    self.assertCountEqual(index.find(name, field, entity.get(field)), rebuilt.find(name, field, entity.get(field)))
+
+        params.enterprise = get_enterprise_data(params)
+        self.assertIsNot(get_enterprise_index(params), index)
+
     def test_enterprise_info_command(self):
         params = get_connected_params()
         api.query_enterprise(params)
@@ -238,6 +286,203 @@ class TestEnterprise(TestCase):
         }
         splunk.convert_event(props, self.get_audit_event())
 
+    def test_audit_log_json_export(self):
+        events = [{'audit_event_type': 'login', 'username': f'user{i}@company.com'} for i in range(5)]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name in ('audit.json', 'audit.json.gz', 'audit.ndjson', 'audit.ndjson.gz'):
+                filename = os.path.join(temp_dir, name)
+                for _ in range(2):
+                    json_export = aram.AuditLogJsonExport()
+                    record = vault.PasswordRecord()
+                    record.login = filename
+                    props = {}
+                    json_export.get_properties(record, props)
+                    json_export.export_events(props, events[:2])
+                    json_export.export_events(props, events[2:])
+                    json_export.finalize(props)
+
+                opener = gzip.open if name.endswith('.gz') else open
+                with opener(filename, mode='rt', encoding='utf-8') as logf:
+                    if json_export.is_ndjson(filename):
+                        self.assertEqual([json.loads(x) for x in logf], events + events)
+                    else:
+                        self.assertEqual(json.load(logf), events)
+
+    def get_audit_event_reports(self, audit_events):
+        def communicate(_, request):
+            if request['command'] == 'get_audit_event_dimensions':
+                return {'result': 'success', 'dimensions': {'audit_event_type': []}}
+            self.assertEqual(request['command'], 'get_audit_event_reports')
+            created = request.get('filter', {}).get('created', {})
+            min_created = created.get('min', 0)
+            max_created = created.get('max', audit_events[-1]['created'])
+            rows = [x.copy() for x in audit_events if min_created <= x['created'] <= max_created]
+            if request.get('order') == 'descending':
+                rows.reverse()
+            return {'result': 'success', 'audit_event_overview_report_rows': rows[:request['limit']]}
+        return communicate
+
+    def export_audit_log(self, params, filename, update_record=None, sync_down=None, **kwargs):
+        record = vault.PasswordRecord()
+        record.record_uid = utils.generate_uid()
+        record.title = 'Audit Log: JSON'
+        record.login = filename
+        with mock.patch('keepercommander.vault.KeeperRecord.load', return_value=record), \
+                mock.patch('keepercommander.record_management.update_record',
+                           side_effect=update_record) as mock_update, \
+                mock.patch('keepercommander.api.sync_down', side_effect=sync_down):
+            cmd = aram.AuditLogCommand()
+            with mock.patch('builtins.print'):
+                cmd.execute(params, target='json', record=record.record_uid, **kwargs)
+            mock_update.assert_called()
+        with open(filename, 'rt') as logf:
+            return record, [json.loads(x) for x in logf]
+
+    def test_audit_log_export_pipeline(self):
+        params = get_synced_params()
+        api.query_enterprise(params)
+        base_time = int(datetime.now().timestamp()) - 10000
+        audit_events = [{'id': 1000 + i, 'created': base_time + i // 3, 'username': vault_env.user,
+                         'audit_event_type': 'login'} for i in range(2500)]
+
+        self.communicate_mock.side_effect = self.get_audit_event_reports(audit_events)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            record, exported = self.export_audit_log(params, os.path.join(temp_dir, 'audit.ndjson'))
+        # events of the last second are exported by the next run
+        self.assertEqual(len(exported), len(audit_events) - 1)
+        self.assertEqual(record.get_custom_value('last_event_time'), str(audit_events[-1]['created']))
+
+    def test_audit_log_backfill(self):
+        params = get_synced_params()
+        api.query_enterprise(params)
+        base_time = int(datetime.now().timestamp()) - 10 * 24 * 60 * 60
+        audit_events = [{'id': 1000 + i, 'created': base_time + i * 30, 'username': vault_env.user,
+                         'audit_event_type': 'login'} for i in range(20000)]
+
+        self.communicate_mock.side_effect = self.get_audit_event_reports(audit_events)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backfill_from = datetime.fromtimestamp(base_time).strftime('%Y-%m-%d')
+            record, exported = self.export_audit_log(params, os.path.join(temp_dir, 'audit.ndjson'),
+                                                     backfill_from=backfill_from, backfill_workers=3)
+        self.assertEqual([x['timestamp'] for x in exported], [
+            datetime.utcfromtimestamp(x['created']).strftime('%Y-%m-%dT%H:%M:%SZ') for x in audit_events])
+        self.assertGreater(int(record.get_custom_value('last_event_time')), audit_events[-1]['created'])
+
+    def test_audit_log_backfill_checkpoint_revision(self):
+        params = get_synced_params()
+        api.query_enterprise(params)
+        base_time = int(datetime.now().timestamp()) - 5 * 24 * 60 * 60
+        audit_events = [{'id': 1000 + i, 'created': base_time + i * 60, 'username': vault_env.user,
+                         'audit_event_type': 'login'} for i in range(5000)]
+        server = {'revision': 10}
+        sent_revisions = []
+
+        def update_record(p, record):
+            storage_record = p.record_cache.setdefault(record.record_uid, {'record_uid': record.record_uid,
+                                                                           'revision': server['revision']})
+            sent_revisions.append(storage_record['revision'])
+            if storage_record['revision'] != server['revision']:
+                raise KeeperApiError('RS_OUT_OF_SYNC', 'Record is out of sync')
+            server['revision'] += 1
+            server['record_uid'] = record.record_uid
+
+        def sync_down(p):
+            p.record_cache[server['record_uid']]['revision'] = server['revision']
+
+        self.communicate_mock.side_effect = self.get_audit_event_reports(audit_events)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            backfill_from = datetime.fromtimestamp(base_time).strftime('%Y-%m-%d')
+            with mock.patch.object(aram, 'AUDIT_LOG_CHECKPOINT_INTERVAL', 0):
+                self.export_audit_log(params, os.path.join(temp_dir, 'audit.ndjson'), update_record=update_record,
+                                      sync_down=sync_down, backfill_from=backfill_from)
+        self.assertGreater(len(sent_revisions), 2)
+        self.assertEqual(sent_revisions, list(range(10, 10 + len(sent_revisions))))
+
+        # a short backfill is checkpointed once, at the end
+        sent_revisions.clear()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.export_audit_log(params, os.path.join(temp_dir, 'audit.ndjson'), update_record=update_record,
+                                  sync_down=sync_down, backfill_from=backfill_from)
+        self.assertEqual(len(sent_revisions), 1)
+
+    def test_audit_report_backfill(self):
+        params = get_synced_params()
+        api.query_enterprise(params)
+        base_time = int(datetime.now().timestamp()) - 5 * 24 * 60 * 60
+        audit_events = [{'id': 1000 + i, 'created': base_time + i * 20, 'username': vault_env.user,
+                         'audit_event_type': 'login'} for i in range(3000)]
+
+        self.communicate_mock.side_effect = self.get_audit_event_reports(audit_events)
+        cmd = aram.AuditReportCommand()
+        report = cmd.execute(params, report_type='raw', format='json', created=f'>={base_time}',
+                             order='desc', backfill_workers=4, backfill_window='6h')
+        rows = json.loads(report)
+        self.assertEqual(len(rows), len(audit_events))
+        self.assertEqual([x['created'] for x in rows[:2]], [
+            aram.AuditReportCommand.convert_value('created', x['created']).isoformat()
+            for x in audit_events[-1:-3:-1]])
+
+    def test_audit_report_cache(self):
+        params = get_synced_params()
+        api.query_enterprise(params)
+        params.account_uid_bytes = params.account_uid_bytes or crypto.get_random_bytes(16)
+        base_time = int(datetime.now().timestamp()) - 3 * 24 * 60 * 60
+        event_types = ('login', 'record_add', 'login_failure')
+        audit_events = [{'id': 1000 + i, 'created': base_time + i * 60, 'username': f'user{i % 4}@company.com',
+                         'audit_event_type': event_types[i % 3]} for i in range(3000)]
+
+        self.communicate_mock.side_effect = self.get_audit_event_reports(audit_events)
+        cmd = aram.AuditReportCommand()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            # an empty cache is not populated without a start date: the report is sent to the server
+            cmd.execute(params, report_type='span', format='json', cache=True,
+                        columns=['audit_event_type'], aggregate=['occurrences'])
+            reports_rqs = [x[0][1] for x in self.communicate_mock.call_args_list
+                           if x[0][1]['command'] == 'get_audit_event_reports']
+            self.assertEqual([x['report_type'] for x in reports_rqs], ['span'])
+
+            cache_start = audit_events[1500]['created']
+            self.communicate_mock.reset_mock()
+            report = cmd.execute(params, report_type='span', format='json', cache=True, created=f'>={cache_start}',
+                                 columns=['audit_event_type'], aggregate=['occurrences', 'last_created'])
+            rows = json.loads(report)
+            self.assertEqual({x['audit_event_type']: x['occurrences'] for x in rows},
+                             {x: 500 for x in event_types})
+            reports_rqs = [x[0][1] for x in self.communicate_mock.call_args_list
+                           if x[0][1]['command'] == 'get_audit_event_reports' and 'created' in x[0][1].get('filter', {})]
+            self.assertTrue(all(x['filter']['created']['min'] >= cache_start for x in reports_rqs))
+
+            database_name = get_audit_cache_database_name(params)
+            if os.name == 'posix':
+                self.assertEqual(os.stat(database_name).st_mode & 0o777, 0o600)
+            with open(database_name, 'rb') as db:
+                self.assertNotIn(b'@company.com', db.read())
+
+            # a report without a start date covers the cached range
+            report = cmd.execute(params, report_type='span', format='json', cache=True,
+                                 columns=['audit_event_type'], aggregate=['occurrences'])
+            self.assertEqual(sum(x['occurrences'] for x in json.loads(report)), 1500)
+
+            self.communicate_mock.reset_mock()
+            report = cmd.execute(params, report_type='day', format='json', cache=True, columns=['username'],
+                                 event_type=['login'], created=f'>={base_time}', limit=1000)
+            rows = json.loads(report)
+            self.assertEqual(sum(x['occurrences'] for x in rows), 1000)
+            self.assertEqual({x['username'] for x in rows}, {f'user{i}@company.com' for i in range(4)})
+            # only events older than the cached range or since the last cached second are requested
+            reports_rqs = [x[0][1] for x in self.communicate_mock.call_args_list
+                           if x[0][1]['command'] == 'get_audit_event_reports' and 'created' in x[0][1].get('filter', {})]
+            self.assertTrue(all(x['filter']['created']['max'] < cache_start or
+                                x['filter']['created']['min'] >= audit_events[-1]['created'] for x in reports_rqs))
+
+            # an event indexed after the previous sync with an earlier created time is still loaded
+            audit_events.append({'id': 9000, 'created': int(datetime.now().timestamp()) - 60,
+                                 'username': 'user0@company.com', 'audit_event_type': 'login'})
+            report = cmd.execute(params, report_type='span', format='json', cache=True,
+                                 columns=['audit_event_type'], aggregate=['occurrences'])
+            self.assertEqual(sum(x['occurrences'] for x in json.loads(report)), len(audit_events))
+
     def test_audit_audit_report_parse_date_filter(self):
         cmd = aram.AuditReportCommand()
 
@@ -390,3 +635,108 @@ class TestEnterprise(TestCase):
             if cmd == request['command']:
                 return rs
         raise Exception()
+
+
+class TestEnterpriseLoader(TestCase):
+    def setUp(self):
+        self.requests = []
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def communicate_rest(self, params, request, endpoint, **kwargs):
+        self.requests.append((endpoint, request))
+        if endpoint == 'enterprise/get_enterprise_data_keys':
+            rs = enterprise_pb2.GetEnterpriseDataKeysResponse()
+            rs.treeKey.treeKey = utils.base64_url_encode(crypto.encrypt_aes_v1(ent_env.tree_key, params.data_key))
+            rs.treeKey.keyTypeId = enterprise_pb2.ENCRYPTED_BY_DATA_KEY
+            rs.enterpriseKeys.rsaEncryptedPrivateKey = crypto.encrypt_aes_v2(b'rsa', ent_env.tree_key)
+            rs.enterpriseKeys.eccEncryptedPrivateKey = crypto.encrypt_aes_v2(b'ecc', ent_env.tree_key)
+            return rs
+        if endpoint == 'enterprise/get_enterprise_data_for_user':
+            rs = enterprise_pb2.EnterpriseDataResponse()
+            rs.continuationToken = crypto.get_random_bytes(16)
+            rs.generalData.enterpriseName = 'Enterprise 1'
+            users = rs.data.add(entity=enterprise_pb2.USERS)
+            for user_id in self.user_ids:
+                users.data.append(enterprise_pb2.User(
+                    enterpriseUserId=user_id, nodeId=ent_env.node1_id, username=f'user{user_id}@company.com',
+                    encryptedData='User', keyType='no_key', status='active').SerializeToString())
+            self.user_ids = []
+            self.tokens.append(rs.continuationToken)
+            return rs
+
+    def test_enterprise_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            mock.patch('keepercommander.api.communicate_rest', side_effect=self.communicate_rest).start()
+            self.tokens = []
+
+            params = get_connected_params()
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            params.enterprise_cache = True
+            self.user_ids = [ent_env.user1_id, ent_env.user2_id]
+            api.query_enterprise(params)
+            self.assertEqual(len(params.enterprise['users']), 2)
+
+            cached_params = get_connected_params()
+            cached_params.config_filename = params.config_filename
+            cached_params.enterprise_cache = True
+            self.user_ids = [ent_env.user2_id + 1]
+            self.requests.clear()
+            api.query_enterprise(cached_params)
+            rq = next(x for e, x in self.requests if e == 'enterprise/get_enterprise_data_for_user')
+            self.assertEqual(rq.continuationToken, self.tokens[0])
+            self.assertEqual(cached_params.enterprise['enterprise_name'], 'Enterprise 1')
+            self.assertEqual(cached_params.enterprise['unencrypted_tree_key'], ent_env.tree_key)
+            self.assertEqual([x['enterprise_user_id'] for x in cached_params.enterprise['users']],
+                             [ent_env.user1_id, ent_env.user2_id, ent_env.user2_id + 1])
+            self.assertEqual(cached_params.enterprise['users'][0], params.enterprise['users'][0])
+
+            self.requests.clear()
+            api.query_enterprise(cached_params)
+            rq = next(x for e, x in self.requests if e == 'enterprise/get_enterprise_data_for_user')
+            self.assertEqual(rq.continuationToken, self.tokens[1])
+
+            other_params = get_connected_params()
+            other_params.config_filename = params.config_filename
+            other_params.enterprise_cache = True
+            self.requests.clear()
+            api.query_enterprise(other_params)
+            rq = next(x for e, x in self.requests if e == 'enterprise/get_enterprise_data_for_user')
+            self.assertEqual(rq.continuationToken, self.tokens[2])
+            self.assertEqual(len(other_params.enterprise['users']), 3)
+
+    def test_enterprise_cache_failed_save(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            mock.patch('keepercommander.api.communicate_rest', side_effect=self.communicate_rest).start()
+            self.tokens = []
+
+            params = get_connected_params()
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            params.enterprise_cache = True
+            self.user_ids = [ent_env.user1_id]
+            api.query_enterprise(params)
+            database_name = enterprise_cache.get_enterprise_cache_database_name(params)
+            if os.name == 'posix':
+                self.assertEqual(os.stat(database_name).st_mode & 0o777, 0o600)
+
+            def load_cached():
+                cache = enterprise_cache.SqliteEnterpriseCache(
+                    database_name, enterprise_cache.get_enterprise_cache_owner(params, ent_env.tree_key),
+                    ent_env.tree_key)
+                cached_params = KeeperParams()
+                cached_params.enterprise = {}
+                token = cache.load(cached_params)
+                cache.close()
+                return token, len(cached_params.enterprise.get('users') or [])
+
+            self.user_ids = [ent_env.user2_id]
+            with mock.patch('keepercommander.storage.sqlite_dao.SqliteStorage.put',
+                            side_effect=sqlite3.OperationalError('disk I/O error')):
+                api.query_enterprise(params)
+            self.assertEqual(len(params.enterprise['users']), 2)
+            # nothing of the failed save is stored
+            self.assertEqual(load_cached(), (self.tokens[0], 1))
+
+            api.query_enterprise(params)
+            self.assertEqual(load_cached(), (self.tokens[2], 2))
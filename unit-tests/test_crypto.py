@@ -76,6 +76,28 @@ class TestCrypto(TestCase):
         data = utils.base64_url_decode(_test_random_data)
         self.assertEqual(decrypted_data, data)
 
+    def test_decrypt_batch(self):
+        aes_key = utils.generate_aes_key()
+        ec_private_key, ec_public_key = crypto.generate_ec_key()
+        tasks = []
+        expected = {}
+        for i in range(40):
+            data = crypto.get_random_bytes(32)
+            expected[f'v1_{i}'] = data
+            tasks.append((f'v1_{i}', crypto.decrypt_aes_v1, crypto.encrypt_aes_v1(data, aes_key), aes_key))
+            expected[f'v2_{i}'] = data
+            tasks.append((f'v2_{i}', crypto.decrypt_aes_v2, crypto.encrypt_aes_v2(data, aes_key), aes_key))
+            expected[f'ec_{i}'] = data
+            tasks.append((f'ec_{i}', crypto.decrypt_ec, crypto.encrypt_ec(data, ec_public_key), ec_private_key))
+        tasks.append(('bad', crypto.decrypt_aes_v2, crypto.get_random_bytes(60), aes_key))
+
+        serial = crypto.decrypt_batch(tasks, parallel=False)
+        parallel = crypto.decrypt_batch(tasks, parallel=True, max_workers=4)
+        self.assertIsInstance(serial.pop('bad'), Exception)
+        self.assertIsInstance(parallel.pop('bad'), Exception)
+        self.assertEqual(serial, expected)
+        self.assertEqual(parallel, expected)
+
     def test_derive_key_hash_v1(self):
         password = 'q2rXmNBFeLwAEX55hVVTfg'
         salt = utils.base64_url_decode('Ozv5_XSBgw-XSrDosp8Y1A')
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from keepercommander import crypto, utils
+from keepercommander.params import KeeperParams
+from keepercommander.sox.sox_data import SoxData
+from keepercommander.sox.sqlite_storage import SqliteSoxStorage
+from keepercommander.sox.storage_types import StorageUser, StorageRecord, StorageUserRecordLink
+
+
+class TestSoxStorage(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.database_name = os.path.join(self.temp_dir.name, 'sox_1.db')
+        self.storage = SqliteSoxStorage(get_connection=None, owner='user@company.com',
+                                        database_name=self.database_name)
+
+    def tearDown(self):
+        self.storage.close()
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def create_data(count):
+        users, records, links = [], [], []
+        for i in range(count):
+            user = StorageUser()
+            user.user_uid = i + 1
+            users.append(user)
+            record = StorageRecord()
+            record.record_uid = f'record{i}'
+            records.append(record)
+            link = StorageUserRecordLink()
+            link.user_uid = user.user_uid
+            link.record_uid = record.record_uid
+            links.append(link)
+        return users, records, links
+
+    def test_reuses_connection(self):
+        self.assertIs(self.storage.get_connection(), self.storage.get_connection())
+        journal_mode = self.storage.get_connection().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(journal_mode.lower(), 'wal')
+
+    def test_rebuild_prelim_data(self):
+        self.storage.rebuild_prelim_data(*self.create_data(10))
+        self.assertEqual(len(list(self.storage.users.get_all())), 10)
+        self.assertEqual(len(list(self.storage.records.get_all())), 10)
+        self.assertEqual(len(list(self.storage.get_user_record_links().get_all_links())), 10)
+        self.assertGreater(self.storage.last_prelim_data_update, 0)
+
+    def test_transaction_rollback(self):
+        self.storage.rebuild_prelim_data(*self.create_data(5))
+        with self.assertRaises(ValueError):
+            with self.storage.transaction():
+                self.storage.clear_non_aging_data()
+                self.assertEqual(len(list(self.storage.users.get_all())), 0)
+                raise ValueError()
+        self.assertEqual(len(list(self.storage.users.get_all())), 5)
+        self.assertGreater(self.storage.last_prelim_data_update, 0)
+
+    def test_delete_db(self):
+        self.storage.rebuild_prelim_data(*self.create_data(1))
+        self.storage.delete_db()
+        self.assertFalse(os.path.exists(self.database_name))
+
+    def test_get_entities(self):
+        self.storage.rebuild_prelim_data(*self.create_data(1200))
+        uids = [f'record{i}' for i in range(0, 1200, 2)] + ['missing']
+        records = list(self.storage.records.get_entities(uids))
+        self.assertEqual({x.record_uid for x in records}, set(uids[:-1]))
+        users = list(self.storage.users.get_entities(x for x in range(1, 1202)))
+        self.assertEqual(len(users), 1200)
+        self.assertEqual(list(self.storage.users.get_entities([])), [])
+
+    def test_record_data_cache(self):
+        tree_key = utils.generate_aes_key()
+        private_key, public_key = crypto.generate_ec_key()
+        params = KeeperParams()
+        params.enterprise = {
+            'unencrypted_tree_key': tree_key,
+            'keys': {'ecc_encrypted_private_key': utils.base64_url_encode(
+                crypto.encrypt_aes_v2(crypto.unload_ec_private_key(private_key), tree_key))}
+        }
+        users, records, links = self.create_data(20)
+        for record in records:
+            record.encrypted_data = crypto.encrypt_ec(json.dumps({'title': record.record_uid}).encode(), public_key)
+        self.storage.rebuild_prelim_data(users, records, links)
+
+        sox_data = SoxData(params, self.storage)
+        self.assertEqual(len(list(self.storage.record_data.get_all())), 20)
+        self.assertEqual(sox_data.get_records()['record5'].data['title'], 'record5')
+
+        with mock.patch('keepercommander.crypto.decrypt_ec') as mock_decrypt:
+            sox_data = SoxData(params, self.storage)
+            mock_decrypt.assert_not_called()
+        self.assertEqual({x.data.get('title') for x in sox_data.get_records().values()}, {x.record_uid for x in records})
+
+        self.storage.rebuild_prelim_data(users[:10], records[:10], links[:10])
+        self.assertEqual(len(list(self.storage.record_data.get_all())), 10)
@@ -1,8 +1,14 @@
+import os
+import sqlite3
+import tempfile
 from unittest import TestCase, mock
 
-from data_vault import VaultEnvironment, get_synced_params
+import data_vault
+from data_vault import VaultEnvironment, get_synced_params, get_connected_params, get_sync_down_responses
+from keepercommander import subfolder, vault, vault_cache
 from keepercommander.api import sync_down, crypto, utils
 from keepercommander.proto import SyncDown_pb2
+from keepercommander.storage import cache_utils
 
 vault_env = VaultEnvironment()
 
@@ -16,6 +22,20 @@ class TestSyncDown(TestCase):
         self.assertEqual(len(params.team_cache), 1)
         self.assert_key_unencrypted(params)
 
+    def test_full_sync_serial_decryption(self):
+        params = get_connected_params()
+        params.parallel_decryption = False
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            mock_comm.side_effect = get_sync_down_responses
+            sync_down(params)
+        parallel_params = get_synced_params()
+
+        self.assertEqual(params.record_cache.keys(), parallel_params.record_cache.keys())
+        for record_uid, record in params.record_cache.items():
+            self.assertEqual(record.get('data_unencrypted'), parallel_params.record_cache[record_uid].get('data_unencrypted'))
+            self.assertEqual(record.get('extra_unencrypted'), parallel_params.record_cache[record_uid].get('extra_unencrypted'))
+        self.assert_key_unencrypted(params)
+
     def test_sync_remove_owned_records(self):
         params = get_synced_params()
         len_before = len(params.record_cache)
@@ -95,6 +115,261 @@ class TestSyncDown(TestCase):
         self.assertEqual(len(params.team_cache), 0)
         self.assert_key_unencrypted(params)
 
+    def test_sync_delta_decrypts_changed_entities(self):
+        params = get_synced_params()
+        record_uid = next((x for x, md in params.meta_data_cache.items() if md.get('owner') is True))
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            mock_comm.return_value = rs
+            stats = sync_down(params)
+        self.assertEqual(stats['records'], 0)
+        self.assertEqual(stats['shared_folder_keys'], 0)
+
+        record = next((x for x in data_vault.get_sync_down_response().records
+                       if utils.base64_url_encode(x.recordUid) == record_uid))
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.records.append(record)
+            mock_comm.return_value = rs
+            stats = sync_down(params)
+        self.assertEqual(stats['records'], 1)
+        self.assertEqual(stats['record_keys'], 1)
+        self.assertEqual(stats['team_keys'], 0)
+        self.assertEqual(len(params.record_cache), 3)
+        self.assertIn('data_unencrypted', params.record_cache[record_uid])
+        self.assert_key_unencrypted(params)
+
+    def test_sync_shared_folder_entries(self):
+        params = get_synced_params()
+        shared_folder_uid, shared_folder = next(iter(params.shared_folder_cache.items()))
+        sf_records = {x['record_uid']: x for x in shared_folder['records']}
+        record_uid = next(iter(sf_records))
+        user = shared_folder['users'][0]
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.sharedFolderRecords.add(sharedFolderUid=utils.base64_url_decode(shared_folder_uid),
+                                       recordUid=utils.base64_url_decode(record_uid), canEdit=True)
+            rs.sharedFolderUsers.add(sharedFolderUid=utils.base64_url_decode(shared_folder_uid),
+                                     username='user2@company.com', accountUid=crypto.get_random_bytes(16))
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assertEqual(len(shared_folder['records']), len(sf_records))
+        self.assertIs(next(x for x in shared_folder['records'] if x['record_uid'] == record_uid), sf_records[record_uid])
+        self.assertTrue(sf_records[record_uid]['can_edit'])
+        self.assertEqual(len(shared_folder['users']), 2)
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.removedSharedFolderRecords.add(sharedFolderUid=utils.base64_url_decode(shared_folder_uid),
+                                              recordUid=utils.base64_url_decode(record_uid))
+            rs.removedSharedFolderUsers.add(sharedFolderUid=utils.base64_url_decode(shared_folder_uid),
+                                            username='user2@company.com')
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assertEqual({x['record_uid'] for x in shared_folder['records']}, set(sf_records) - {record_uid})
+        self.assertEqual([x['account_uid'] for x in shared_folder['users']], [user['account_uid']])
+
+    def test_sync_removal_phase_timing(self):
+        params = get_synced_params()
+        records_to_delete = [x for x, md in params.meta_data_cache.items() if md.get('owner') is True]
+        teams_to_delete = [x['team_uid'] for x in params.team_cache.values()]
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm, \
+                self.assertLogs(level='DEBUG') as logs:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.removedRecords.extend((utils.base64_url_decode(x) for x in records_to_delete))
+            rs.removedTeams.extend((utils.base64_url_decode(x) for x in teams_to_delete))
+            mock_comm.return_value = rs
+            sync_down(params)
+        phases = [x for x in logs.output if ':Removed ' in x]
+        self.assertTrue(any(f'Removed records: {len(records_to_delete)} in ' in x for x in phases))
+        self.assertTrue(any(f'Removed teams: {len(teams_to_delete)} in ' in x for x in phases))
+        self.assertFalse(any('Removed shared folders' in x for x in phases))
+        self.assert_record_folder_cache(params)
+
+    def test_record_folder_cache(self):
+        params = get_synced_params()
+        self.assert_record_folder_cache(params)
+        record_uid, folder_uid = next(((r, f) for f, rs in params.subfolder_record_cache.items() for r in rs if f))
+        self.assertIn(folder_uid, list(subfolder.find_folders(params, record_uid)))
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.removedUserFolderRecords.add(folderUid=utils.base64_url_decode(folder_uid),
+                                            recordUid=utils.base64_url_decode(record_uid))
+            rs.removedSharedFolderFolderRecords.add(folderUid=utils.base64_url_decode(folder_uid),
+                                                    recordUid=utils.base64_url_decode(record_uid))
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assertNotIn(folder_uid, list(subfolder.find_folders(params, record_uid)))
+        self.assert_record_folder_cache(params)
+
+        records_to_delete = [x for x, md in params.meta_data_cache.items() if md.get('owner') is True]
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.removedRecords.extend((utils.base64_url_decode(x) for x in records_to_delete))
+            rs.removedUserFolders.extend((utils.base64_url_decode(x) for x, f in params.subfolder_cache.items()
+                                          if f.get('type') == 'user_folder'))
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assert_record_folder_cache(params)
+
+    def test_keeper_record_cache(self):
+        params = get_synced_params()
+        record_uid = next((x for x, md in params.meta_data_cache.items() if md.get('owner') is True))
+        record = vault.KeeperRecord.load(params, record_uid, use_cache=True)
+        self.assertIs(vault.KeeperRecord.load(params, record_uid, use_cache=True), record)
+        self.assertIsNot(vault.KeeperRecord.load(params, record_uid), record)
+
+        sync_record = next((x for x in data_vault.get_sync_down_response().records
+                            if utils.base64_url_encode(x.recordUid) == record_uid))
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.records.append(sync_record)
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assertNotIn(record_uid, params.keeper_record_cache)
+        updated = vault.KeeperRecord.load(params, record_uid, use_cache=True)
+        self.assertIsNot(updated, record)
+        self.assertEqual(updated.title, record.title)
+
+        with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+            rs = SyncDown_pb2.SyncDownResponse()
+            rs.continuationToken = crypto.get_random_bytes(64)
+            rs.removedRecords.append(utils.base64_url_decode(record_uid))
+            mock_comm.return_value = rs
+            sync_down(params)
+        self.assertNotIn(record_uid, params.keeper_record_cache)
+        self.assertIsNone(vault.KeeperRecord.load(params, record_uid, use_cache=True))
+
+    def test_sync_resume_from_vault_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params = get_connected_params()
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            params.vault_cache = True
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+                mock_comm.side_effect = get_sync_down_responses
+                sync_down(params)
+            token = params.sync_down_token
+            revision = params.revision
+            params.clear_session()
+
+            cached_params = get_connected_params()
+            cached_params.config_filename = params.config_filename
+            cached_params.vault_cache = True
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+                rs = SyncDown_pb2.SyncDownResponse()
+                rs.continuationToken = crypto.get_random_bytes(64)
+                mock_comm.return_value = rs
+                sync_down(cached_params)
+                rq = mock_comm.call_args[0][1]
+                self.assertEqual(rq.continuationToken, token)
+            self.assertEqual(len(cached_params.record_cache), 3)
+            self.assertEqual(len(cached_params.shared_folder_cache), 1)
+            self.assertEqual(len(cached_params.team_cache), 1)
+            self.assertEqual(len(cached_params.record_type_cache), 1)
+            self.assertEqual(cached_params.revision, revision)
+            self.assert_key_unencrypted(cached_params)
+            self.assert_record_folder_cache(cached_params)
+            cached_params.clear_session()
+
+    def test_sync_delta_saves_changed_entries(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params = get_connected_params()
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            params.vault_cache = True
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+                mock_comm.side_effect = get_sync_down_responses
+                sync_down(params)
+
+            record_uid = next(x for x, md in params.meta_data_cache.items() if md.get('owner') is True)
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm, \
+                    mock.patch('keepercommander.storage.cache_utils.encode_json',
+                               wraps=cache_utils.encode_json) as mock_encode:
+                rs = SyncDown_pb2.SyncDownResponse()
+                rs.continuationToken = crypto.get_random_bytes(64)
+                rs.removedRecords.append(utils.base64_url_decode(record_uid))
+                mock_comm.return_value = rs
+                sync_down(params)
+                encoded = mock_encode.call_count
+            self.assertNotIn(record_uid, params.record_cache)
+            self.assertLess(encoded, len(params.record_cache) + len(params.meta_data_cache) +
+                            len(params.shared_folder_cache) + len(params.subfolder_cache))
+
+            cached_params = get_connected_params()
+            cached_params.config_filename = params.config_filename
+            cached_params.vault_cache = True
+            self.assertTrue(vault_cache.open_vault_cache(cached_params).load(cached_params))
+            self.assertEqual(cached_params.record_cache.keys(), params.record_cache.keys())
+            self.assertEqual(cached_params.meta_data_cache.keys(), params.meta_data_cache.keys())
+            self.assertEqual(cached_params.subfolder_record_cache, params.subfolder_record_cache)
+            params.clear_session()
+            cached_params.clear_session()
+
+    def test_sync_vault_cache_failed_save(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params = get_connected_params()
+            params.config_filename = os.path.join(temp_dir, 'config.json')
+            params.vault_cache = True
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+                mock_comm.side_effect = get_sync_down_responses
+                sync_down(params)
+            database_name = vault_cache.get_vault_cache_database_name(params)
+            if os.name == 'posix':
+                self.assertEqual(os.stat(database_name).st_mode & 0o777, 0o600)
+            token = params.sync_down_token
+
+            def load_cached():
+                cached_params = get_connected_params()
+                cached_params.config_filename = params.config_filename
+                cached_params.vault_cache = True
+                storage = vault_cache.open_vault_cache(cached_params)
+                self.assertTrue(storage.load(cached_params))
+                cached = cached_params.sync_down_token, set(cached_params.record_cache.keys())
+                cached_params.clear_session()
+                return cached
+
+            record_uid = next(x for x, md in params.meta_data_cache.items() if md.get('owner') is True)
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm, \
+                    mock.patch('keepercommander.storage.sqlite_dao.SqliteStorage.delete_by_filter',
+                               side_effect=sqlite3.OperationalError('disk I/O error')):
+                rs = SyncDown_pb2.SyncDownResponse()
+                rs.continuationToken = crypto.get_random_bytes(64)
+                rs.removedRecords.append(utils.base64_url_decode(record_uid))
+                mock_comm.return_value = rs
+                sync_down(params)
+            # nothing of the failed save is stored
+            cached_token, cached_records = load_cached()
+            self.assertEqual(cached_token, token)
+            self.assertIn(record_uid, cached_records)
+
+            with mock.patch('keepercommander.api.communicate_rest') as mock_comm:
+                rs = SyncDown_pb2.SyncDownResponse()
+                rs.continuationToken = crypto.get_random_bytes(64)
+                mock_comm.return_value = rs
+                sync_down(params)
+            cached_token, cached_records = load_cached()
+            self.assertEqual(cached_token, rs.continuationToken)
+            self.assertEqual(cached_records, set(params.record_cache.keys()))
+            params.clear_session()
+
+    def assert_record_folder_cache(self, params):
+        expected = {}
+        for folder_uid, record_uids in params.subfolder_record_cache.items():
+            for record_uid in record_uids:
+                expected.setdefault(record_uid, set()).add(folder_uid)
+        self.assertEqual(params.record_folder_cache, expected)
+
     def assert_key_unencrypted(self, params):
         for r in params.record_cache.values():
             self.assertTrue('record_key_unencrypted' in r)